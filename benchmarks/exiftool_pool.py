@@ -0,0 +1,52 @@
+# benchmarks/exiftool_pool.py
+"""
+Measure metadata read throughput of ExifToolPool for different worker counts.
+
+Usage:
+	python -m benchmarks.exiftool_pool --exiftool exiftool --folder test_files/folder_of_700_files
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+from utils.exiftool_wrapper import ExifToolPool
+from utils.metadata_index import XMP_DESCRIPTION_TAG, EXIF_DESCRIPTION_TAG
+
+async def read_folder(pool, paths, concurrency):
+	"""Read the descriptions of every file one by one, like navigation and prefetch do."""
+	semaphore = asyncio.Semaphore(concurrency)
+
+	async def read(path):
+		async with semaphore:
+			await pool.get_tags(path, [XMP_DESCRIPTION_TAG, EXIF_DESCRIPTION_TAG])
+
+	await asyncio.gather(*(read(path) for path in paths))
+
+async def run(executable, folder, worker_counts, concurrency):
+	paths = sorted(path for path in Path(folder).iterdir() if path.suffix.lower() in {".jpg", ".jpeg", ".png", ".tif", ".tiff"})
+	print(f"{len(paths)} files in {folder}")
+	for workers in worker_counts:
+		pool = ExifToolPool(executable=executable, read_workers=workers, save_workers=1)
+		pool.start()
+		try:
+			await read_folder(pool, paths[:10], concurrency)  # Warm up every process
+			start = time.perf_counter()
+			await read_folder(pool, paths, concurrency)
+			elapsed = time.perf_counter() - start
+		finally:
+			pool.stop()
+		print(f"{workers} worker(s): {elapsed:.2f} s, {len(paths) / elapsed:.1f} files/s")
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--exiftool", default="exiftool", help="ExifTool executable.")
+	parser.add_argument("--folder", default="test_files/folder_of_700_files", help="Folder of images to read.")
+	parser.add_argument("--workers", default="1,2,4,8", help="Comma separated worker counts.")
+	parser.add_argument("--concurrency", type=int, default=32, help="Reads kept in flight at once.")
+	args = parser.parse_args()
+	worker_counts = [int(count) for count in args.workers.split(",")]
+	asyncio.run(run(args.exiftool, args.folder, worker_counts, args.concurrency))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,88 @@
+# benchmarks/in_place_write.py
+"""
+Compare saving a description in place, in the file's XMP padding, with
+ExifTool's full rewrite (-overwrite_original): latency and bytes written
+to the image per save.
+
+The image is copied to --workdir first, point it at a network drive to
+see the difference the app sees there. ExifTool writes a whole new copy
+of the file, so its bytes written are the file's size.
+
+Usage:
+	python -m benchmarks.in_place_write --image test_files/folder_with_tags/jpg_large_file_wXMP_wEXIF.jpg
+	python -m benchmarks.in_place_write --image big.tif --workdir //nas/share/tmp --output in-place.json
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+import tempfile
+from itertools import count
+from pathlib import Path
+
+import config
+from benchmarks.suite import measure
+from metadata.inplace_writer import write_in_place, InPlaceUnavailable
+from metadata.sanitize import description_values, description_tags
+from utils.exiftool_wrapper import ExifToolPool
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--image", default="test_files/folder_with_tags/jpg_large_file_wXMP_wEXIF.jpg")
+	parser.add_argument("--workdir", help="Folder the image is copied to, a temporary folder by default.")
+	parser.add_argument("--exiftool", default="exiftool", help="ExifTool executable, its case is skipped if it is missing.")
+	parser.add_argument("--repeat", type=int, default=20, help="Timed saves per case.")
+	parser.add_argument("--warmup", type=int, default=2, help="Untimed saves per case before timing.")
+	parser.add_argument("--output", help="Write the results to this JSON file.")
+	args = parser.parse_args()
+
+	image = Path(args.image)
+	results = {}
+	with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+		copy = Path(workdir) / image.name
+		undo_dir = Path(workdir) / "undo"
+		shutil.copyfile(image, copy)
+		size = copy.stat().st_size
+		# Every save changes the description. Same length and short, so it fits in place whenever the first one does.
+		numbers = count()
+		written = []
+
+		def in_place():
+			written.append(write_in_place(copy, description_values(copy, f"Save {next(numbers):05d}"), undo_dir))
+
+		try:
+			results["in_place"] = measure(in_place, args.repeat, args.warmup)
+			results["in_place"]["bytes_written"] = max(written)
+		except InPlaceUnavailable as e:
+			print(f"Skipping the in-place case, {e}", file=sys.stderr)
+
+		if shutil.which(args.exiftool) or Path(args.exiftool).is_file():
+			loop = asyncio.new_event_loop()
+			pool = ExifToolPool(executable=args.exiftool, read_workers=1, save_workers=config.EXIFTOOL_SAVE_WORKERS)
+			pool.start()
+			try:
+				def rewrite():
+					tags = description_tags(description_values(copy, f"Save {next(numbers):05d}"))
+					loop.run_until_complete(pool.set_tags(copy, tags, extra_args=["-charset", "utf8", "-overwrite_original"]))
+
+				results["exiftool"] = measure(rewrite, args.repeat, args.warmup)
+				results["exiftool"]["bytes_written"] = copy.stat().st_size
+			finally:
+				pool.stop()
+				loop.close()
+		else:
+			print(f"Skipping the ExifTool case, {args.exiftool} was not found.", file=sys.stderr)
+
+	print(f"{image.name}, {size / (1024 * 1024):.1f} MB")
+	print(f"{'case':12} {'median ms':>10} {'p95 ms':>10} {'bytes written':>14}")
+	for name, result in results.items():
+		print(f"{name:12} {result['median_ms']:10.3f} {result['p95_ms']:10.3f} {result['bytes_written']:14,d}")
+
+	if args.output:
+		with open(args.output, "w", encoding="utf-8") as output:
+			json.dump({"image": str(image), "size": size, "results": results}, output, indent=2)
+		print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,131 @@
+# benchmarks/memory_walk.py
+"""
+Walk through a folder image by image, like holding the Next key, with the
+app's preview cache, prefetch window and metadata index but without the UI,
+and report where memory goes with MemoryProfiler.
+
+At every step the prefetch window is moved, previews that left it are
+evicted, the missing ones are made (as if prefetch kept up), and the
+current image's description is read when ExifTool is available. Memory is
+sampled every --sample-every images, with the cache occupancy at that point.
+
+Usage:
+	python -m benchmarks.memory_walk --folder test_files/folder_of_700_files --output memory-walk.json
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import config
+from utils.cache import ImageCache, FULL
+from utils.exiftool_wrapper import ExifToolPool
+from utils.folder_index import FolderIndex
+from utils.memory_profile import MemoryProfiler, format_sample
+from utils.metadata_index import MetadataIndex, file_signature, description_value, XMP_DESCRIPTION_TAG, EXIF_DESCRIPTION_TAG
+from utils.prefetch import AdaptiveWindow, calculate_cache_distances
+from utils.preview_engine import PreviewEngine
+
+async def walk(args, profiler) -> dict:
+	"""Returns the profiler's report, taken before the cache is released."""
+	from utils.image_decode import downgrade_preview
+
+	images = FolderIndex.scan(args.folder)
+	total = len(images)
+	steps = min(args.steps or total, total)
+	print(f"Walking {steps} of {total} images in {args.folder}")
+
+	cache = ImageCache(
+		args.cache_mb * 1024 * 1024,
+		downgrade=lambda data: downgrade_preview(data, config.PREVIEW_LITE_QUALITY),
+		full_radius=config.IMAGE_CACHE_FULL_RADIUS)
+	engine = PreviewEngine(
+		ThreadPoolExecutor(max_workers=config.PREVIEW_THREADS),
+		max_size=config.PREVIEW_MAX_SIZE,
+		quality=config.PREVIEW_QUALITY,
+		processes=config.PREVIEW_PROCESSES,
+		slot_mb=config.PREVIEW_SHM_SLOT_MB)
+	window = AdaptiveWindow(
+		base=config.PREFETCH_WINDOW,
+		minimum=config.PREFETCH_MIN_WINDOW,
+		maximum=config.PREFETCH_MAX_WINDOW,
+		idle_seconds=config.PREFETCH_IDLE_SECONDS)
+	metadata_index = MetadataIndex()
+
+	exiftool = None
+	if shutil.which(args.exiftool) or Path(args.exiftool).is_file():
+		exiftool = ExifToolPool(executable=args.exiftool, read_workers=config.EXIFTOOL_READ_WORKERS, save_workers=config.EXIFTOOL_SAVE_WORKERS)
+		await asyncio.to_thread(exiftool.start)
+	else:
+		print(f"{args.exiftool} was not found, descriptions are not read.", file=sys.stderr)
+
+	slots = asyncio.Semaphore(engine.workers)
+
+	async def make_preview(path):
+		async with slots:
+			cache.add(path, await engine.render(path))
+
+	def context():
+		stats = cache.stats()
+		return {
+			"cache_entries": stats["entries"],
+			"cache_lite_entries": stats["lite_entries"],
+			"cache_mb": round(stats["bytes"] / (1024 * 1024), 1),
+			"metadata_index": len(metadata_index),
+		}
+
+	profiler.start()
+	try:
+		for step in range(steps):
+			window.record_move(1)
+			behind, ahead = window.window()
+			distances = {images[i]: distance for i, distance in calculate_cache_distances(step, total, behind, ahead).items()}
+			cache.set_focus(distances)
+			cache.evict(set(cache.cache.keys()) - distances.keys())
+
+			missing = [path for path in sorted(distances, key=distances.get) if cache.tier(path) != FULL]
+			await asyncio.gather(*(make_preview(path) for path in missing))
+			window.record_display(cache.lookup(images[step]) is not None)
+
+			if exiftool is not None and metadata_index.get(images[step]) is None:
+				records = await exiftool.get_tags(images[step], [XMP_DESCRIPTION_TAG, EXIF_DESCRIPTION_TAG])
+				record = records[0] if records else {}
+				metadata_index.put(images[step], description_value(record, "Description"), description_value(record, "ImageDescription"), file_signature(images[step]))
+
+			if (step + 1) % args.sample_every == 0 or step + 1 == steps:
+				print(format_sample(profiler.sample(f"image {step + 1}", context())))
+		return profiler.report()
+	finally:
+		engine.shutdown()
+		if exiftool is not None:
+			exiftool.stop()
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--folder", default="test_files/folder_of_700_files")
+	parser.add_argument("--steps", type=int, default=0, help="Images to walk through, all by default.")
+	parser.add_argument("--sample-every", type=int, default=50, help="Images between memory samples.")
+	parser.add_argument("--cache-mb", type=int, default=config.IMAGE_CACHE_MAX_MB, help="Memory budget of the preview cache.")
+	parser.add_argument("--frames", type=int, default=config.MEMORY_PROFILE_FRAMES, help="Stack frames kept per allocation.")
+	parser.add_argument("--exiftool", default="exiftool", help="ExifTool executable, descriptions are not read if it is missing.")
+	parser.add_argument("--output", help="Write the report to this JSON file.")
+	args = parser.parse_args()
+
+	profiler = MemoryProfiler(frames=args.frames)
+	report = asyncio.run(walk(args, profiler))
+	print("\nGrowth since the start, by module:")
+	for entry in report["since_start_by_module"][:10]:
+		print(f"  {entry['size_diff'] / 1024:+12.1f} KiB  {entry['count_diff']:+8d} blocks  {entry['module']}")
+	print("By line:")
+	for entry in report["since_start_by_line"][:10]:
+		print(f"  {entry['size_diff'] / 1024:+12.1f} KiB  {entry['count_diff']:+8d} blocks  {entry['line']}")
+	if args.output:
+		with open(args.output, "w", encoding="utf-8") as output:
+			json.dump(report, output, indent=1)
+		print(f"\nReport written to {args.output}")
+
+if __name__ == "__main__":
+	main()
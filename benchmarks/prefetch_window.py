@@ -0,0 +1,78 @@
+# benchmarks/prefetch_window.py
+"""
+Simulate browsing a folder in bursts of the Next key, with a pause on every
+image where a burst stops, and compare how often the displayed image was
+already cached with a fixed, symmetric prefetch window and with AdaptiveWindow.
+No images are decoded, every preview takes a fixed time to make.
+
+Usage:
+	python -m benchmarks.prefetch_window --images 700 --burst 80 --interval 0.05 --pause 10 --render 0.5 --workers 4
+"""
+import argparse
+
+from utils.prefetch import AdaptiveWindow, calculate_cache_distances
+
+class FakeClock:
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
+def simulate(total, moves, burst, interval, pause, render_time, workers, window_for):
+	"""
+	Returns:
+		tuple: (hit rate, previews rendered) over the walk.
+	"""
+	clock = FakeClock()
+	adaptive = AdaptiveWindow(clock=clock)
+	cached = set()
+	rendered = 0
+	hits = 0
+	budget = 0.0  # Render time available since the last move.
+	index = 0
+	for move in range(moves):
+		behind, ahead = window_for(adaptive)
+		distances = calculate_cache_distances(index, total, behind, ahead)
+		wait = pause if move % burst == 0 else interval
+		budget += wait * workers
+		for candidate in sorted(distances, key=distances.get):
+			if candidate in cached:
+				continue
+			if budget < render_time:
+				break
+			budget -= render_time
+			cached.add(candidate)
+			rendered += 1
+		budget = min(budget, render_time * workers)  # Idle workers can't bank time.
+
+		clock.now += wait
+		index = (index + 1) % total
+		adaptive.record_move(1)
+		hit = index in cached
+		hits += hit
+		adaptive.record_display(hit)
+	return hits / moves, rendered
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--images", type=int, default=700)
+	parser.add_argument("--moves", type=int, default=600)
+	parser.add_argument("--burst", type=int, default=80, help="Key presses between pauses.")
+	parser.add_argument("--interval", type=float, default=0.05, help="Seconds between key presses in a burst.")
+	parser.add_argument("--pause", type=float, default=10.0, help="Seconds spent on the image where a burst stops.")
+	parser.add_argument("--render", type=float, default=0.5, help="Seconds to make one preview.")
+	parser.add_argument("--workers", type=int, default=4)
+	args = parser.parse_args()
+
+	windows = {
+		"symmetric": lambda adaptive: (25, 25),
+		"adaptive": lambda adaptive: adaptive.window(),
+	}
+	for name, window_for in windows.items():
+		hit_rate, rendered = simulate(
+			args.images, args.moves, args.burst, args.interval, args.pause, args.render, args.workers, window_for)
+		print(f"{name:>9}: hit rate {hit_rate:.0%}, {rendered} previews made")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,266 @@
+# benchmarks/suite.py
+"""
+Micro-benchmarks of the image and metadata pipeline, run against test_files/.
+
+Every case is run a few times untimed to warm up, then timed over repeated
+runs. The median, p95, throughput and peak Python memory (tracemalloc, which
+includes numpy buffers but not OpenCV's own) of each case are printed, and
+written to JSON with --output. Pass an earlier JSON file as --baseline to
+compare medians: cases slower by more than --threshold are reported as
+regressions, and the exit code is 1.
+
+Cases needing OpenCV or ExifTool are skipped when they are not available.
+
+Usage:
+	python -m benchmarks.suite --output before.json
+	python -m benchmarks.suite --baseline before.json --only preview,folder
+	python -m benchmarks.suite --exiftool tools/exiftool/exiftool.exe --only native,exiftool
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import config
+from utils.prefetch import calculate_cache_indices, calculate_cache_distances
+from utils.folder_index import FolderIndex, natural_key
+from utils.exiftool_wrapper import ExifToolPool
+from utils.metadata_index import XMP_DESCRIPTION_TAG, EXIF_DESCRIPTION_TAG
+
+GROUPS = ["preview", "prefetch", "folder", "native", "exiftool"]
+
+def measure(func, repeat: int, warmup: int, items: int = 1) -> dict:
+	"""
+	Time func() over repeated runs.
+
+	Args:
+		items (int): Units of work done by one call, for the throughput.
+
+	Returns:
+		dict: Timings in milliseconds, throughput in items per second and peak memory in KiB.
+	"""
+	for _ in range(warmup):
+		func()
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func()
+		times.append((time.perf_counter() - start) * 1000)
+
+	# Measured on a separate run, tracing allocations slows the timed runs down.
+	tracemalloc.start()
+	try:
+		func()
+		peak = tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+	median = statistics.median(times)
+	p95 = statistics.quantiles(times, n=20, method="inclusive")[18] if len(times) > 1 else times[0]
+	return {
+		"runs": repeat,
+		"median_ms": round(median, 4),
+		"p95_ms": round(p95, 4),
+		"min_ms": round(min(times), 4),
+		"max_ms": round(max(times), 4),
+		"throughput_per_s": round(items / (median / 1000), 2) if median else None,
+		"items": items,
+		"peak_kib": round(peak / 1024, 1),
+	}
+
+def preview_cases(image: Path):
+	"""The steps of cache_image(): read, decode (DCT scaled), resize, encode, and base64 for the first paint."""
+	try:
+		import cv2
+		import numpy as np
+		from utils.image_decode import decode_for_preview, render_preview, quick_preview, downgrade_preview
+	except ImportError as e:
+		print(f"Skipping preview benchmarks, {e}", file=sys.stderr)
+		return
+
+	max_size = config.PREVIEW_MAX_SIZE
+	quality = config.PREVIEW_QUALITY
+	data = np.fromfile(str(image), dtype=np.uint8)
+	decoded = decode_for_preview(data, max_size)
+	height, width = decoded.shape[:2]
+	scale = min(1.0, max_size / max(height, width))
+	resized = cv2.resize(decoded, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA) if scale < 1.0 else decoded
+	jpeg_bytes = cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+	yield "preview.read", lambda: np.fromfile(str(image), dtype=np.uint8), 1
+	yield "preview.decode", lambda: decode_for_preview(data, max_size), 1
+	if scale < 1.0:
+		yield "preview.resize", lambda: cv2.resize(decoded, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA), 1
+	yield "preview.encode", lambda: cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, quality]), 1
+	yield "preview.base64", lambda: base64.b64encode(jpeg_bytes).decode("utf-8"), 1
+	yield "preview.render", lambda: render_preview(image, max_size, quality), 1
+	yield "preview.quick", lambda: quick_preview(image), 1
+	yield "preview.downgrade", lambda: downgrade_preview(jpeg_bytes, config.PREVIEW_LITE_QUALITY), 1
+
+def prefetch_cases(total: int = 700, calls: int = 1000):
+	"""Window calculations, every position of a folder in turn."""
+	def indices():
+		for index in range(calls):
+			calculate_cache_indices(index % total, total, config.PREFETCH_WINDOW)
+
+	def distances():
+		for index in range(calls):
+			calculate_cache_distances(index % total, total, config.PREFETCH_WINDOW, config.PREFETCH_MAX_WINDOW)
+
+	yield "prefetch.calculate_cache_indices", indices, calls
+	yield "prefetch.calculate_cache_distances", distances, calls
+
+def folder_cases(folder: Path, synthetic: int = 100_000):
+	"""Scanning and sorting a folder, and the lookups navigation makes."""
+	index = FolderIndex.scan(folder)
+	paths = list(index)
+	names = [f"IMG_{number % 9973}-{number}.jpg" for number in range(synthetic)]
+
+	def lookups():
+		for path in paths:
+			index.index_of(path)
+
+	yield "folder.scan", lambda: FolderIndex.scan(folder), max(1, len(index))
+	yield "folder.natural_sort", lambda: sorted(names, key=natural_key), synthetic
+	yield "folder.index_of", lookups, max(1, len(paths))
+
+def native_cases(folder: Path, image: Path):
+	"""The same reads as the ExifTool cases, parsed without ExifTool."""
+	from metadata.native_reader import read_descriptions, read_many
+	paths = list(FolderIndex.scan(folder))[:config.METADATA_BATCH_SIZE]
+
+	yield "native.read_single", lambda: read_descriptions(image), 1
+	yield "native.read_batch", lambda: read_many(paths), len(paths)
+
+def exiftool_cases(executable: str, folder: Path, image: Path, workdir: Path, loop):
+	"""Reads one by one and in a batch, and a single description save, on a copy of the image."""
+	if shutil.which(executable) is None and not Path(executable).is_file():
+		print(f"Skipping ExifTool benchmarks, {executable} was not found.", file=sys.stderr)
+		return
+	pool = ExifToolPool(executable=executable, read_workers=config.EXIFTOOL_READ_WORKERS, save_workers=config.EXIFTOOL_SAVE_WORKERS)
+	pool.start()
+	try:
+		paths = list(FolderIndex.scan(folder))[:config.METADATA_BATCH_SIZE]
+		tags = [XMP_DESCRIPTION_TAG, EXIF_DESCRIPTION_TAG]
+		copy = workdir / image.name
+		shutil.copyfile(image, copy)
+		descriptions = iter(range(10**9))
+
+		def read_single():
+			loop.run_until_complete(pool.get_tags(paths[0], tags))
+
+		def read_batch():
+			loop.run_until_complete(pool.get_tags_batch(paths, tags))
+
+		def write():
+			tags_dict = {XMP_DESCRIPTION_TAG: f"Benchmark {next(descriptions)}", EXIF_DESCRIPTION_TAG: "Benchmark"}
+			loop.run_until_complete(pool.set_tags(copy, tags_dict, extra_args=["-charset", "utf8", "-overwrite_original"]))
+
+		yield "exiftool.read_single", read_single, 1
+		yield "exiftool.read_batch", read_batch, len(paths)
+		yield "exiftool.write", write, 1
+	finally:
+		pool.stop()
+
+def environment() -> dict:
+	try:
+		commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		commit = None
+	return {
+		"time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+		"commit": commit,
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"cpus": os.cpu_count(),
+	}
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+	"""Print the change of every median against the baseline, and return the names of the regressions."""
+	regressions = []
+	print(f"\nCompared with {baseline['environment'].get('commit') or 'baseline'} ({baseline['environment'].get('time')}):")
+	for name, result in results.items():
+		before = baseline["results"].get(name)
+		if before is None:
+			print(f"  {name:40} new")
+			continue
+		change = result["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+		flag = ""
+		if change > threshold:
+			flag = "  REGRESSION"
+			regressions.append(name)
+		elif change < -threshold:
+			flag = "  faster"
+		print(f"  {name:40} {before['median_ms']:10.3f} -> {result['median_ms']:10.3f} ms  {change:+7.1%}{flag}")
+	return regressions
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--image", default="test_files/folder_with_tags/jpg_large_file_wXMP_wEXIF.jpg", help="Image the preview and write cases use.")
+	parser.add_argument("--folder", default="test_files/folder_of_700_files", help="Folder the folder and read cases use.")
+	parser.add_argument("--exiftool", default="exiftool", help="ExifTool executable.")
+	parser.add_argument("--only", default=",".join(GROUPS), help=f"Comma separated groups to run, of {', '.join(GROUPS)}.")
+	parser.add_argument("--repeat", type=int, default=20, help="Timed runs per case.")
+	parser.add_argument("--warmup", type=int, default=3, help="Untimed runs per case before timing.")
+	parser.add_argument("--output", help="Write the results to this JSON file.")
+	parser.add_argument("--baseline", help="JSON file of an earlier run to compare with.")
+	parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown of the median reported as a regression, 0.10 is 10%%.")
+	args = parser.parse_args()
+
+	groups = {group.strip() for group in args.only.split(",")}
+	unknown = groups - set(GROUPS)
+	if unknown:
+		parser.error(f"Unknown groups: {', '.join(sorted(unknown))}")
+	image = Path(args.image)
+	folder = Path(args.folder)
+
+	loop = asyncio.new_event_loop()
+	results = {}
+	with tempfile.TemporaryDirectory() as workdir:
+		cases = []
+		if "preview" in groups:
+			cases.append(preview_cases(image))
+		if "prefetch" in groups:
+			cases.append(prefetch_cases())
+		if "folder" in groups:
+			cases.append(folder_cases(folder))
+		if "native" in groups:
+			cases.append(native_cases(folder, image))
+		if "exiftool" in groups:
+			cases.append(exiftool_cases(args.exiftool, folder, image, Path(workdir), loop))
+
+		print(f"{'case':40} {'median ms':>10} {'p95 ms':>10} {'items/s':>12} {'peak KiB':>10}")
+		for group in cases:
+			for name, func, items in group:
+				result = measure(func, args.repeat, args.warmup, items)
+				results[name] = result
+				print(f"{name:40} {result['median_ms']:10.3f} {result['p95_ms']:10.3f} {result['throughput_per_s'] or 0:12.1f} {result['peak_kib']:10.1f}")
+	loop.close()
+
+	report = {"environment": environment(), "settings": {"repeat": args.repeat, "warmup": args.warmup, "image": str(image), "folder": str(folder)}, "results": results}
+	if args.output:
+		with open(args.output, "w", encoding="utf-8") as output:
+			json.dump(report, output, indent=2)
+		print(f"\nResults written to {args.output}")
+
+	if args.baseline:
+		with open(args.baseline, encoding="utf-8") as baseline_file:
+			baseline = json.load(baseline_file)
+		regressions = compare(results, baseline, args.threshold)
+		if regressions:
+			print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+			sys.exit(1)
+
+if __name__ == "__main__":
+	main()
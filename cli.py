@@ -0,0 +1,227 @@
+# cli.py
+"""
+Export and import image descriptions without opening the app window.
+
+Usage:
+	python cli.py export FOLDER [--format csv|jsonl] [--output FILE]
+	python cli.py import FILE [--root FOLDER] [--dry-run] [--clear-empty]
+
+Export walks the folder tree and writes one row per image: its path relative
+to FOLDER and its XMP and EXIF descriptions. Import reads a CSV (or JSON Lines)
+file with a "path" column and a "description" column (or the
+"xmp_description" and "exif_description" columns of an export, the XMP one
+first like the editor), and writes each description the same way the editor
+does. Rows without a description are skipped, unless --clear-empty is passed
+to remove the description from those files. Both stream the files in batches over several ExifTool
+processes, so memory use does not grow with the size of the tree. Export
+reads JPEG, PNG and TIFF files without ExifTool when it can, pass
+--exiftool-only to read everything with ExifTool.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+from collections import deque
+from itertools import islice
+from pathlib import Path
+
+from utils.exiftool_wrapper import ExifToolPool
+from utils.folder_index import walk_images
+from utils.metadata_index import description_value, SUPPORTED_EXIF, SUPPORTED_XMP, XMP_DESCRIPTION_TAG, EXIF_DESCRIPTION_TAG
+from metadata.native_reader import read_many
+from metadata.sanitize import description_values, description_tags
+
+EXPORT_FIELDS = ["path", "xmp_description", "exif_description"]
+
+def default_exiftool() -> str:
+	"""The bundled ExifTool on Windows, otherwise the one on the PATH."""
+	bundled = Path(__file__).parent / "tools" / "exiftool" / "exiftool.exe"
+	if os.name == "nt" and bundled.exists():
+		return str(bundled)
+	return "exiftool"
+
+def batched(iterable, size):
+	iterator = iter(iterable)
+	while batch := list(islice(iterator, size)):
+		yield batch
+
+async def pipelined(batches, work, in_flight: int):
+	"""
+	Run work(batch) for every batch, at most in_flight at a time, and yield the results in order.
+	Batches are only taken from the iterator as earlier ones finish, so memory stays constant.
+	"""
+	running = deque()
+	for batch in batches:
+		running.append(asyncio.create_task(work(batch)))
+		if len(running) >= in_flight:
+			yield await running.popleft()
+	while running:
+		yield await running.popleft()
+
+def relative_path(path: Path, root: Path) -> str:
+	try:
+		return path.relative_to(root).as_posix()
+	except ValueError:
+		return str(path)
+
+async def export_descriptions(args) -> int:
+	root = Path(args.folder)
+	pool = ExifToolPool(executable=args.exiftool, read_workers=args.workers, save_workers=1)
+	await asyncio.to_thread(pool.start)
+	output = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+	writer = csv.writer(output) if args.format == "csv" else None
+	if writer:
+		writer.writerow(EXPORT_FIELDS)
+
+	async def read(batch):
+		"""Returns (batch, {path: values}, whether the ExifTool read failed as a whole)."""
+		values, unread = ({}, batch) if args.exiftool_only else await asyncio.to_thread(read_many, batch)
+		if not unread:
+			return batch, values, False
+		try:
+			records = await pool.get_tags_batch(unread, [XMP_DESCRIPTION_TAG, EXIF_DESCRIPTION_TAG])
+		except Exception as e:
+			print(f"Error reading {len(unread)} files from {unread[0].parent}: {e}", file=sys.stderr)
+			return batch, values, True
+		for record in records:
+			path = Path(record.get("SourceFile", ""))
+			extension = path.suffix.lower()
+			values[path] = {
+				"xmp": description_value(record, "Description") if extension in SUPPORTED_XMP else None,
+				"exif": description_value(record, "ImageDescription") if extension in SUPPORTED_EXIF else None,
+			}
+		return batch, values, False
+
+	exported = failed = 0
+
+	def unreadable(folder, error):
+		nonlocal failed
+		failed += 1
+		print(f"Could not read {folder}: {error}", file=sys.stderr)
+
+	try:
+		images = walk_images(root, on_error=unreadable)
+		async for batch, values, batch_failed in pipelined(batched(images, args.batch_size), read, args.workers * 2):
+			for path in batch:
+				record = values.get(path)
+				if record is None:
+					failed += 1
+					if not batch_failed:
+						print(f"{path}: ExifTool could not read the file.", file=sys.stderr)
+					continue
+				row = [relative_path(path, root), record.get("xmp") or "", record.get("exif") or ""]
+				if writer:
+					writer.writerow(row)
+				else:
+					output.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + "\n")
+				exported += 1
+	finally:
+		if output is not sys.stdout:
+			output.close()
+		pool.stop()
+	print(f"Exported {exported} image(s), {failed} could not be read.", file=sys.stderr)
+	return 1 if failed else 0
+
+def read_import_rows(source: Path):
+	"""Yield (path, description) from a CSV or JSON Lines file, one row at a time."""
+	with open(source, newline="", encoding="utf-8-sig") as rows:
+		if source.suffix.lower() in (".jsonl", ".ndjson"):
+			records = (json.loads(line) for line in rows if line.strip())
+		else:
+			records = csv.DictReader(rows)
+		for record in records:
+			path = record.get("path")
+			description = record.get("description")
+			if description is None and ("xmp_description" in record or "exif_description" in record):
+				# An export: the XMP description, or the EXIF one when there is none, as the editor shows it.
+				description = record.get("xmp_description") or record.get("exif_description") or ""
+			if path is None or description is None:
+				raise ValueError(f'{source} needs a "path" and a "description" (or "xmp_description") column.')
+			yield path, description
+
+async def import_descriptions(args) -> int:
+	root = Path(args.root)
+	source = Path(args.file)
+	# Bulk writes go to every read worker but the first, the first and the save worker stay idle.
+	pool = ExifToolPool(executable=args.exiftool, read_workers=args.workers + 1, save_workers=1)
+	if not args.dry_run:
+		await asyncio.to_thread(pool.start)
+
+	async def write(batch):
+		items = []
+		results = []
+		for path, description in batch:
+			path = Path(path)
+			path = path if path.is_absolute() else root / path
+			values = description_values(path, description)
+			if not values:
+				results.append((path, False, "Not a supported image format."))
+			elif not description and not args.clear_empty:
+				results.append((path, None, "Skipped, no description."))
+			elif args.dry_run:
+				results.append((path, True, f"Would write {values}"))
+			else:
+				items.append((path, description_tags(values)))
+		if not items:
+			return results
+		try:
+			summaries = await pool.set_tags_many(items, extra_args=["-charset", "utf8", "-overwrite_original"])
+		except Exception as e:
+			return results + [(path, False, str(e)) for path, _ in items]
+		for (path, _), summary in zip(items, summaries):
+			if summary["errors"] or summary["failed"] or not (summary["updated"] or summary["unchanged"]):
+				results.append((path, False, "; ".join(summary["errors"] + summary["warnings"]) or "Not updated."))
+			else:
+				results.append((path, True, "Updated" if summary["updated"] else "Unchanged"))
+		return results
+
+	written = skipped = failed = 0
+	try:
+		async for results in pipelined(batched(read_import_rows(source), args.batch_size), write, args.workers * 2):
+			for path, ok, message in results:
+				if ok is None:
+					skipped += 1
+					if args.dry_run:
+						print(f"{path}: {message}")
+				elif ok:
+					written += 1
+					if args.dry_run:
+						print(f"{path}: {message}")
+				else:
+					failed += 1
+					print(f"{path}: {message}", file=sys.stderr)
+	finally:
+		pool.stop()
+	action = "Would write" if args.dry_run else "Wrote"
+	print(f"{action} {written} image(s), {skipped} skipped, {failed} failed.", file=sys.stderr)
+	return 1 if failed else 0
+
+def main(argv=None) -> int:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--exiftool", default=default_exiftool(), help="ExifTool executable.")
+	parser.add_argument("--workers", type=int, default=4, help="ExifTool processes to run at once.")
+	parser.add_argument("--batch-size", type=int, default=100, help="Files per ExifTool batch.")
+	commands = parser.add_subparsers(dest="command", required=True)
+
+	export_parser = commands.add_parser("export", help="Write the descriptions of a folder tree to CSV or JSON Lines.")
+	export_parser.add_argument("folder")
+	export_parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+	export_parser.add_argument("--output", default="-", help="Output file, - for standard output.")
+	export_parser.add_argument("--exiftool-only", action="store_true", help="Read every file with ExifTool, not only those the native reader cannot parse.")
+
+	import_parser = commands.add_parser("import", help="Write descriptions from a CSV or JSON Lines file to the images.")
+	import_parser.add_argument("file")
+	import_parser.add_argument("--root", default=".", help="Folder relative paths in the file are resolved against.")
+	import_parser.add_argument("--dry-run", action="store_true", help="Show what would be written without changing any file.")
+	import_parser.add_argument("--clear-empty", action="store_true", help="Remove the description of files whose row has none, instead of skipping them.")
+
+	args = parser.parse_args(argv)
+	args.workers = max(1, args.workers)
+	if args.command == "export":
+		return asyncio.run(export_descriptions(args))
+	return asyncio.run(import_descriptions(args))
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -1,8 +1,65 @@
+import os
 from pathlib import Path
 
 # config.py 📂
 DEVELOPMENT_MODE = True  # Set to False in production to hide debug info
 AUTOLOAD_DEV_IMAGE = Path("test_files\jpg_large_file.jpg")
 
+# Startup Settings
+STARTUP_REPORT = DEVELOPMENT_MODE  # Print where startup time went once the window is shown
+STARTUP_BUDGET_SECONDS = 3.0  # Cold start target, from launch to the first page shown
+
 # Image Buffer Settings
-IMAGE_CACHE_SIZE = 15  # Maximum number of images to store in memory
+IMAGE_CACHE_MAX_MB = 256  # Memory budget for the previews held in memory
+IMAGE_CACHE_FULL_RADIUS = 5  # Previews this close to the current image are never downgraded
+PREVIEW_LITE_QUALITY = 40  # JPEG quality of downgraded (half size) previews far from the current image
+PREVIEW_MAX_SIZE = 1920  # Longest side of the previews shown in the app, in pixels
+PREVIEW_QUALITY = 60  # JPEG quality of the previews
+PREVIEW_THREADS = 4  # Threads making previews when PREVIEW_PROCESSES is 0
+PREVIEW_PROCESSES = 0  # Worker processes making previews, 0 uses threads instead (set to the number of cores to use them all)
+PREVIEW_SHM_SLOT_MB = 8  # Size of each shared memory slot used to hand previews back from worker processes
+
+# Folder Settings
+FOLDER_NATURAL_SORT = True  # Order numbers in file names by value ("image-2" before "image-10")
+FOLDER_WATCH = True  # Pick up images added, removed or edited outside the app
+FOLDER_POLL_SECONDS = 2  # Interval between folder checks when change notifications are unavailable
+
+# Prefetch Settings
+PREFETCH_WINDOW = 25  # Images prefetched on each side of the current image before the user starts navigating
+PREFETCH_MIN_WINDOW = 4  # Images prefetched in total while the user is editing or idle
+PREFETCH_MAX_WINDOW = 60  # Most images prefetched in the direction the user is navigating
+PREFETCH_IDLE_SECONDS = 30  # Time on one image before the prefetch window shrinks
+
+# Preview Store Settings (previews kept on disk between sessions)
+APP_DATA_DIR = Path(os.environ.get("LOCALAPPDATA", Path.home() / ".cache")) / "ImageCataloger"
+PREVIEW_CACHE_DIR = APP_DATA_DIR / "previews"
+PREVIEW_CACHE_QUOTA_MB = 1024  # Least recently used previews are removed above this size
+
+# Metadata Index Settings
+METADATA_BATCH_SIZE = 100  # Number of files read per ExifTool call when indexing a folder
+NATIVE_METADATA_READER = True  # Read descriptions from JPEG, PNG and TIFF files directly, ExifTool only reads what it cannot parse
+NATIVE_METADATA_THREADS = 4  # Batches read at once by the native reader when indexing a folder
+CATALOG_PATH = APP_DATA_DIR / "catalog.sqlite3"  # Descriptions of every image read, for searching
+EDIT_JOURNAL_PATH = APP_DATA_DIR / "edits.jsonl"  # Edits not written to their files yet, replayed after a crash
+SAVE_RETRY_MAX_SECONDS = 60  # Longest wait before a failed save is tried again, the wait doubles from 2 seconds
+XMP_IN_PLACE = True  # Overwrite descriptions in the file's existing XMP padding when they fit, instead of rewriting the file with ExifTool
+IN_PLACE_UNDO_DIR = APP_DATA_DIR / "in-place-undo"  # Old bytes of in-place writes in progress, put back after a crash
+BATCH_EDIT_CHUNK_SIZE = 50  # Files written per ExifTool batch when editing many images at once
+
+# ExifTool Settings
+EXIFTOOL_READ_WORKERS = 2  # Persistent ExifTool processes used for reading metadata
+EXIFTOOL_SAVE_WORKERS = 1  # Persistent ExifTool processes reserved for saving metadata
+
+# Metrics Settings
+METRICS_ENABLED = True  # Serve queue, cache and latency metrics at /metrics, in the Prometheus text format
+
+# Memory Profiling Settings (development, tracemalloc slows the app down)
+MEMORY_PROFILE = False  # Snapshot allocations periodically and report what grew, by module and line
+MEMORY_PROFILE_INTERVAL = 30  # Seconds between snapshots
+MEMORY_PROFILE_FRAMES = 1  # Stack frames kept per allocation
+MEMORY_PROFILE_DIR = APP_DATA_DIR / "memory"  # A JSON report is written here per session
+
+# Tracing Settings
+TRACE_ENABLED = False  # Record spans of the image pipeline, written to TRACE_PATH when the app closes
+TRACE_PATH = APP_DATA_DIR / "trace.json"  # Chrome trace JSON, open it in https://ui.perfetto.dev
+TRACE_MAX_EVENTS = 200_000  # Oldest spans are dropped above this
@@ -1,57 +1,97 @@
 # main.py
-import os
-import atexit
-import asyncio
-from nicegui import ui, app
-
-
-from ui.dialogs import ErrorDialog
-from utils.tasks import save_metadata_queue, cache_worker
-from ui.layout import setup_ui
-from utils.state import state
-from utils.file_utils import load_initial_image
-import config
-
-# Initialize the UI
-setup_ui()
-
-@app.on_startup
-async def start_background_tasks():
-	print("DEBUG: Starting save_metadata_queue...")
-	asyncio.create_task(save_metadata_queue())
-	if state.bg_cache_task is None or state.bg_cache_task.done():
-		state.bg_cache_task = asyncio.create_task(cache_worker())		 
-
-@app.on_startup
-async def setup_dev():
-	if config.DEVELOPMENT_MODE:
-		asyncio.create_task(load_initial_image(config.AUTOLOAD_DEV_IMAGE))
-
-# Flag to prevent multiple shutdown calls
-shutdown_called = False
-
-def on_close():
-	"""Ensure NiceGUI shuts down only once when the window is closed."""
-	global shutdown_called
-	if shutdown_called:
-		return  # Prevent multiple calls
-	shutdown_called = True
-
-	print("Window closed. Exiting program...")
-	try:
-		app.shutdown()  # Gracefully shut down NiceGUI
-	except Exception as e:
-		print(f"Error shutting down NiceGUI: {e}")
-	os._exit(0)  # Hard exit to prevent any hanging
-
-# Register cleanup function to run when the window is closed
-atexit.register(on_close)
-
-# Run the NiceGUI app in native mode
-ui.run(
-	title="EXIF/XMP Metadata Editor",
-	native=True,  # Opens in a standalone window
-	#window_size=(1200, 800),  # Set initial window size
-	fullscreen=False,  # Prevent fullscreen on startup
-	dark=True
-)
\ No newline at end of file
+from utils.preview_engine import is_preview_worker
+
+# Preview worker processes are spawned and import this module again. They only run
+# render_to_shared_memory(): the UI, the app state and the exit hook are not set up there.
+if not is_preview_worker():
+	import config
+	from utils import startup_timing
+	if config.STARTUP_REPORT:
+		startup_timing.install() # Before the app's imports, so they are all timed.
+
+	import os
+	import atexit
+	import asyncio
+	from nicegui import ui, app
+
+
+	from ui.dialogs import ErrorDialog
+	from utils.tasks import save_metadata_queue, cache_worker, replay_edit_journal, start_exiftool, warm_up, memory_profile_worker, prefetch_idle_worker
+	from ui.layout import setup_ui
+	from utils.state import state
+	from utils.file_utils import load_initial_image
+	from utils import tracing
+	from utils.memory_profile import MemoryProfiler
+
+	# Initialize the UI
+	with startup_timing.phase("setup_ui()"):
+		setup_ui()
+
+	@app.on_startup
+	async def start_background_tasks():
+		startup_timing.mark("server started")
+		# Not awaited, the window is shown while ExifTool starts.
+		asyncio.create_task(start_exiftool())
+		print("DEBUG: Starting save_metadata_queue...")
+		asyncio.create_task(save_metadata_queue())
+		replay_edit_journal()
+		if state.bg_cache_task is None or state.bg_cache_task.done():
+			state.bg_cache_task = asyncio.create_task(cache_worker())		 
+		asyncio.create_task(prefetch_idle_worker())
+		if config.MEMORY_PROFILE:
+			state.memory_profiler = MemoryProfiler(frames=config.MEMORY_PROFILE_FRAMES)
+			asyncio.create_task(memory_profile_worker())
+
+	@app.on_connect
+	def first_page_shown():
+		"""Report the startup time, then load what was left out of startup."""
+		if state.warm_up_task is not None:
+			return
+		if config.STARTUP_REPORT:
+			startup_timing.report(config.STARTUP_BUDGET_SECONDS)
+		state.warm_up_task = asyncio.create_task(warm_up())
+
+	@app.on_startup
+	async def setup_dev():
+		if config.DEVELOPMENT_MODE:
+			asyncio.create_task(load_initial_image(config.AUTOLOAD_DEV_IMAGE))
+
+	# Flag to prevent multiple shutdown calls
+	shutdown_called = False
+
+	def on_close():
+		"""Ensure NiceGUI shuts down only once when the window is closed."""
+		global shutdown_called
+		if shutdown_called:
+			return  # Prevent multiple calls
+		shutdown_called = True
+
+		print("Window closed. Exiting program...")
+		try:
+			state.preview_engine.shutdown()
+			state.exiftool_process.stop()
+			state.preview_store.close()
+			state.catalog.close()
+			state.edit_journal.close()
+			tracing.save()
+			if state.memory_profiler is not None:
+				print(f"Memory report written to {state.memory_profiler.save(config.MEMORY_PROFILE_DIR)}")
+		except Exception as e:
+			print(f"Error stopping background workers: {e}")
+		try:
+			app.shutdown()  # Gracefully shut down NiceGUI
+		except Exception as e:
+			print(f"Error shutting down NiceGUI: {e}")
+		os._exit(0)  # Hard exit to prevent any hanging
+
+	# Register cleanup function to run when the window is closed
+	atexit.register(on_close)
+
+	# Run the NiceGUI app in native mode
+	ui.run(
+		title="EXIF/XMP Metadata Editor",
+		native=True,  # Opens in a standalone window
+		#window_size=(1200, 800),  # Set initial window size
+		fullscreen=False,  # Prevent fullscreen on startup
+		dark=True
+	)
\ No newline at end of file
@@ -0,0 +1,151 @@
+# metadata/batch_edit.py
+import asyncio
+import fnmatch
+from utils.state import state
+from utils.metadata_index import file_signature
+from utils.file_utils import index_folder_metadata
+from metadata.sanitize import description_values, description_tags
+
+APPLY = "apply"  # Replace the description.
+APPEND = "append"  # Add the text after the current description.
+PREFIX = "prefix"  # Add the text before the current description.
+
+def current_description(entry) -> str:
+	"""The description the editor would show for an index entry."""
+	if entry is None:
+		return ""
+	return entry["xmp"] or entry["exif"] or ""
+
+def indexed_entries(image_paths) -> dict:
+	"""Path -> metadata index entry, None if missing or stale. Stats every file, call it from a thread."""
+	return {path: state.metadata_index.get(path) for path in image_paths}
+
+def combine_description(mode: str, text: str, current: str) -> str:
+	"""
+	Returns:
+		str: The new description for a file, from its current description.
+	"""
+	if mode == APPLY or not current:
+		return text
+	if not text:
+		return current
+	if mode == APPEND:
+		separator = "" if current[-1].isspace() or text[0].isspace() else " "
+		return current + separator + text
+	if mode == PREFIX:
+		separator = "" if text[-1].isspace() or current[0].isspace() else " "
+		return text + separator + current
+	raise ValueError(f"Unknown batch edit mode: {mode}")
+
+def select_images(image_paths, first: int = None, last: int = None, name_filter: str = "", text_filter: str = "") -> list:
+	"""
+	Choose the images of a folder to edit.
+
+	Args:
+		image_paths (list): The folder's images, in navigation order.
+		first (int): 1-based position of the first image, None for the start of the folder.
+		last (int): 1-based position of the last image (included), None for the end of the folder.
+		name_filter (str): Wildcard pattern the file name must match, e.g. "IMG_12*", case-insensitive.
+		text_filter (str): Text the current description must contain, case-insensitive.
+			Looking up the descriptions stats every file, call it from a thread when filtering by text.
+	"""
+	start = max(0, (first or 1) - 1)
+	end = len(image_paths) if last is None else min(len(image_paths), last)
+	selected = list(image_paths[start:end])
+	if name_filter:
+		pattern = name_filter.lower()
+		selected = [path for path in selected if fnmatch.fnmatchcase(path.name.lower(), pattern)]
+	if text_filter:
+		needle = text_filter.casefold()
+		entries = indexed_entries(selected)
+		selected = [path for path in selected if needle in current_description(entries[path]).casefold()]
+	return selected
+
+async def apply_batch(image_paths, mode: str, text: str, chunk_size: int = 50, on_progress=None) -> list:
+	"""
+	Apply, append or prefix a description to many images.
+
+	Files are written in chunks: each chunk goes to an ExifTool worker as one
+	batch of commands, and the chunks are spread over the workers.
+
+	Args:
+		image_paths (list): Images to edit. For APPEND and PREFIX, files missing from the metadata index
+			or changed since are read first, and skipped with a failed result if that fails too.
+		on_progress (callable): Called with (done, total) after each chunk.
+
+	Returns:
+		list: (path, ok, message) per file.
+	"""
+	results = []
+	entries = {}
+	if mode != APPLY:
+		entries = await asyncio.to_thread(indexed_entries, image_paths)
+		unindexed = [path for path, entry in entries.items() if entry is None]
+		if unindexed:
+			await index_folder_metadata(unindexed)
+			entries.update(await asyncio.to_thread(indexed_entries, unindexed))
+
+	edits = []
+	for path in image_paths:
+		entry = entries.get(path)
+		if mode != APPLY and entry is None:
+			# Combining with an unknown description would overwrite it.
+			results.append((path, False, "The current description could not be read, the file was not edited."))
+			continue
+		new_description = combine_description(mode, text, current_description(entry))
+		values = description_values(path, new_description)
+		if values:
+			edits.append((path, values))
+
+	total = len(edits)
+	done = 0
+	workers = asyncio.Semaphore(len(state.exiftool_process.batch_workers))
+
+	async def write_chunk(chunk):
+		nonlocal done
+		async with workers:
+			items = [(path, description_tags(values)) for path, values in chunk]
+			signatures_before = await asyncio.to_thread(lambda: [signature_or_none(path) for path, _ in chunk])
+			try:
+				summaries = await state.exiftool_process.set_tags_many(
+					items, extra_args=["-charset", "utf8", "-overwrite_original"])
+			except Exception as e:
+				results.extend((path, False, str(e)) for path, _ in chunk)
+			else:
+				written = []
+				for (path, values), summary, signature_before in zip(chunk, summaries, signatures_before):
+					if summary["errors"] or summary["failed"] or not (summary["updated"] or summary["unchanged"]):
+						message = "; ".join(summary["errors"] + summary["warnings"]) or "ExifTool did not update the file."
+						results.append((path, False, message))
+						state.metadata_index.discard([path])
+					else:
+						results.append((path, True, "Updated" if summary["updated"] else "Unchanged"))
+						written.append((path, values, signature_before))
+				await asyncio.to_thread(record_written, written)
+			done += len(chunk)
+			if on_progress:
+				on_progress(done, total)
+
+	chunks = [edits[start:start + chunk_size] for start in range(0, total, chunk_size)]
+	await asyncio.gather(*(write_chunk(chunk) for chunk in chunks))
+	return results
+
+def signature_or_none(path):
+	try:
+		return file_signature(path)
+	except OSError:
+		return None  # ExifTool reports the missing file.
+
+def record_written(written):
+	"""Update the metadata index, the catalog and the preview store for files that were written."""
+	entries = []
+	for path, values, signature_before in written:
+		try:
+			signature_after = file_signature(path)
+		except OSError:
+			continue
+		state.metadata_index.put(path, values.get("xmp"), values.get("exif"), signature_after)
+		if signature_before is not None:
+			state.preview_store.rekey(path, signature_before, signature_after)
+		entries.append((path, signature_after, values.get("xmp"), values.get("exif")))
+	state.catalog.put_many(entries)
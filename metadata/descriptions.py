@@ -0,0 +1,58 @@
+# metadata/descriptions.py
+import asyncio
+import os
+from pathlib import Path
+from utils.state import state
+from metadata.sanitize import description_values, description_tags
+from metadata.inplace_writer import write_in_place, InPlaceUnavailable
+import config
+
+def is_unchanged(image_path, new_description: str) -> bool:
+	"""
+	Whether saving a description would change nothing: it equals the edit still
+	waiting to be written, or, for the image on display, the values in the file.
+	"""
+	image_path = Path(image_path)
+	if image_path in state.pending_edits:
+		return state.pending_edits[image_path] == new_description
+	if image_path != state.current_image:
+		return False
+	values = description_values(image_path, new_description)
+	current = {"xmp": state.meta_value_xmp or None, "exif": state.meta_value_exif or None}
+	return all(current[key] == value for key, value in values.items())
+
+async def set_description(image_path, new_description: str) -> dict:
+	"""
+	Write the XMP and EXIF descriptions in the file's existing bytes when they fit,
+	otherwise in a single ExifTool command, so the file is rewritten once.
+
+	Returns:
+		dict: The values written, as returned by description_values().
+
+	Raises:
+		FileNotFoundError: ExifTool or the image is missing.
+		RuntimeError: ExifTool reported that the file was not updated.
+		OSError: Writing in place failed.
+	"""
+	values = description_values(image_path, new_description)
+	tags = description_tags(values)
+	if not tags:
+		return values
+
+	if config.XMP_IN_PLACE and os.path.isfile(image_path):
+		try:
+			await asyncio.to_thread(write_in_place, image_path, values, config.IN_PLACE_UNDO_DIR)
+			return values
+		except InPlaceUnavailable:
+			pass  # Rewritten by ExifTool below.
+
+	if not os.path.isfile(state.exiftool_path) or not os.path.isfile(image_path):
+		raise FileNotFoundError(f"A required file was not found at either {state.exiftool_path} or {image_path}.")
+
+	summary = await state.exiftool_process.set_tags(
+		image_path,
+		tags_dict=tags,
+		extra_args=["-charset", "utf8", "-overwrite_original"])
+	if summary["errors"] or summary["failed"] or not (summary["updated"] or summary["unchanged"]):
+		raise RuntimeError("; ".join(summary["errors"] + summary["warnings"]) or "ExifTool did not update the file.")
+	return values
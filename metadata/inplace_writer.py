@@ -0,0 +1,338 @@
+# metadata/inplace_writer.py
+"""
+Write descriptions into the existing bytes of a file, without rewriting it.
+
+ExifTool rewrites the whole file on every save, which takes seconds for a
+large TIFF on a network drive. XMP packets usually end with whitespace
+padding left for edits like this one: when the new description fits, only
+the changed bytes of the packet are overwritten, and the EXIF
+ImageDescription too when the new value fits in the bytes of the old one.
+A longer ImageDescription is appended to a TIFF file. Otherwise, or when
+anything about the file is unusual, InPlaceUnavailable is raised and the
+caller saves with ExifTool.
+
+Before the file is touched, the old and new content of every byte range is
+written to an undo record, which is removed once the file is flushed to
+disk. recover() puts back the old bytes of files a crash left half written,
+the edit journal then writes the description again.
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import zlib
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from utils.image_structure import find_jpeg_app_segment, TiffReader, TAG_IMAGE_DESCRIPTION, TAG_XMP
+from metadata.native_reader import (
+	xmp_description, UnsupportedMetadata, JPEG_EXIF_PREFIX, JPEG_XMP_PREFIX, PNG_SIGNATURE, PNG_XMP_KEYWORD)
+
+# The whitespace padding at the end of a packet, and the trailer marking it writable.
+XPACKET_PADDING = re.compile(rb"""(\s*)<\?xpacket end=["']w["']\?>""")
+# The x-default value of dc:description as ExifTool and most other writers lay it out.
+X_DEFAULT_DESCRIPTION = re.compile(
+	rb"""<dc:description>\s*<rdf:Alt>\s*(?:<rdf:li xml:lang=["'][^"']*["']>[^<]*</rdf:li>\s*)*?"""
+	rb"""<rdf:li xml:lang=["']x-default["']>([^<]*)</rdf:li>""")
+
+class InPlaceUnavailable(ValueError):
+	"""The description cannot be written in the file's existing bytes, save it with ExifTool."""
+
+def write_in_place(image_path, values: dict, undo_dir) -> int:
+	"""
+	Overwrite the descriptions in the file's existing metadata.
+
+	Args:
+		values (dict): {"xmp": str|None, "exif": str|None} as returned by description_values(),
+			every key must be written in place or nothing is.
+		undo_dir: Folder of the undo records.
+
+	Returns:
+		int: Bytes written to the image.
+
+	Raises:
+		InPlaceUnavailable: Nothing was written, save with ExifTool.
+		OSError: The write failed. The old bytes were put back, or are left to recover().
+	"""
+	# Absolute, recover() may run from another working directory.
+	image_path = Path(os.path.abspath(image_path))
+	record_path = _record_path(undo_dir, image_path)
+	if record_path.exists():
+		_recover(record_path)
+
+	with open(image_path, "r+b") as file:
+		patches = _plan(file, values)
+		if not patches:
+			return 0
+		size = os.fstat(file.fileno()).st_size
+		try:
+			_write_record(record_path, {
+				"path": str(image_path),
+				"size": size,
+				"patches": [[offset, old.hex(), new.hex()] for offset, old, new in patches],
+			})
+		except OSError as e:
+			raise InPlaceUnavailable(f"The undo record could not be written: {e}") from None
+
+		try:
+			_apply(file, [(offset, new) for offset, _, new in patches])
+		except OSError:
+			# Put the old bytes back. If that fails too, the record stays for recover().
+			_apply(file, [(offset, old) for offset, old, _ in patches], size)
+			record_path.unlink()
+			raise
+	record_path.unlink()
+	return sum(len(new) for _, _, new in patches)
+
+def recover(undo_dir) -> list:
+	"""
+	Put back the old bytes of in-place writes a crash interrupted, and remove their undo records.
+
+	Returns:
+		list: Paths of the files restored.
+	"""
+	restored = []
+	undo_dir = Path(undo_dir)
+	if not undo_dir.is_dir():
+		return restored
+	for record_path in sorted(undo_dir.glob("*.json")):
+		try:
+			path = _recover(record_path)
+		except (OSError, ValueError, KeyError) as e:
+			print(f"Error recovering the in-place write recorded in {record_path}: {e}")
+			continue
+		if path is not None:
+			restored.append(path)
+	return restored
+
+def _record_path(undo_dir, image_path: Path) -> Path:
+	key = hashlib.sha1(os.path.normcase(os.path.abspath(image_path)).encode("utf-8")).hexdigest()
+	return Path(undo_dir) / f"{key}.json"
+
+def _write_record(record_path: Path, record: dict):
+	record_path.parent.mkdir(parents=True, exist_ok=True)
+	temporary = record_path.with_suffix(".tmp")
+	with open(temporary, "w", encoding="utf-8") as file:
+		json.dump(record, file)
+		file.flush()
+		os.fsync(file.fileno())
+	os.replace(temporary, record_path)
+	try:
+		# Make the rename durable, not possible on Windows where it is not needed.
+		directory = os.open(record_path.parent, os.O_RDONLY)
+	except OSError:
+		return
+	try:
+		os.fsync(directory)
+	finally:
+		os.close(directory)
+
+def _apply(file, writes, size: int = None):
+	"""Write (offset, data) pairs and flush them to disk, cutting the file back to size if given."""
+	for offset, data in writes:
+		file.seek(offset)
+		file.write(data)
+	if size is not None:
+		file.truncate(size)
+	file.flush()
+	os.fsync(file.fileno())
+
+def _recover(record_path: Path):
+	"""Returns the path of the file restored, None if it was complete, untouched or changed since."""
+	with open(record_path, encoding="utf-8") as file:
+		record = json.load(file)
+	path = Path(record["path"])
+	patches = [(offset, bytes.fromhex(old), bytes.fromhex(new)) for offset, old, new in record["patches"]]
+	size = record["size"]
+	appended = sum(len(new) for offset, old, new in patches if not old)
+	restored = None
+	if path.is_file() and size <= path.stat().st_size <= size + appended:
+		with open(path, "r+b") as file:
+			current = []
+			for offset, _, new in patches:
+				file.seek(offset)
+				current.append(file.read(len(new)))
+			written = all(data == new for data, (_, _, new) in zip(current, patches))
+			untouched = os.fstat(file.fileno()).st_size == size and all(
+				data == old for data, (_, old, _) in zip(current, patches) if old)
+			if not written and not untouched:
+				_apply(file, [(offset, old) for offset, old, _ in patches], size)
+				restored = path
+	else:
+		print(f"{path} changed since its in-place write was interrupted, it is left as it is.")
+	record_path.unlink()
+	return restored
+
+def _plan(file, values: dict) -> list:
+	"""(offset, old bytes, new bytes) for every range to overwrite, from a read-only map of the file."""
+	try:
+		mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+	except ValueError:
+		raise InPlaceUnavailable("The file is empty.") from None
+	error = None
+	try:
+		with memoryview(mapped) as view:
+			patches = _plan_view(view, values)
+	except InPlaceUnavailable as e:
+		error = str(e)
+	except (UnsupportedMetadata, ValueError, IndexError, struct.error) as e:
+		error = f"Unsupported file: {e}"
+	# Closed once the views of the map are gone, they are released with the exception above.
+	mapped.close()
+	if error is not None:
+		raise InPlaceUnavailable(error)
+	return [patch for patch in patches if patch[1] != patch[2]]
+
+def _plan_view(view, values: dict) -> list:
+	head = bytes(view[:8])
+	xmp_range = exif_reader = append_at = None
+	if head[:2] == b"\xff\xd8":
+		xmp_range = find_jpeg_app_segment(view, 0xE1, JPEG_XMP_PREFIX)
+		exif_range = find_jpeg_app_segment(view, 0xE1, JPEG_EXIF_PREFIX)
+		if exif_range is not None:
+			exif_reader = TiffReader(view, *exif_range)
+	elif head[:4] in (b"II*\x00", b"MM\x00*"):
+		exif_reader = TiffReader(view)
+		append_at = len(view)
+		entries, _ = exif_reader.ifd(exif_reader.first_ifd)
+		if TAG_XMP in entries:
+			field_type, count, position = entries[TAG_XMP]
+			if field_type not in (1, 7):  # BYTE or UNDEFINED
+				raise InPlaceUnavailable(f"XMP stored as TIFF type {field_type}.")
+			xmp_range = (position, position + len(exif_reader.raw(entries[TAG_XMP])))
+	elif head == PNG_SIGNATURE:
+		if "exif" in values:
+			raise InPlaceUnavailable("PNG EXIF is not written in place.")
+		return _png_patches(view, values["xmp"]) if "xmp" in values else []
+	else:
+		raise InPlaceUnavailable("Unknown file format.")
+
+	patches = []
+	if "xmp" in values:
+		if xmp_range is None:
+			raise InPlaceUnavailable("The file has no XMP packet.")
+		start, end = xmp_range
+		packet = bytes(view[start:end])
+		patches.append(_changed_range(start, packet, _xmp_packet(packet, values["xmp"])))
+	if "exif" in values:
+		if exif_reader is None:
+			raise InPlaceUnavailable("The file has no EXIF data.")
+		patches.extend(_exif_patches(exif_reader, values["exif"], append_at))
+	return patches
+
+def _changed_range(offset: int, old: bytes, new: bytes):
+	"""The smallest patch turning old into new, when both are the same length."""
+	if len(old) != len(new):
+		return offset, old, new
+	first = 0
+	while first < len(old) and old[first] == new[first]:
+		first += 1
+	last = len(old)
+	while last > first and old[last - 1] == new[last - 1]:
+		last -= 1
+	return offset + first, old[first:last], new[first:last]
+
+def _xmp_packet(packet: bytes, description) -> bytes:
+	"""The packet with description as its x-default dc:description, the same length, taken from or given to the padding."""
+	if not description:
+		raise InPlaceUnavailable("Removing the description changes the packet's structure.")
+	matches = list(X_DEFAULT_DESCRIPTION.finditer(packet))
+	trailers = list(XPACKET_PADDING.finditer(packet))
+	if len(matches) != 1:
+		raise InPlaceUnavailable("The packet has no single x-default dc:description to overwrite.")
+	if not trailers or trailers[-1].start() < matches[0].end():
+		raise InPlaceUnavailable("The packet is not writable in place.")
+	value_start, value_end = matches[0].span(1)
+	padding_start, padding_end = trailers[-1].span(1)
+
+	value = escape(description).encode("utf-8")
+	grown = len(value) - (value_end - value_start)
+	padding = packet[padding_start:padding_end]
+	if grown > len(padding):
+		raise InPlaceUnavailable(f"The description needs {grown} more bytes, the XMP padding has {len(padding)}.")
+	padding = padding[grown:] if grown >= 0 else b" " * -grown + padding
+	updated = packet[:value_start] + value + packet[value_end:padding_start] + padding + packet[padding_end:]
+
+	# Read it back like any other file, what ExifTool would not read the same way is not written.
+	if xmp_description(updated) != description:
+		raise InPlaceUnavailable("The description does not read back the same from XMP.")
+	return updated
+
+def _entry_position(reader: TiffReader, tag: int) -> int:
+	"""File position of a tag's 12 byte entry in IFD0."""
+	position = reader.base + reader.first_ifd
+	count = struct.unpack(reader.order + "H", reader.view[position:position + 2])[0]
+	for index in range(count):
+		entry = position + 2 + index * 12
+		if struct.unpack(reader.order + "H", reader.view[entry:entry + 2])[0] == tag:
+			return entry
+	raise InPlaceUnavailable(f"Tag {tag:#06x} not found.")
+
+def _exif_patches(reader: TiffReader, description, append_at: int = None) -> list:
+	"""
+	Patches overwriting ImageDescription in IFD0, where the old value is.
+
+	The count is kept and the value padded with NULs, readers stop at the first one,
+	so a later, longer description still fits in the bytes the first one had.
+	A value longer than that is appended at append_at, the end of a TIFF file, and the entry pointed at it.
+	"""
+	if not description:
+		raise InPlaceUnavailable("Removing ImageDescription changes the IFD.")
+	entries, _ = reader.ifd(reader.first_ifd)
+	if TAG_IMAGE_DESCRIPTION not in entries:
+		raise InPlaceUnavailable("The file has no ImageDescription to overwrite.")
+	field_type, count, position = entries[TAG_IMAGE_DESCRIPTION]
+	if field_type != 2:
+		raise InPlaceUnavailable(f"ImageDescription stored as TIFF type {field_type}.")
+	value = description.encode("utf-8") + b"\x00"
+	old_value = bytes(reader.raw(entries[TAG_IMAGE_DESCRIPTION]))
+	if len(value) <= count:
+		# In the entry itself for 4 bytes or less, at an offset otherwise, either way the same bytes.
+		return [_changed_range(position, old_value, value.ljust(count, b"\x00"))]
+	if append_at is None:
+		raise InPlaceUnavailable(f"The description needs {len(value)} bytes, ImageDescription has {count}.")
+
+	# TIFF values start on a word boundary, and offsets are 32 bit.
+	start = append_at + append_at % 2
+	if start - reader.base + len(value) > 0xFFFFFFFF:
+		raise InPlaceUnavailable("The file is too large to append ImageDescription to.")
+	entry = _entry_position(reader, TAG_IMAGE_DESCRIPTION)
+	patches = [
+		(entry + 4, bytes(reader.view[entry + 4:entry + 8]), struct.pack(reader.order + "I", len(value))),
+		(entry + 8, bytes(reader.view[entry + 8:entry + 12]), struct.pack(reader.order + "I", start - reader.base)),
+		(append_at, b"", bytes(start - append_at) + value),
+	]
+	if count > 4:
+		# The old value's bytes are cleared when it moves.
+		patches.append((position, old_value, bytes(count)))
+	return [_changed_range(offset, old, new) for offset, old, new in patches]
+
+def _png_patches(view, description) -> list:
+	"""Patches of an uncompressed XMP iTXt chunk and its CRC."""
+	position = len(PNG_SIGNATURE)
+	while position + 8 <= len(view):
+		length, kind = struct.unpack(">I4s", view[position:position + 8])
+		start = position + 8
+		end = start + length
+		if end + 4 > len(view):
+			raise InPlaceUnavailable("Truncated PNG chunk.")
+		if kind == b"iTXt" and bytes(view[start:start + len(PNG_XMP_KEYWORD) + 1]) == PNG_XMP_KEYWORD + b"\x00":
+			chunk = bytes(view[start:end])
+			keyword_end = len(PNG_XMP_KEYWORD)
+			if chunk[keyword_end + 1]:
+				raise InPlaceUnavailable("The XMP chunk is compressed.")
+			language_end = chunk.index(b"\x00", keyword_end + 3)
+			text_start = chunk.index(b"\x00", language_end + 1) + 1
+			packet = chunk[text_start:]
+			updated = chunk[:text_start] + _xmp_packet(packet, description)
+			crc = struct.pack(">I", zlib.crc32(kind + updated) & 0xFFFFFFFF)
+			return [
+				_changed_range(start, chunk, updated),
+				_changed_range(end, bytes(view[end:end + 4]), crc),
+			]
+		if kind == b"IEND":
+			break
+		position = end + 4
+	raise InPlaceUnavailable("The file has no XMP chunk.")
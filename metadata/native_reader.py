@@ -0,0 +1,199 @@
+# metadata/native_reader.py
+"""
+Read descriptions straight from JPEG, PNG and TIFF files, without ExifTool.
+
+The file is memory-mapped and only the segments holding metadata are
+parsed: the APP1 EXIF and XMP segments of a JPEG, the XMP iTXt chunk of a
+PNG, and IFD0 of a TIFF. Values match what ExifTool returns for
+XMP-dc:Description (the x-default language) and EXIF:ImageDescription.
+Anything unusual raises UnsupportedMetadata, so the caller reads the file
+with ExifTool instead.
+
+Kept free of app state, so it can run on any thread, and in the CLI.
+"""
+import mmap
+import struct
+import zlib
+from pathlib import Path
+from xml.etree import ElementTree
+
+from utils.image_structure import jpeg_segments, TiffReader, TAG_IMAGE_DESCRIPTION, TAG_XMP
+from utils.metadata_index import SUPPORTED_EXIF, SUPPORTED_XMP
+
+JPEG_EXIF_PREFIX = b"Exif\x00\x00"
+JPEG_XMP_PREFIX = b"http://ns.adobe.com/xap/1.0/\x00"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_XMP_KEYWORD = b"XML:com.adobe.xmp"
+
+RDF = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+DC_DESCRIPTION = "{http://purl.org/dc/elements/1.1/}description"
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+class UnsupportedMetadata(ValueError):
+	"""The file's metadata is stored in a way this reader does not handle, read it with ExifTool."""
+
+def read_descriptions(image_path) -> dict:
+	"""
+	Read the XMP and EXIF descriptions of an image.
+
+	Returns:
+		dict: {"xmp": str|None, "exif": str|None}, keys only for the formats the file supports,
+			like description_values(). None when the file has no such tag.
+
+	Raises:
+		UnsupportedMetadata: The file could not be parsed, read it with ExifTool.
+		OSError: The file could not be opened.
+	"""
+	image_path = Path(image_path)
+	extension = image_path.suffix.lower()
+	if extension not in SUPPORTED_XMP and extension not in SUPPORTED_EXIF:
+		raise UnsupportedMetadata(f"{extension} files are not supported.")
+
+	with open(image_path, "rb") as file:
+		try:
+			mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:
+			raise UnsupportedMetadata("The file is empty.") from None
+		error = None
+		try:
+			packet, exif = _parse(mapped)
+		except UnsupportedMetadata as e:
+			error = str(e)
+		except (ValueError, IndexError, struct.error, zlib.error) as e:
+			error = f"Malformed file: {e}"
+		# Closed once the parser's views of the map are gone, they are released with the exception above.
+		mapped.close()
+	if error is not None:
+		raise UnsupportedMetadata(error)
+
+	values = {}
+	if extension in SUPPORTED_XMP:
+		values["xmp"] = xmp_description(packet) if packet is not None else None
+	if extension in SUPPORTED_EXIF:
+		values["exif"] = exif
+	return values
+
+def read_many(image_paths):
+	"""
+	Read the descriptions of many images.
+
+	Returns:
+		tuple: ({path: values} for the files read, [paths] left for ExifTool).
+	"""
+	read = {}
+	unread = []
+	for path in image_paths:
+		try:
+			read[path] = read_descriptions(path)
+		except (UnsupportedMetadata, OSError):
+			unread.append(path)
+	return read, unread
+
+def _parse(mapped):
+	"""Return (XMP packet bytes or None, EXIF description or None), from the file's own format."""
+	with memoryview(mapped) as view:
+		head = bytes(view[:8])
+		if head[:2] == b"\xff\xd8":
+			return _parse_jpeg(view)
+		if head == PNG_SIGNATURE:
+			return _parse_png(view), None
+		if head[:4] in (b"II*\x00", b"MM\x00*"):
+			return _parse_tiff(view, 0, len(view))
+		raise UnsupportedMetadata("Unknown file format.")
+
+def _parse_jpeg(view):
+	packet = exif = None
+	exif_found = False
+	# Strict, a truncated header could otherwise hide the segments holding the descriptions.
+	for marker, start, end in jpeg_segments(view, strict=True):
+		if marker != 0xE1:  # APP1
+			continue
+		prefix = bytes(view[start:start + len(JPEG_XMP_PREFIX)])
+		if not exif_found and prefix.startswith(JPEG_EXIF_PREFIX):
+			_, exif = _parse_tiff(view, start + len(JPEG_EXIF_PREFIX), end, read_xmp=False)
+			exif_found = True
+		elif packet is None and prefix == JPEG_XMP_PREFIX:
+			packet = bytes(view[start + len(JPEG_XMP_PREFIX):end])
+	return packet, exif
+
+def _parse_tiff(view, base: int, end: int, read_xmp: bool = True):
+	"""Return (XMP packet or None, ImageDescription or None) from IFD0 of a TIFF structure."""
+	reader = TiffReader(view, base, end)
+	entries, _ = reader.ifd(reader.first_ifd)
+	packet = exif = None
+	if read_xmp and TAG_XMP in entries:
+		packet = bytes(reader.raw(entries[TAG_XMP]))
+	if TAG_IMAGE_DESCRIPTION in entries:
+		entry = entries[TAG_IMAGE_DESCRIPTION]
+		if entry[0] not in (2, 129):  # ASCII, or UTF-8 since EXIF 3.0
+			raise UnsupportedMetadata(f"ImageDescription stored as TIFF type {entry[0]}.")
+		exif = _decode_string(bytes(reader.raw(entry)))
+	return packet, exif
+
+def _decode_string(raw: bytes) -> str:
+	"""An EXIF string ends at the first NUL."""
+	raw = raw.split(b"\x00", 1)[0]
+	try:
+		return raw.decode("utf-8")
+	except UnicodeDecodeError:
+		raise UnsupportedMetadata("ImageDescription is not UTF-8.") from None
+
+def _parse_png(view):
+	"""Return the XMP packet of a PNG, from its iTXt chunk, or None."""
+	position = len(PNG_SIGNATURE)
+	packet = None
+	while position + 8 <= len(view):
+		length, kind = struct.unpack(">I4s", view[position:position + 8])
+		start = position + 8
+		end = start + length
+		if end + 4 > len(view):
+			raise UnsupportedMetadata("Truncated PNG chunk.")
+		if kind == b"iTXt" and packet is None and bytes(view[start:start + len(PNG_XMP_KEYWORD) + 1]) == PNG_XMP_KEYWORD + b"\x00":
+			packet = _itxt_text(bytes(view[start:end]))
+		elif kind in (b"tEXt", b"zTXt") and bytes(view[start:start + 4]) in (b"XML:", b"Raw "):
+			# XMP as written by other tools, e.g. ImageMagick's "Raw profile type xmp".
+			raise UnsupportedMetadata("XMP in a tEXt or zTXt chunk.")
+		elif kind == b"IEND":
+			break
+		position = end + 4  # Skip the CRC.
+	return packet
+
+def _itxt_text(chunk: bytes) -> bytes:
+	"""The text of an iTXt chunk: keyword, compression flag and method, language, translated keyword, text."""
+	keyword_end = chunk.index(b"\x00")
+	compressed = chunk[keyword_end + 1]
+	language_end = chunk.index(b"\x00", keyword_end + 3)
+	translated_end = chunk.index(b"\x00", language_end + 1)
+	text = chunk[translated_end + 1:]
+	return zlib.decompress(text) if compressed else text
+
+def xmp_description(packet: bytes):
+	"""
+	The x-default dc:description of an XMP packet, None if it has none.
+
+	Raises:
+		UnsupportedMetadata: The packet is not well-formed XML, or has no x-default among several languages.
+	"""
+	try:
+		root = ElementTree.fromstring(packet.rstrip(b"\x00"))
+	except ElementTree.ParseError as e:
+		raise UnsupportedMetadata(f"Malformed XMP: {e}") from None
+
+	found = []
+	for description in root.iter(f"{RDF}Description"):
+		if DC_DESCRIPTION in description.attrib:
+			found.append(description.attrib[DC_DESCRIPTION])
+		for element in description.iter(DC_DESCRIPTION):
+			alternatives = element.find(f"{RDF}Alt")
+			if alternatives is None:
+				found.append(element.text or "")
+				continue
+			items = alternatives.findall(f"{RDF}li")
+			default = [item for item in items if item.get(XML_LANG) == "x-default"]
+			if default:
+				found.append(default[0].text or "")
+			elif items:
+				raise UnsupportedMetadata("dc:description has no x-default language.")
+	if len(found) > 1:
+		raise UnsupportedMetadata("More than one dc:description.")
+	return found[0] if found else None
@@ -0,0 +1,36 @@
+# metadata/sanitize.py
+from pathlib import Path
+from utils.metadata_index import SUPPORTED_EXIF, SUPPORTED_XMP, XMP_DESCRIPTION_TAG, EXIF_DESCRIPTION_TAG
+
+EXIF_MAX_LENGTH = 254  # Characters kept in EXIF:ImageDescription
+
+def sanitize_for_exif(text: str) -> str:
+	"""Convert to ASCII using transliteration, then strip any remaining non-EXIF-safe characters."""
+	from unidecode import unidecode # Loads large transliteration tables, imported on first use.
+	ascii_text = unidecode(text)
+	return ''.join(c for c in ascii_text if 32 <= ord(c) <= 126)
+
+def description_values(image_path, new_description: str) -> dict:
+	"""
+	The XMP and EXIF values to store for a description, for the formats the file supports.
+	An empty description removes the tag, stored as None.
+
+	Returns:
+		dict: {"xmp": str|None, "exif": str|None}, keys only for supported formats.
+	"""
+	extension = Path(image_path).suffix.lower()
+	values = {}
+	if extension in SUPPORTED_XMP:
+		values["xmp"] = new_description or None
+	if extension in SUPPORTED_EXIF:
+		values["exif"] = sanitize_for_exif(new_description[0:EXIF_MAX_LENGTH]) or None
+	return values
+
+def description_tags(values: dict) -> dict:
+	"""The ExifTool tags to write for description_values(), an empty value deletes the tag."""
+	tags = {}
+	if "xmp" in values:
+		tags[XMP_DESCRIPTION_TAG] = values["xmp"] or ""
+	if "exif" in values:
+		tags[EXIF_DESCRIPTION_TAG] = values["exif"] or ""
+	return tags
@@ -0,0 +1,110 @@
+# tests/test_inplace_writer.py
+"""
+Round trips and crash recovery of metadata/inplace_writer.py, on copies of test_files/.
+
+Run from the repository root: python -m unittest discover tests (or python -m pytest tests).
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from metadata import inplace_writer
+from metadata.inplace_writer import write_in_place, recover, InPlaceUnavailable
+from metadata.native_reader import read_descriptions
+
+# Written by ExifTool: an XMP packet with its usual padding, and a 7 byte ImageDescription.
+FIXTURE = Path(__file__).resolve().parent.parent / "test_files" / "jpg_small_file.jpg"
+
+class SimulatedCrash(BaseException):
+	"""Stops a write like a killed process would, without write_in_place's clean up for OSError."""
+
+class InPlaceWriterTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = Path(tempfile.mkdtemp())
+		self.addCleanup(shutil.rmtree, self.folder)
+		self.image = self.folder / FIXTURE.name
+		shutil.copyfile(FIXTURE, self.image)
+		self.original = self.image.read_bytes()
+		self.undo_dir = self.folder / "undo"
+
+	def write(self, description, image=None):
+		return write_in_place(image or self.image, {"xmp": description, "exif": description}, self.undo_dir)
+
+	def undo_records(self):
+		return list(self.undo_dir.glob("*.json")) if self.undo_dir.exists() else []
+
+	def test_round_trip(self):
+		written = self.write("Nouvé")
+		self.assertGreater(written, 0)
+		self.assertLess(written, 1024)
+		self.assertEqual(read_descriptions(self.image), {"xmp": "Nouvé", "exif": "Nouvé"})
+		self.assertEqual(self.image.stat().st_size, len(self.original))
+		self.assertEqual(self.undo_records(), [])
+
+	def test_shorter_description_keeps_room_for_a_longer_one(self):
+		self.write("ab")
+		self.write("abcdef")  # As long as the original ImageDescription allows.
+		self.assertEqual(read_descriptions(self.image), {"xmp": "abcdef", "exif": "abcdef"})
+
+	def test_too_long_leaves_the_file_untouched(self):
+		with self.assertRaises(InPlaceUnavailable):
+			self.write("longer than the ImageDescription")
+		with self.assertRaises(InPlaceUnavailable):
+			self.write("x" * 3000)  # More than the XMP padding.
+		self.assertEqual(self.image.read_bytes(), self.original)
+		self.assertEqual(self.undo_records(), [])
+
+	def test_recover_torn_write(self):
+		def torn(file, writes, size=None):
+			offset, data = writes[0]
+			file.seek(offset)
+			file.write(data[:max(1, len(data) // 2)])
+			file.flush()
+			raise SimulatedCrash()
+
+		with mock.patch.object(inplace_writer, "_apply", torn), self.assertRaises(SimulatedCrash):
+			self.write("abc")
+		self.assertNotEqual(self.image.read_bytes(), self.original)
+		self.assertEqual(len(self.undo_records()), 1)
+
+		self.assertEqual(recover(self.undo_dir), [self.image])
+		self.assertEqual(self.image.read_bytes(), self.original)
+		self.assertEqual(self.undo_records(), [])
+
+	def test_recover_keeps_completed_write(self):
+		apply = inplace_writer._apply
+
+		def crash_after(file, writes, size=None):
+			apply(file, writes, size)
+			raise SimulatedCrash()
+
+		with mock.patch.object(inplace_writer, "_apply", crash_after), self.assertRaises(SimulatedCrash):
+			self.write("abc")
+		self.assertEqual(recover(self.undo_dir), [])
+		self.assertEqual(read_descriptions(self.image), {"xmp": "abc", "exif": "abc"})
+		self.assertEqual(self.undo_records(), [])
+
+	def test_recover_relative_path_from_another_directory(self):
+		def torn(file, writes, size=None):
+			offset, data = writes[0]
+			file.seek(offset)
+			file.write(data)
+			file.flush()
+			raise SimulatedCrash()
+
+		working_directory = os.getcwd()
+		self.addCleanup(os.chdir, working_directory)
+		os.chdir(self.folder)
+		with mock.patch.object(inplace_writer, "_apply", torn), self.assertRaises(SimulatedCrash):
+			self.write("abc", image=Path(self.image.name))
+		os.chdir(working_directory)
+
+		self.assertEqual(recover(self.undo_dir), [self.image])
+		self.assertEqual(self.image.read_bytes(), self.original)
+
+if __name__ == "__main__":
+	unittest.main()
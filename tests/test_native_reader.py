@@ -0,0 +1,50 @@
+# tests/test_native_reader.py
+"""
+Truncated and broken files in metadata/native_reader.py, which must be left to ExifTool.
+
+Run from the repository root: python -m unittest discover tests (or python -m pytest tests).
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from metadata.native_reader import read_descriptions, read_many, UnsupportedMetadata
+
+FIXTURE = Path(__file__).resolve().parent.parent / "test_files" / "jpg_small_file.jpg"
+
+class NativeReaderTest(unittest.TestCase):
+
+	def setUp(self):
+		self.folder = Path(tempfile.mkdtemp())
+		self.addCleanup(shutil.rmtree, self.folder)
+		self.data = FIXTURE.read_bytes()
+
+	def copy(self, data, name="image.jpg"):
+		path = self.folder / name
+		path.write_bytes(data)
+		return path
+
+	def test_reads_the_fixture(self):
+		self.assertEqual(read_descriptions(FIXTURE), {"xmp": "123456", "exif": "123456"})
+
+	def test_truncated_header_raises(self):
+		for size in (20, 200, 2000):
+			with self.subTest(size=size), self.assertRaises(UnsupportedMetadata):
+				read_descriptions(self.copy(self.data[:size]))
+
+	def test_broken_marker_raises(self):
+		data = bytearray(self.data)
+		data[2] = 0x00  # The first segment no longer starts with a marker.
+		with self.assertRaises(UnsupportedMetadata):
+			read_descriptions(self.copy(bytes(data)))
+
+	def test_read_many_leaves_truncated_files_to_exiftool(self):
+		whole = self.copy(self.data, "whole.jpg")
+		truncated = self.copy(self.data[:200], "truncated.jpg")
+		read, unread = read_many([whole, truncated])
+		self.assertEqual(list(read), [whole])
+		self.assertEqual(unread, [truncated])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,128 @@
+import asyncio
+from nicegui import ui
+from utils.state import state, notify
+from utils.file_utils import index_folder_metadata, extract_metadata, display_metadata
+from metadata.batch_edit import APPLY, APPEND, PREFIX, select_images, apply_batch
+import config
+
+class BatchEditDialog:
+	"""
+	Dialog for giving many images of the open folder the same description.
+	Images are chosen by position and/or filters, then the text replaces,
+	is appended to, or is put before each image's description.
+	"""
+
+	def __init__(self):
+		self.running = False
+		with ui.dialog().props("persistent backdrop-filter='blur(8px)'") as self.dialog:
+			with ui.column().classes("w-full max-w-2xl p-0 rounded bg-slate-700 gap-0"):
+				with ui.row().classes("w-full items-center gap-3").style("padding: 12px 15px;"):
+					ui.icon("sym_o_edit_note").style("font-size: 26px; color: white;")
+					ui.label("Batch Edit").style("font-size: 16px; font-weight: bold;")
+					ui.space()
+					ui.icon("sym_o_close").on("click", self.close).style("font-size: 20px; cursor: pointer;")
+
+				with ui.column().classes("w-full gap-2").style("padding: 0 15px 12px 15px;"):
+					with ui.row().classes("w-full gap-3 no-wrap"):
+						self.first_input = ui.number("From #", min=1, format="%d").props("dense").classes("w-24")
+						self.last_input = ui.number("To #", min=1, format="%d").props("dense").classes("w-24")
+						self.name_input = ui.input("File name", placeholder="e.g. IMG_12*").props("dense clearable").classes("flex-1")
+						self.text_filter_input = ui.input("Description contains").props("dense clearable").classes("flex-1")
+					self.mode_toggle = ui.toggle({APPLY: "Replace", APPEND: "Append", PREFIX: "Prefix"}, value=APPLY)
+					self.text_input = ui.textarea("Description").props("filled autogrow").classes("w-full")
+					with ui.row().classes("w-full items-center gap-3"):
+						self.find_button = ui.button("Find Images", icon="sym_o_filter_alt", on_click=self.find).classes("std-btn")
+						self.run_button = ui.button("Apply", icon="sym_o_done_all", on_click=self.run).classes("std-btn")
+						self.summary = ui.label().classes("text-sm text-gray-300")
+					self.progress = ui.linear_progress(value=0, show_value=False).classes("hidden")
+					with ui.scroll_area().classes("w-full h-48"):
+						self.results = ui.list().props("dense separator").classes("w-full")
+
+	def open(self):
+		self.dialog.open()
+
+	def close(self):
+		if not self.running:
+			self.dialog.close()
+
+	async def selection(self) -> list:
+		"""The images matching the range and filters, with their descriptions indexed."""
+		if not state.nav_img_total:
+			return []
+		first = int(self.first_input.value) if self.first_input.value else None
+		last = int(self.last_input.value) if self.last_input.value else None
+		in_range = select_images(state.nav_img_list, first, last)
+		# Filters and Append/Prefix need the current descriptions.
+		await index_folder_metadata(in_range)
+		return await asyncio.to_thread(
+			select_images, in_range,
+			name_filter=self.name_input.value or "",
+			text_filter=self.text_filter_input.value or "")
+
+	async def find(self):
+		selected = await self.selection()
+		self.results.clear()
+		with self.results:
+			for path in selected[:200]:
+				ui.item(path.name)
+		more = f", showing the first 200" if len(selected) > 200 else ""
+		self.summary.set_text(f"{len(selected)} image(s) match{more}")
+
+	async def run(self):
+		if self.running:
+			return
+		if not state.nav_img_total:
+			notify("Open an image first.", "warning")
+			return
+		self.running = True
+		self.run_button.disable()
+		self.find_button.disable()
+		try:
+			# Edits still being written come first, Append/Prefix build on them.
+			await state.save_queue.join()
+			selected = await self.selection()
+			if not selected:
+				self.summary.set_text("No images match.")
+				return
+
+			self.results.clear()
+			self.progress.classes(remove="hidden")
+			self.progress.set_value(0)
+
+			def on_progress(done, total):
+				self.progress.set_value(done / total if total else 1)
+				self.summary.set_text(f"Writing {done} / {total}")
+
+			results = await apply_batch(
+				selected, self.mode_toggle.value, self.text_input.value or "",
+				chunk_size=config.BATCH_EDIT_CHUNK_SIZE, on_progress=on_progress)
+			self.show_results(results)
+
+			# Refresh the editor if the image on display was edited.
+			if state.current_image in {path for path, ok, _ in results}:
+				await extract_metadata(state.current_image)
+				await display_metadata()
+
+		except Exception as e:
+			state.error_dialog.show(
+				"Batch edit failed.",
+				"Some images may have been edited. Open them to check, and try again.",
+				f"{e}")
+		finally:
+			self.running = False
+			self.run_button.enable()
+			self.find_button.enable()
+			self.progress.classes(add="hidden")
+
+	def show_results(self, results):
+		updated = sum(1 for _, ok, message in results if ok and message == "Updated")
+		unchanged = sum(1 for _, ok, message in results if ok and message != "Updated")
+		failed = [(path, message) for path, ok, message in results if not ok]
+		self.summary.set_text(f"{updated} updated, {unchanged} unchanged, {len(failed)} failed")
+		with self.results:
+			for path, message in failed:
+				with ui.item():
+					with ui.item_section():
+						ui.item_label(path.name)
+						ui.item_label(message).props("caption").classes("text-red-300")
+		notify(f"Batch edit: {updated} updated, {len(failed)} failed.", "warning" if failed else "positive")
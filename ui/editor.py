@@ -1,11 +1,20 @@
 import asyncio
 from nicegui import ui
-from utils.state import state
+from utils.state import state, notify
+from metadata.descriptions import is_unchanged
 from ui.spinners import PremadeSpinner
 from ui.status_icon import StatusIcon
 
 
-async def save_metadata(undo=False):
+async def save_metadata(undo=False, image_path=None, value=None):
+	"""
+	Journal an edit and queue it to be written in the background.
+
+	Args:
+		undo (bool): Restore the description the image had when it was shown.
+		image_path (Path): Image the edit is for, defaults to the current image.
+		value (str): The new description, defaults to the editor's text.
+	"""
 	try:
 		if state.save_queue is None:
 			state.error_dialog.show(
@@ -14,7 +23,28 @@ async def save_metadata(undo=False):
 				"Save task not initialized."
 			)			
 			return  # Prevents queue operations if it's not initialized
-		await state.save_queue.put(undo)  # Ensures we are putting a valid item
+
+		# Take the path and text now, the user may have moved on by the time the edit is written.
+		image_path = image_path or state.current_image
+		if image_path is None:
+			return
+		if value is None:
+			value = state.meta_textarea_input.value or ""
+
+		if undo:
+			if value == state.original_metadata:
+				notify("Nothing to undo.")
+				return
+			value = state.original_metadata or ""
+			state.meta_textarea_input.value = value
+
+		# Nothing changed, e.g. the editor lost focus without an edit.
+		if is_unchanged(image_path, value):
+			return
+
+		edit_id = await asyncio.to_thread(state.edit_journal.append, image_path, value)
+		state.pending_edits[image_path] = value
+		await state.save_queue.put((edit_id, image_path, value))
 	except Exception as e:
 		state.error_dialog.show(
 			"Save metadata error",
@@ -77,6 +107,7 @@ def create_metadata_section():
 			state.status_warn_len = StatusIcon("Description will be truncated in EXIF (Max 255 chars)", icon="sym_o_warning", color="yellow-500")
 			state.status_warn_chars = StatusIcon("This description contains characters not supported by EXIF.", icon="sym_o_emergency_home", color="purple-500")
 			state.editor_spinner = PremadeSpinner(size="sm")
+			state.status_saving = StatusIcon("Saving descriptions in the background.", icon="sym_o_sync", color="sky-500")
 		tab_editor = ui.tab('Edit Description')
 		tab_xmp = ui.tab('View XMP')
 		tab_exif = ui.tab('View EXIF')
@@ -104,6 +135,5 @@ def create_metadata_section():
 					state.meta_textarea_exif = ui.textarea( on_change=lambda: update_status_icons()
 					).classes("w-full max-w-2xl").props("filled square autogrow readonly disable")
 
-	state.meta_textarea_input.on('blur', lambda _: asyncio.create_task(asyncio.sleep(0.1)).add_done_callback(
-		lambda _: asyncio.create_task(save_metadata())
-	))
\ No newline at end of file
+	state.meta_textarea_input.on('blur', lambda _: asyncio.create_task(
+		save_metadata(image_path=state.current_image, value=state.meta_textarea_input.value)))
\ No newline at end of file
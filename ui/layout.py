@@ -2,11 +2,15 @@ import asyncio
 from nicegui import ui, app
 from ui.editor import create_metadata_section
 from ui.spinners import PremadeSpinner
-from utils.file_utils import open_image
+from ui.previews import register_preview_route
+from ui.metrics import register_metrics_route
+from ui.search import SearchDialog
+from ui.batch_edit import BatchEditDialog
+from utils.file_utils import open_image, reload_folder
 from utils.state import state
 from utils.file_navigation import navigate_next, navigate_prev
 import time
-from PIL import Image
+import config
 
 @ui.refreshable
 def index_counter():
@@ -19,8 +23,14 @@ def setup_ui():
 	ui.query('.nicegui-content').classes('p-0 gap-0 bg-neutral-800')  # Remove system gaps from NiceGUI
 	# Load custom styles
 	app.add_static_files('/static', 'static')
+	register_preview_route()
+	if config.METRICS_ENABLED:
+		register_metrics_route()
 	ui.add_head_html('<link rel="stylesheet" href="static/styles.css">')
 
+	search_dialog = SearchDialog()
+	batch_edit_dialog = BatchEditDialog()
+
 	# Full-page flex container
 	with ui.column().classes('h-screen w-full flex flex-col gap-0'):
 
@@ -30,7 +40,9 @@ def setup_ui():
 			with ui.row().classes('absolute top-6 left-5 right-5 justify-between z-10'):
 				with ui.row().classes("flex justify-start"):
 					ui.button("Open Image", icon="sym_o_folder_open", on_click=lambda: asyncio.create_task(open_image())).classes('std-btn')
-					ui.button("Reload Folder", icon="sym_o_refresh").classes('std-btn')
+					ui.button("Reload Folder", icon="sym_o_refresh", on_click=lambda: asyncio.create_task(reload_folder())).classes('std-btn')
+					ui.button("Search", icon="sym_o_search", on_click=search_dialog.open).classes('std-btn')
+					ui.button("Batch Edit", icon="sym_o_edit_note", on_click=batch_edit_dialog.open).classes('std-btn')
 				with ui.row().classes("flex justify-end"):
 					ui.button("Settings", icon="sym_o_settings").classes('std-btn')
 			
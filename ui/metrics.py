@@ -0,0 +1,65 @@
+# ui/metrics.py
+from fastapi import Response
+from nicegui import app
+from utils.state import state
+from utils.metrics import MetricsWriter, EXIFTOOL_SECONDS, NAVIGATION_SECONDS
+
+METRICS_ROUTE = "/metrics"
+
+def collect() -> str:
+	"""Read the queues, caches and workers of the running app, as a Prometheus text page."""
+	metrics = MetricsWriter()
+
+	# Queues
+	metrics.gauge("save_queue_depth", "Description edits queued and not written yet.", state.save_queue.qsize())
+	metrics.gauge("pending_edits", "Files with an edit not written yet.", len(state.pending_edits))
+	metrics.gauge("cache_queue_depth", "Previews queued for prefetching.", state.cache_queue.qsize())
+	metrics.counter("cache_queue_dropped_total", "Queued previews dropped because they left the prefetch window.", state.cache_queue.dropped)
+	metrics.counter("cache_queue_cancelled_total", "Previews being made that were cancelled because they left the prefetch window.", state.cache_queue.cancelled)
+
+	# Image cache
+	cache = state.image_cache.stats()
+	metrics.gauge("image_cache_entries", "Previews held in memory, by quality tier.", [
+		({"tier": "full"}, cache["entries"] - cache["lite_entries"]),
+		({"tier": "lite"}, cache["lite_entries"])])
+	metrics.gauge("image_cache_bytes", "Memory used by the previews held in memory.", cache["bytes"])
+	metrics.gauge("image_cache_max_bytes", "Memory budget of the previews held in memory.", cache["max_bytes"])
+	metrics.counter("image_cache_hits_total", "Preview lookups found in memory.", cache["hits"])
+	metrics.counter("image_cache_misses_total", "Preview lookups not found in memory.", cache["misses"])
+	metrics.gauge("image_cache_hit_ratio", "Share of preview lookups found in memory since startup.", cache["hit_rate"])
+	metrics.counter("image_cache_evictions_total", "Previews removed from memory.", cache["evictions"])
+	metrics.counter("image_cache_downgrades_total", "Previews re-encoded at half size to fit the memory budget.", cache["downgrades"])
+
+	# Prefetch window
+	window = state.prefetch_window.stats()
+	metrics.gauge("prefetch_window_images", "Images prefetched on each side of the current image.", [
+		({"side": "behind"}, window["behind"]),
+		({"side": "ahead"}, window["ahead"])])
+	metrics.gauge("prefetch_display_hit_ratio", "Share of displayed images that were already cached.", window["hit_rate"])
+
+	# Preview workers
+	workers = state.preview_engine.utilisation()
+	metrics.gauge("preview_workers", "Threads or processes making previews.", workers["workers"])
+	metrics.gauge("preview_workers_busy", "Preview workers busy now.", workers["busy"])
+	metrics.gauge("preview_jobs_waiting", "Previews waiting for a free worker.", workers["waiting"])
+	metrics.counter("preview_busy_seconds_total", "Worker time spent making previews, divide its rate by preview_workers for the utilisation.", workers["busy_seconds"])
+	metrics.counter("preview_jobs_total", "Previews made or attempted.", workers["jobs"])
+
+	# ExifTool
+	pool = state.exiftool_process
+	metrics.gauge("exiftool_in_flight", "ExifTool commands sent and not answered yet, per process lane.", [
+		({"lane": "read"}, sum(worker.in_flight for worker in pool.read_workers)),
+		({"lane": "save"}, sum(worker.in_flight for worker in pool.save_workers))])
+	metrics.histogram(EXIFTOOL_SECONDS)
+
+	# Navigation
+	metrics.histogram(NAVIGATION_SECONDS)
+
+	return metrics.text()
+
+async def serve_metrics():
+	return Response(content=collect(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def register_metrics_route():
+	"""Add the /metrics route to the NiceGUI app, for Prometheus or a quick look in the browser."""
+	app.add_api_route(METRICS_ROUTE, serve_metrics, methods=["GET"], include_in_schema=False)
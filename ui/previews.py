@@ -0,0 +1,41 @@
+from fastapi import Request, Response
+from nicegui import app
+from utils.state import state
+
+PREVIEW_ROUTE = "/previews"
+
+def preview_url(image_path):
+	"""
+	Return the URL of a cached preview, or None if the image is not cached.
+	The URL contains the preview's ETag, so it changes whenever the preview does.
+	"""
+	etag = state.image_cache.etag(image_path)
+	if etag is None:
+		return None
+	return f"{PREVIEW_ROUTE}/{etag}.jpg"
+
+async def serve_preview(etag: str, request: Request):
+	"""Serve the raw JPEG bytes of a cached preview."""
+	headers = {
+		"ETag": f'"{etag}"',
+		# The URL is derived from the content, so the browser never needs to revalidate it.
+		"Cache-Control": "private, max-age=31536000, immutable",
+	}
+	if request.headers.get("if-none-match") == headers["ETag"]:
+		return Response(status_code=304, headers=headers)
+	data = state.image_cache.get_by_etag(etag)
+	if data is None:
+		return Response(status_code=404)
+	return Response(content=data, media_type="image/jpeg", headers=headers)
+
+def register_preview_route():
+	"""Add the preview route to the NiceGUI app."""
+	app.add_api_route(PREVIEW_ROUTE + "/{etag}.jpg", serve_preview, methods=["GET"], include_in_schema=False)
+
+def prefetch_previews(image_paths):
+	"""Ask the browser to fetch the previews of upcoming images, so navigating to them is instant."""
+	urls = [url for url in (preview_url(path) for path in image_paths) if url]
+	if not urls or state.image_display is None:
+		return
+	state.image_display.client.run_javascript(
+		f"for (const url of {urls!r}) {{ const img = new Image(); img.src = url; }}")
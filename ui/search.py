@@ -0,0 +1,56 @@
+import asyncio
+from nicegui import ui
+from utils.state import state
+from utils.file_utils import load_initial_image
+
+class SearchDialog:
+	"""
+	Dialog for searching the descriptions of every catalogued image.
+	Clicking a result opens its folder at that image.
+	"""
+
+	def __init__(self):
+		self.search_id = 0 # Only the latest search updates the results.
+		with ui.dialog().props("backdrop-filter='blur(8px)'") as self.dialog:
+			with ui.column().classes("w-full max-w-3xl p-0 rounded bg-slate-700 gap-0"):
+				with ui.row().classes("w-full items-center gap-3").style("padding: 12px 15px;"):
+					ui.icon("sym_o_search").style("font-size: 26px; color: white;")
+					self.query_input = ui.input(placeholder="Search descriptions", on_change=self.on_change).props(
+						"autofocus dense clearable").classes("flex-1")
+					ui.icon("sym_o_close").on("click", self.close).style("font-size: 20px; cursor: pointer;")
+				self.summary = ui.label().classes("px-4 text-sm text-gray-300")
+				with ui.scroll_area().classes("w-full h-96"):
+					self.results = ui.list().props("dense separator").classes("w-full")
+
+	def open(self):
+		self.dialog.open()
+
+	def close(self):
+		self.dialog.close()
+
+	async def on_change(self, event):
+		self.search_id += 1
+		search_id = self.search_id
+		query = event.value or ""
+		results = await asyncio.to_thread(state.catalog.search, query)
+		if search_id != self.search_id:
+			return # A newer search was started meanwhile.
+		self.show_results(query, results)
+
+	def show_results(self, query, results):
+		self.results.clear()
+		if not query.strip():
+			self.summary.set_text("")
+			return
+		self.summary.set_text(f"{len(results)} image(s) found" if results else "No images found")
+		with self.results:
+			for path, xmp, exif in results:
+				with ui.item(on_click=lambda path=path: self.open_result(path)):
+					with ui.item_section():
+						ui.item_label(path.name)
+						ui.item_label(xmp or exif or "").props("caption lines=2")
+						ui.item_label(str(path.parent)).props("caption").classes("text-xs")
+
+	def open_result(self, path):
+		self.close()
+		asyncio.create_task(load_initial_image(path))
@@ -1,19 +1,167 @@
+import hashlib
+import threading
 from collections import OrderedDict
 
+FULL = "full"  # Preview at full quality.
+LITE = "lite"  # Cheaper preview, kept for images far from the cursor.
+
 class ImageCache:
-    def __init__(self, max_size=50):
-        self.cache = OrderedDict()
-        self.max_size = max_size
+    """
+    In-memory cache of encoded preview bytes, keyed by image path.
+
+    The cache is limited by the total size of the previews in bytes. When it
+    is over budget, the entry farthest from the cursor (FULL entries, then
+    the least recently used, among equals) is first downgraded to the
+    cheaper LITE tier, if it is outside the full quality radius, and evicted
+    if it already is LITE.
+    Every entry also gets an ETag derived from its bytes, so the previews
+    can be served over HTTP and cached by the browser.
+    """
+
+    def __init__(self, max_bytes, downgrade=None, full_radius=5):
+        """
+        Args:
+            max_bytes (int): Memory budget for the preview bytes.
+            downgrade (callable): Turns FULL preview bytes into LITE preview bytes. Without it, entries are only evicted.
+            full_radius (int): Entries this close to the cursor are never downgraded.
+        """
+        self.cache = OrderedDict()  # key -> (bytes, etag, tier)
+        self.etags = {}  # etag -> set of keys, identical previews share an ETag
+        self.distances = {}  # key -> distance from the cursor, set by set_focus()
+        self.max_bytes = max_bytes
+        self.downgrade = downgrade
+        self.full_radius = full_radius
+        self.bytes = 0
+        self.lock = threading.Lock()  # Entries are added from the cache executor threads.
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.downgrades = 0
+
+    def __len__(self):
+        return len(self.cache)
+
+    def _store(self, key, value, tier, keep_place=False):
+        """Insert or replace an entry, as the most recently used unless keep_place. Caller holds the lock."""
+        etag = hashlib.blake2b(value, digest_size=12).hexdigest()
+        if keep_place and key in self.cache:
+            self._forget(key, self.cache[key])
+        else:
+            self._remove(key)
+        self.cache[key] = (value, etag, tier)
+        self.etags.setdefault(etag, set()).add(key)
+        self.bytes += len(value)
+
+    def _forget(self, key, entry):
+        """Take an entry out of the ETag map and the byte total. Caller holds the lock."""
+        keys = self.etags.get(entry[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.etags[entry[1]]
+        self.bytes -= len(entry[0])
+
+    def _remove(self, key):
+        """Remove an entry if present. Caller holds the lock."""
+        entry = self.cache.pop(key, None)
+        if entry:
+            self._forget(key, entry)
+        return entry
+
+    def _victim(self, protect):
+        """
+        The entry farthest from the cursor, FULL before LITE and least recently used first among equals,
+        so a LITE entry is only evicted once no FULL entry is as far. Caller holds the lock.
+        """
+        victim, victim_rank = None, (-1, False)
+        for key, entry in self.cache.items():  # Oldest first
+            if key == protect:
+                continue
+            rank = (self.distances.get(key, float("inf")), entry[2] == FULL)
+            if rank > victim_rank:
+                victim, victim_rank = key, rank
+        return victim, victim_rank[0]
+
+    def add(self, key, value, tier=FULL):
+        with self.lock:
+            self._store(key, value, tier)
 
-    def add(self, key, value):
-        if key in self.cache:
-            self.cache.move_to_end(key)
-        self.cache[key] = value
-        if len(self.cache) > self.max_size:
-            self.cache.popitem(last=False)
+        # Shrink to budget, downgrading before evicting.
+        while True:
+            with self.lock:
+                if self.bytes <= self.max_bytes:
+                    return
+                victim, distance = self._victim(protect=key)
+                if victim is None:
+                    return
+                victim_value, victim_etag, victim_tier = self.cache[victim]
+                if victim_tier == LITE or self.downgrade is None or distance <= self.full_radius:
+                    self._remove(victim)
+                    self.evictions += 1
+                    continue
+
+            # Re-encode without holding the lock, the preview route keeps serving meanwhile.
+            try:
+                lite_value = self.downgrade(victim_value)
+            except Exception as e:
+                print(f"Error downgrading cached preview of {victim}: {e}")
+                lite_value = None
+
+            with self.lock:
+                entry = self.cache.get(victim)
+                if entry is None or entry[1] != victim_etag:
+                    continue  # Changed while we were re-encoding.
+                if lite_value and len(lite_value) < len(victim_value):
+                    self._store(victim, lite_value, LITE, keep_place=True)
+                    self.downgrades += 1
+                else:
+                    self._remove(victim)
+                    self.evictions += 1
+
+    def set_focus(self, distances):
+        """
+        Tell the cache how far each key is from the cursor.
+
+        Args:
+            distances (dict): key -> distance. Keys that are not included count as infinitely far.
+        """
+        with self.lock:
+            self.distances = dict(distances)
+
+    def lookup(self, key):
+        """Returns the tier of a cached entry, or None, and counts it as a hit or a miss."""
+        entry = self.cache.get(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+        return entry[2]
 
     def get(self, key):
-        return self.cache.get(key, None)
+        entry = self.cache.get(key, None)
+        return entry[0] if entry else None
+
+    def etag(self, key):
+        """Returns the ETag of a cached entry, or None if it is not cached."""
+        entry = self.cache.get(key, None)
+        return entry[1] if entry else None
+
+    def tier(self, key):
+        """Returns the tier of a cached entry, or None if it is not cached."""
+        entry = self.cache.get(key, None)
+        return entry[2] if entry else None
+
+    def get_by_etag(self, etag):
+        """Returns the bytes of the entry with this ETag, or None."""
+        with self.lock:
+            keys = self.etags.get(etag)
+            entry = self.cache.get(next(iter(keys))) if keys else None
+        return entry[0] if entry else None
 
     def has(self, key):
         """Clearly checks if a key is already cached."""
@@ -21,5 +169,26 @@ class ImageCache:
 
     def evict(self, keys):
         """Evicts multiple keys clearly and efficiently."""
-        for key in keys:
-            self.cache.pop(key, None)
+        with self.lock:
+            for key in keys:
+                if self._remove(key):
+                    self.evictions += 1
+
+    def stats(self) -> dict:
+        """Occupancy and hit/miss/eviction counters."""
+        lookups = self.hits + self.misses
+        with self.lock:  # add() evicts and downgrades from the cache executor threads.
+            entries = len(self.cache)
+            lite_entries = sum(1 for entry in self.cache.values() if entry[2] == LITE)
+            total_bytes = self.bytes
+        return {
+            "entries": entries,
+            "lite_entries": lite_entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "downgrades": self.downgrades,
+        }
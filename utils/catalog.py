@@ -0,0 +1,188 @@
+# utils/catalog.py
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+class Catalog:
+	"""
+	Persistent catalog of the descriptions of every image the app has read.
+
+	One row per file in a SQLite database, with the XMP and EXIF descriptions
+	and the file's (mtime_ns, size) when they were read. The descriptions are
+	indexed with FTS5 for full-text search; on SQLite builds without FTS5 the
+	search falls back to a LIKE scan. Rows are kept up to date by the folder
+	indexing and by saves, and also seed the metadata index when a folder is
+	opened again.
+	"""
+
+	def __init__(self, db_path):
+		self.db_path = Path(db_path)
+		self.lock = threading.Lock() # Used from worker threads.
+		self.db = None
+		self.fts = False # Whether full-text search is available.
+		try:
+			self.db_path.parent.mkdir(parents=True, exist_ok=True)
+			self.db = self._connect()
+		except (OSError, sqlite3.Error) as e:
+			# Not fatal, search just finds nothing.
+			print(f"Catalog disabled, could not open {self.db_path}: {e}")
+
+	def _connect(self):
+		try:
+			db = sqlite3.connect(self.db_path, check_same_thread=False)
+			self._create_schema(db)
+		except sqlite3.DatabaseError:
+			# Corrupt catalog, it is rebuilt as folders are opened.
+			self.db_path.unlink(missing_ok=True)
+			db = sqlite3.connect(self.db_path, check_same_thread=False)
+			self._create_schema(db)
+		return db
+
+	def _create_schema(self, db):
+		db.execute("PRAGMA journal_mode=WAL")
+		db.execute("PRAGMA synchronous=NORMAL")
+		db.execute("""
+			CREATE TABLE IF NOT EXISTS images (
+				id INTEGER PRIMARY KEY,
+				path TEXT NOT NULL UNIQUE,
+				file TEXT NOT NULL,
+				folder TEXT NOT NULL,
+				mtime_ns INTEGER NOT NULL,
+				size INTEGER NOT NULL,
+				xmp TEXT,
+				exif TEXT
+			)""")
+		db.execute("CREATE INDEX IF NOT EXISTS images_folder ON images (folder)")
+		try:
+			db.execute("""
+				CREATE VIRTUAL TABLE IF NOT EXISTS descriptions USING fts5(
+					xmp, exif, content='images', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+				)""")
+		except sqlite3.OperationalError:
+			self.fts = False
+		else:
+			self.fts = True
+			# Keep the full-text index in step with the images table.
+			db.executescript("""
+				CREATE TRIGGER IF NOT EXISTS images_insert AFTER INSERT ON images BEGIN
+					INSERT INTO descriptions (rowid, xmp, exif) VALUES (new.id, new.xmp, new.exif);
+				END;
+				CREATE TRIGGER IF NOT EXISTS images_delete AFTER DELETE ON images BEGIN
+					INSERT INTO descriptions (descriptions, rowid, xmp, exif) VALUES ('delete', old.id, old.xmp, old.exif);
+				END;
+				CREATE TRIGGER IF NOT EXISTS images_update AFTER UPDATE OF xmp, exif ON images BEGIN
+					INSERT INTO descriptions (descriptions, rowid, xmp, exif) VALUES ('delete', old.id, old.xmp, old.exif);
+					INSERT INTO descriptions (rowid, xmp, exif) VALUES (new.id, new.xmp, new.exif);
+				END;
+			""")
+		db.commit()
+
+	@staticmethod
+	def _key(path) -> str:
+		return os.path.normcase(os.path.abspath(path))
+
+	def put_many(self, entries):
+		"""
+		Add or update catalog rows.
+
+		Args:
+			entries (iterable): (path, signature, xmp, exif) per file.
+		"""
+		if self.db is None:
+			return
+		rows = [
+			(self._key(path), str(path), self._key(Path(path).parent), signature[0], signature[1], xmp, exif)
+			for path, signature, xmp, exif in entries]
+		if not rows:
+			return
+		try:
+			with self.lock:
+				self.db.executemany("""
+					INSERT INTO images (path, file, folder, mtime_ns, size, xmp, exif) VALUES (?, ?, ?, ?, ?, ?, ?)
+					ON CONFLICT (path) DO UPDATE SET
+						file = excluded.file, mtime_ns = excluded.mtime_ns, size = excluded.size,
+						xmp = excluded.xmp, exif = excluded.exif""", rows)
+				self.db.commit()
+		except sqlite3.Error as e:
+			print(f"Error updating the catalog: {e}")
+
+	def put(self, path, signature, xmp, exif):
+		self.put_many([(path, signature, xmp, exif)])
+
+	def discard(self, paths):
+		"""Remove the rows of the given files."""
+		if self.db is None:
+			return
+		try:
+			with self.lock:
+				self.db.executemany("DELETE FROM images WHERE path = ?", [(self._key(path),) for path in paths])
+				self.db.commit()
+		except sqlite3.Error as e:
+			print(f"Error removing files from the catalog: {e}")
+
+	def folder_entries(self, folder) -> dict:
+		"""
+		Return {Path: (signature, xmp, exif)} for the catalogued files in a folder.
+		"""
+		if self.db is None:
+			return {}
+		try:
+			with self.lock:
+				rows = self.db.execute(
+					"SELECT file, mtime_ns, size, xmp, exif FROM images WHERE folder = ?",
+					(self._key(folder),)).fetchall()
+		except sqlite3.Error as e:
+			print(f"Error reading the catalog: {e}")
+			return {}
+		return {Path(file): ((mtime_ns, size), xmp, exif) for file, mtime_ns, size, xmp, exif in rows}
+
+	@staticmethod
+	def _match_expression(query: str) -> str:
+		"""Turn search words into an FTS5 query matching every word as a prefix."""
+		words = re.findall(r"\w+", query)
+		return " AND ".join(f'"{word}"*' for word in words)
+
+	def search(self, query: str, limit: int = 200) -> list:
+		"""
+		Find files whose descriptions contain every word of the query, as a word or word prefix.
+		Results come in catalog order (folder by folder, as they were indexed): ranking
+		by relevance would score every match, and common words match most of the catalog.
+
+		Returns:
+			list: (path, xmp, exif) per file.
+		"""
+		if self.db is None or not query.strip():
+			return []
+		try:
+			with self.lock:
+				if self.fts:
+					expression = self._match_expression(query)
+					if not expression:
+						return []
+					rows = self.db.execute("""
+						SELECT images.file, images.xmp, images.exif FROM descriptions
+						JOIN images ON images.id = descriptions.rowid
+						WHERE descriptions MATCH ? LIMIT ?""", (expression, limit)).fetchall()
+				else:
+					pattern = "%" + query.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+					rows = self.db.execute("""
+						SELECT file, xmp, exif FROM images
+						WHERE xmp LIKE ? ESCAPE '\\' OR exif LIKE ? ESCAPE '\\' LIMIT ?""", (pattern, pattern, limit)).fetchall()
+		except sqlite3.Error as e:
+			print(f"Error searching the catalog: {e}")
+			return []
+		return [(Path(file), xmp, exif) for file, xmp, exif in rows]
+
+	def __len__(self):
+		if self.db is None:
+			return 0
+		with self.lock:
+			return self.db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+	def close(self):
+		if self.db is not None:
+			with self.lock:
+				self.db.close()
+				self.db = None
@@ -1,14 +1,23 @@
 # utils/dev_tools.py
-import psutil
 from utils.state import state
 import config
 import time
 
 def display_memory_usage():
     """Displays current memory usage (for debugging)."""
+    import psutil # Only needed in development mode, kept off the startup path.
     process = psutil.Process()
     mem_usage = process.memory_info().rss / (1024 * 1024)  # Convert bytes to MB
-    print(f"Memory Usage: {mem_usage:.2f} MB | Buffer Size: {len(state.image_cache)}/{config.IMAGE_CACHE_SIZE}")
+    stats = state.image_cache.stats()
+    print(
+        f"Memory Usage: {mem_usage:.2f} MB | Buffer Size: {len(state.image_cache)} images, "
+        f"{stats['bytes'] / (1024 * 1024):.1f}/{config.IMAGE_CACHE_MAX_MB} MB ({stats['lite_entries']} lite) | "
+        f"Hit rate: {stats['hit_rate']:.0%} | Evictions: {stats['evictions']} | Downgrades: {stats['downgrades']}")
+    window = state.prefetch_window.stats()
+    print(
+        f"Prefetch: {window['behind']} behind / {window['ahead']} ahead | Display hit rate: {window['hit_rate']:.0%} | "
+        f"Fast: {window['fast_windows']} | Leaning: {window['leaning_windows']} | Shrunk: {window['shrunk_windows']} | "
+        f"Queued: {state.cache_queue.qsize()} | Dropped: {state.cache_queue.dropped} | Cancelled: {state.cache_queue.cancelled}")
 
 def measure_execution_time(func, *args, **kwargs):
     """Measures execution time of a function."""
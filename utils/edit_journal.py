@@ -0,0 +1,127 @@
+# utils/edit_journal.py
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+class EditJournal:
+	"""
+	Durable, append-only journal of description edits that have not been written to their files yet.
+
+	Every edit is appended as a JSON line and fsynced before it is queued, so
+	an edit the user made is never lost, even if the app crashes before the
+	file is written. Once written, the edit is marked done. The journal is
+	truncated whenever nothing is pending, and replayed on startup otherwise.
+	"""
+
+	def __init__(self, path):
+		self.path = Path(path)
+		self.lock = threading.Lock() # Appended to from worker threads.
+		self.next_id = 1
+		self.pending = {} # id -> (path, value), edits not written yet
+		self.file = None
+		try:
+			self.path.parent.mkdir(parents=True, exist_ok=True)
+			self._load()
+			self.file = open(self.path, "a", encoding="utf-8")
+		except OSError as e:
+			# Not fatal, edits are still written, just not journaled.
+			print(f"Edit journal disabled, could not open {self.path}: {e}")
+
+	def _load(self):
+		"""Read the edits left pending by the previous session."""
+		if not self.path.exists():
+			return
+		with open(self.path, encoding="utf-8") as journal:
+			for line in journal:
+				try:
+					record = json.loads(line)
+				except json.JSONDecodeError:
+					continue  # A line cut short by a crash.
+				edit_id = record.get("id", 0)
+				self.next_id = max(self.next_id, edit_id + 1)
+				if record.get("op") == "edit":
+					self.pending[edit_id] = (Path(record["path"]), record["value"])
+				elif record.get("op") == "done":
+					self.pending.pop(edit_id, None)
+
+	def compact(self):
+		"""
+		Replace the journal with the pending edits only. Called once by the app on startup,
+		not when the journal is opened, so opening it never rewrites the file.
+		"""
+		with self.lock:
+			if self.file is None:
+				return
+			self.file.close()
+			self.file = None
+			try:
+				self._rewrite()
+			except OSError as e:
+				print(f"Error compacting the edit journal: {e}")
+			try:
+				self.file = open(self.path, "a", encoding="utf-8")
+			except OSError as e:
+				print(f"Edit journal disabled, could not open {self.path}: {e}")
+
+	def _rewrite(self):
+		"""Write the pending edits to a new journal and swap it in. Caller holds the lock."""
+		temp_path = self.path.with_suffix(".tmp")
+		with open(temp_path, "w", encoding="utf-8") as journal:
+			for edit_id, (path, value) in self.pending.items():
+				journal.write(self._line({"op": "edit", "id": edit_id, "path": str(path), "value": value}))
+			journal.flush()
+			os.fsync(journal.fileno())
+		os.replace(temp_path, self.path)
+
+	@staticmethod
+	def _line(record) -> str:
+		return json.dumps(record, ensure_ascii=False) + "\n"
+
+	def _write(self, record):
+		"""Append a record and make sure it is on disk. Caller holds the lock."""
+		if self.file is None:
+			return
+		self.file.write(self._line(record))
+		self.file.flush()
+		os.fsync(self.file.fileno())
+
+	def append(self, path, value: str) -> int:
+		"""Record an edit, returns its id."""
+		with self.lock:
+			edit_id = self.next_id
+			self.next_id += 1
+			self.pending[edit_id] = (Path(path), value)
+			try:
+				self._write({"op": "edit", "id": edit_id, "path": str(path), "value": value, "time": time.time()})
+			except OSError as e:
+				print(f"Error writing to the edit journal: {e}")
+			return edit_id
+
+	def complete(self, edit_ids):
+		"""Mark edits as written, or abandoned."""
+		with self.lock:
+			for edit_id in edit_ids:
+				self.pending.pop(edit_id, None)
+			try:
+				if not self.pending and self.file is not None:
+					# Nothing left to replay, start over with an empty journal.
+					self.file.truncate(0)
+					self.file.seek(0)
+				else:
+					for edit_id in edit_ids:
+						self._write({"op": "done", "id": edit_id})
+			except OSError as e:
+				print(f"Error writing to the edit journal: {e}")
+
+	def pending_edits(self) -> list:
+		"""Return (id, path, value) for every edit not written yet, oldest first."""
+		with self.lock:
+			return [(edit_id, path, value) for edit_id, (path, value) in self.pending.items()]
+
+	def close(self):
+		with self.lock:
+			if self.file is not None:
+				self.file.close()
+				self.file = None
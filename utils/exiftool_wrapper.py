@@ -1,102 +1,342 @@
 # utils/exiftool_wrapper.py
 
 import subprocess
+import html
 import json
-import shlex
 import os
+import re
+import asyncio
+import itertools
 import threading
+import time
 
-class PatchedExifTool:
+from utils.metrics import EXIFTOOL_SECONDS
+
+def tag_args(tags_dict) -> list:
+	"""
+	ExifTool arguments setting tags. Arguments are sent one per line, so values
+	containing line breaks are sent as HTML entities with -E instead.
+	"""
+	values = {tag: str(value) for tag, value in tags_dict.items()}
+	if not any("\n" in value or "\r" in value for value in values.values()):
+		return [f"-{tag}={value}" for tag, value in values.items()]
+	args = ["-E"]
+	for tag, value in values.items():
+		value = html.escape(value, quote=False).replace("\r\n", "&#xa;").replace("\n", "&#xa;").replace("\r", "&#xa;")
+		args.append(f"-{tag}={value}")
+	return args
+
+def write_summary(stdout: str, stderr: str) -> dict:
+	"""
+	Parse the result of an ExifTool write from its output, e.g.
+	"    1 image files updated" on stdout and "Error: ..." / "Warning: ..." lines on stderr.
+
+	Returns:
+		dict: {"updated": int, "unchanged": int, "failed": int, "errors": [str], "warnings": [str]}
 	"""
-	A patched version of ExifToolHelper that correctly handles UTF-8 filenames
-	and metadata values, using a persistent ExifTool process.
+	summary = {"updated": 0, "unchanged": 0, "failed": 0, "errors": [], "warnings": []}
+	for line in stdout.splitlines():
+		match = re.match(r"\s*(\d+) image files? (updated|unchanged)", line)
+		if match:
+			summary[match.group(2)] += int(match.group(1))
+			continue
+		match = re.match(r"\s*(\d+) files? weren't updated due to errors", line)
+		if match:
+			summary["failed"] += int(match.group(1))
+	for line in stderr.splitlines():
+		if line.startswith("Error"):
+			summary["errors"].append(line.strip())
+		elif line.startswith("Warning"):
+			summary["warnings"].append(line.strip())
+	return summary
+
+class ExifToolRequest:
+	"""A command sent to AsyncExifTool, waiting for its tagged response."""
+
+	def __init__(self, loop, future):
+		self.loop = loop
+		self.future = future
+		self.sent = time.perf_counter()
+		self.stdout = []
+		self.stderr = []
+		self.stdout_done = False
+		self.stderr_done = False
+
+class AsyncExifTool:
 	"""
+	An asyncio client for a persistent ExifTool process.
+
+	Every command is tagged with -executeNUM (and a matching -echo4 marker on
+	stderr), so several reads and writes can be written to the process at once
+	and each response is routed back to the coroutine waiting for it by number.
+	The pipes are served by reader threads rather than asyncio subprocesses,
+	so it works on any event loop, including the selector loop on Windows.
+	"""
+
+	READY_PATTERN = re.compile(r"^\{ready(\d+)\}$")
 
-	def __init__(self, executable="exiftool", common_args=None):
+	def __init__(self, executable="exiftool", common_args=None, lane="default"):
 		self.executable = executable
 		self.common_args = common_args or ["-stay_open", "True", "-@", "-"]
+		self.latency = EXIFTOOL_SECONDS.labels(lane) # Request latency histogram, shared by the workers of a lane.
 		self.process = None
 		self.stdin = None
-		self.stdout = None
-		self.lock = threading.Lock()  # Protect shared process
+		self.pending = {} # Sequence number -> ExifToolRequest
+		self.sequence = itertools.count(1)
+		self.lock = threading.Lock() # Protects process start/stop and the pending table.
+		self.write_lock = threading.Lock() # Keeps commands from interleaving on stdin.
 
 	def start(self):
-		"""Start the persistent ExifTool process with proper UTF-8 pipes."""
-		if self.process is not None:
-			return  # Already running
-
-		env = os.environ.copy()
-		env["LANG"] = "en_US.UTF-8"  # Force UTF-8 subprocess environment
-
-		self.process = subprocess.Popen(
-			[self.executable] + self.common_args,
-			stdin=subprocess.PIPE,
-			stdout=subprocess.PIPE,
-			stderr=subprocess.PIPE,
-			text=True,  # This enforces UTF-8 encoding in and out
-			encoding="utf-8",
-			env=env
-		)
-		self.stdin = self.process.stdin
-		self.stdout = self.process.stdout
+		"""Start the persistent ExifTool process and its reader threads."""
+		with self.lock:
+			if self.process is not None:
+				return  # Already running
+
+			env = os.environ.copy()
+			env["LANG"] = "en_US.UTF-8"  # Force UTF-8 subprocess environment
+
+			self.process = subprocess.Popen(
+				[self.executable] + self.common_args,
+				stdin=subprocess.PIPE,
+				stdout=subprocess.PIPE,
+				stderr=subprocess.PIPE,
+				text=True,  # This enforces UTF-8 encoding in and out
+				encoding="utf-8",
+				env=env
+			)
+			self.stdin = self.process.stdin
+			for stream, is_stdout in ((self.process.stdout, True), (self.process.stderr, False)):
+				threading.Thread(target=self._reader, args=(self.process, stream, is_stdout), daemon=True).start()
 
 	def stop(self):
-		"""Stop the persistent process."""
-		if self.process:
+		"""Stop the persistent process. Requests still in flight fail."""
+		with self.lock:
+			process = self.process
+			self.process = None
+		if process:
 			try:
-				self.stdin.write("-stay_open\nFalse\n")
-				self.stdin.flush()
-				self.process.wait(timeout=5)
+				with self.write_lock:
+					process.stdin.write("-stay_open\nFalse\n")
+					process.stdin.flush()
+				process.wait(timeout=5)
 			except Exception:
-				self.process.kill()
-		self.process = None
-
-	def __enter__(self):
-		self.start()
-		return self
+				process.kill()
 
-	def __exit__(self, exc_type, exc_val, exc_tb):
-		self.stop()
+	@property
+	def in_flight(self) -> int:
+		"""Number of commands sent that have not been answered yet."""
+		return len(self.pending)
 
-	def _read_output(self):
-		"""Read ExifTool's JSON output until the `{ready}` line."""
-		out_lines = []
-		while True:
-			line = self.stdout.readline()
-			if line.strip() == "{ready}":
-				break
-			out_lines.append(line)
-		return "".join(out_lines)
+	def _reader(self, process, stream, is_stdout):
+		"""Collect output lines and hand them to the request named in each ready marker."""
+		lines = []
+		for line in stream:
+			match = self.READY_PATTERN.match(line.strip())
+			if not match:
+				lines.append(line)
+				continue
+			with self.lock:
+				request = self.pending.get(int(match.group(1)))
+				if request is None:
+					lines = []
+					continue
+				if is_stdout:
+					request.stdout, request.stdout_done = lines, True
+				else:
+					request.stderr, request.stderr_done = lines, True
+				finished = request.stdout_done and request.stderr_done
+				if finished:
+					del self.pending[int(match.group(1))]
+			lines = []
+			if finished:
+				self.latency.observe(time.perf_counter() - request.sent)
+				request.loop.call_soon_threadsafe(self._resolve, request)
 
-	def get_tags(self, filepath, tags):
+		# The process has exited, fail everything still waiting on it.
 		with self.lock:
-			self.start()
+			if self.process is process:
+				self.process = None
+			failed = list(self.pending.values()) if self.process is None else []
+			if failed:
+				self.pending.clear()
+		for request in failed:
+			request.loop.call_soon_threadsafe(self._fail, request, RuntimeError("ExifTool process exited unexpectedly."))
 
-			args = [f"-{tag}" for tag in tags]
-			cmd = args + ["-j", str(filepath), "-execute\n"]
+	@staticmethod
+	def _resolve(request):
+		if not request.future.done():
+			request.future.set_result(("".join(request.stdout), "".join(request.stderr)))
 
-			self.stdin.write("\n".join(cmd))
+	@staticmethod
+	def _fail(request, error):
+		if not request.future.done():
+			request.future.set_exception(error)
+
+	def _write(self, payload):
+		with self.write_lock:
+			self.stdin.write(payload)
 			self.stdin.flush()
 
-			raw_output = self._read_output()
-			return json.loads(raw_output)
+	async def execute(self, *args):
+		"""
+		Run one ExifTool command without blocking the event loop.
+
+		Returns:
+			tuple: (stdout, stderr) text of the command.
+		"""
+		if self.process is None:
+			await asyncio.to_thread(self.start)
 
-	def set_tags(self, filepath, tags_dict, extra_args=None):
+		loop = asyncio.get_running_loop()
+		request = ExifToolRequest(loop, loop.create_future())
 		with self.lock:
-			self.start()
+			seq = next(self.sequence)
+			self.pending[seq] = request
+
+		cmd = [str(arg) for arg in args] + ["-echo4", f"{{ready{seq}}}", f"-execute{seq}"]
+		try:
+			# Writing can block if ExifTool is busy and the pipe is full.
+			await asyncio.to_thread(self._write, "\n".join(cmd) + "\n")
+		except Exception:
+			with self.lock:
+				self.pending.pop(seq, None)
+			raise
+		return await request.future
+
+	async def execute_many(self, commands):
+		"""
+		Run several ExifTool commands, sent in a single write so ExifTool works
+		through them back to back instead of waiting on a round trip per command.
+
+		Args:
+			commands (list): The arguments of each command.
+
+		Returns:
+			list: (stdout, stderr) text of each command, in order.
+		"""
+		if not commands:
+			return []
+		if self.process is None:
+			await asyncio.to_thread(self.start)
 
-			cmd = []
-			for tag, value in tags_dict.items():
-				cmd.append(f"-{tag}={value}")
-			cmd.append(str(filepath))
+		loop = asyncio.get_running_loop()
+		requests = []
+		lines = []
+		with self.lock:
+			for args in commands:
+				seq = next(self.sequence)
+				request = ExifToolRequest(loop, loop.create_future())
+				self.pending[seq] = request
+				requests.append((seq, request))
+				lines.extend([str(arg) for arg in args] + ["-echo4", f"{{ready{seq}}}", f"-execute{seq}"])
+		try:
+			await asyncio.to_thread(self._write, "\n".join(lines) + "\n")
+		except Exception:
+			with self.lock:
+				for seq, _ in requests:
+					self.pending.pop(seq, None)
+			raise
+		return await asyncio.gather(*(request.future for _, request in requests))
+
+	async def get_tags(self, filepath, tags):
+		args = [f"-{tag}" for tag in tags]
+		stdout, stderr = await self.execute(*args, "-j", filepath)
+		return json.loads(stdout)
+
+	async def get_tags_batch(self, filepaths, tags):
+		"""
+		Read the same tags for many files in a single ExifTool command.
+		Files ExifTool cannot read are left out of the result, so match
+		records back to files through their "SourceFile" key.
+		"""
+		if not filepaths:
+			return []
+		args = [f"-{tag}" for tag in tags]
+		stdout, stderr = await self.execute(*args, "-j", *filepaths)
+		return json.loads(stdout) if stdout.strip() else []
+
+	async def set_tags(self, filepath, tags_dict, extra_args=None):
+		args = tag_args(tags_dict)
+		args.append(filepath)
+		if extra_args:
+			args.extend(extra_args)
+		stdout, stderr = await self.execute(*args)
+		return write_summary(stdout, stderr)
+
+	async def set_tags_many(self, items, extra_args=None):
+		"""
+		Write tags to many files, one command per file, sent as a single batch.
+
+		Args:
+			items (list): (filepath, tags_dict) per file.
+
+		Returns:
+			list: write_summary() of each file, in order.
+		"""
+		commands = []
+		for filepath, tags_dict in items:
+			args = tag_args(tags_dict)
+			args.append(filepath)
 			if extra_args:
-				cmd.extend(extra_args)
+				args.extend(extra_args)
+			commands.append(args)
+		results = await self.execute_many(commands)
+		return [write_summary(stdout, stderr) for stdout, stderr in results]
 
-			cmd.append("-execute\n")
+class ExifToolPool:
+	"""
+	A pool of persistent ExifTool processes behind the AsyncExifTool API.
 
-			self.stdin.write("\n".join(cmd))
-			self.stdin.flush()
+	Reads go to the read worker with the fewest commands in flight. Writes
+	have their own lane of save workers, so a long -overwrite_original rewrite
+	of a large file never holds up the metadata reads for the next image.
+	"""
+
+	def __init__(self, executable="exiftool", read_workers=2, save_workers=1):
+		self.executable = executable
+		self.read_workers = [AsyncExifTool(executable=executable, lane="read") for _ in range(max(1, read_workers))]
+		self.save_workers = [AsyncExifTool(executable=executable, lane="save") for _ in range(max(1, save_workers))]
+
+	@property
+	def workers(self) -> list:
+		return self.read_workers + self.save_workers
+
+	@property
+	def in_flight(self) -> int:
+		"""Number of commands sent to any worker that have not been answered yet."""
+		return sum(worker.in_flight for worker in self.workers)
+
+	def start(self):
+		"""Start every worker process."""
+		for worker in self.workers:
+			worker.start()
+
+	def stop(self):
+		"""Stop every worker process."""
+		for worker in self.workers:
+			worker.stop()
+
+	@staticmethod
+	def _least_busy(workers):
+		return min(workers, key=lambda worker: worker.in_flight)
+
+	async def get_tags(self, filepath, tags):
+		return await self._least_busy(self.read_workers).get_tags(filepath, tags)
+
+	async def get_tags_batch(self, filepaths, tags):
+		return await self._least_busy(self.read_workers).get_tags_batch(filepaths, tags)
+
+	async def set_tags(self, filepath, tags_dict, extra_args=None):
+		return await self._least_busy(self.save_workers).set_tags(filepath, tags_dict, extra_args)
+
+	@property
+	def batch_workers(self) -> list:
+		"""
+		Workers bulk writes are spread over: every read worker but one, kept for navigation.
+		Never the save lane, an editor save must not wait behind a batch. With a single
+		read worker, batches share it with navigation.
+		"""
+		return self.read_workers[1:] or self.read_workers
 
-			raw_output = self._read_output()
-			# Optional: parse output for success/failure
-			return True
+	async def set_tags_many(self, items, extra_args=None):
+		return await self._least_busy(self.batch_workers).set_tags_many(items, extra_args)
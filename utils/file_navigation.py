@@ -2,23 +2,38 @@
 
 from utils.state import state
 from utils.file_utils import load_image, update_cache_window
+from utils import tracing
+from utils.metrics import NAVIGATION_SECONDS
+import time
 from pathlib import Path
 import glob
 import asyncio
 from nicegui import ui
 
+@tracing.traced()
 async def navigate_next():
-	async with state.nav_lock:
+	pressed = time.perf_counter()
+	async with tracing.locked(state.nav_lock, "nav_lock"):
+		if not state.nav_img_total:
+			return
 		state.nav_img_index = (state.nav_img_index + 1) % state.nav_img_total
+		state.prefetch_window.record_move(1)
 		next_image_path = state.nav_img_list[state.nav_img_index]
 		state.nav_counter.refresh()
 		await load_image(next_image_path)
+		NAVIGATION_SECONDS.observe(time.perf_counter() - pressed)
 		await update_cache_window(state.nav_img_index)
 
+@tracing.traced()
 async def navigate_prev():
-	async with state.nav_lock:
+	pressed = time.perf_counter()
+	async with tracing.locked(state.nav_lock, "nav_lock"):
+		if not state.nav_img_total:
+			return
 		state.nav_img_index = (state.nav_img_index - 1) % state.nav_img_total
+		state.prefetch_window.record_move(-1)
 		prev_image_path = state.nav_img_list[state.nav_img_index]
 		state.nav_counter.refresh()
 		await load_image(prev_image_path)
+		NAVIGATION_SECONDS.observe(time.perf_counter() - pressed)
 		await update_cache_window(state.nav_img_index)
\ No newline at end of file
@@ -1,28 +1,35 @@
 # utils/file_utils.py
 import asyncio
 import base64
-import concurrent.futures
-import cv2
-import tkinter as tk
-from tkinter import filedialog
 
 from nicegui import ui
 from pathlib import Path
-from PIL import Image
-from io import BytesIO
-import numpy as np
 
 from metadata.exif_handler import get_exif_description
 from metadata.xmp_handler import get_xmp_description
+from metadata import native_reader
+from utils.cache import FULL, LITE
+from utils.prefetch import calculate_cache_distances
+from utils.folder_index import FolderIndex
+from utils.folder_watcher import FolderWatcher
 from utils.dev_tools import display_memory_usage, async_measure_execution_time
-from utils.state import state
+from utils.metadata_index import file_signature, SUPPORTED_EXIF, SUPPORTED_XMP, XMP_DESCRIPTION_TAG, EXIF_DESCRIPTION_TAG
+from utils.state import state, notify
 from utils.ui_helpers import resize_all_textareas
+from utils import tracing
+from ui.previews import preview_url, prefetch_previews
 import config
 
+# Identifies the preview settings in the preview store, previews made with other settings are not reused.
+PREVIEW_PARAMS = f"jpeg-{config.PREVIEW_MAX_SIZE}px-q{config.PREVIEW_QUALITY}"
+
 def open_file_dialog():
 	"""
 	Create a file dialog in tkinter to select an image path.
 	"""
+	# Imported here, tkinter is only needed once the user opens a file.
+	import tkinter as tk
+	from tkinter import filedialog
 	root = tk.Tk()
 	root.withdraw()
 	root.attributes('-topmost', True)
@@ -61,10 +68,31 @@ async def load_initial_image(path: Path):
 				)
 
 		# Prepare indexing of images
-		folder = Path(path).parent		
+		folder = Path(path).parent
+		try:
+			folder_index = await asyncio.to_thread(FolderIndex.scan, folder, natural=config.FOLDER_NATURAL_SORT)
+		except OSError as e:
+			state.error_dialog.show(
+				"Folder could not be opened.",
+				"Confirm the folder exists and can be read, and try again.",
+				f"{e}")
+			return
+		current_index = folder_index.index_of(path)
+		if current_index is None:
+			state.error_dialog.show(
+				"Not a supported image.",
+				"Select a JPG, PNG or TIFF image, and try again.",
+				f"{path}")
+			return
+		if folder != state.nav_folder:
+			state.metadata_index.clear()
+			# Descriptions read in earlier sessions, used where the file has not changed since.
+			state.metadata_index.seed(await asyncio.to_thread(state.catalog.folder_entries, folder))
+			state.prefetch_window.reset()
+			watch_folder(folder)
 		state.nav_folder = folder
-		state.nav_img_list = sorted(folder.glob("*.jpg")) + sorted(folder.glob("*.jpeg")) + sorted(folder.glob("*.png")) + sorted(folder.glob("*.tiff")) + sorted(folder.glob("*.tif"))
-		state.nav_img_index = state.nav_img_list.index(Path(path))
+		state.nav_img_list = folder_index
+		state.nav_img_index = current_index
 		state.nav_img_total = len(state.nav_img_list)
 		state.nav_txt = f"{state.nav_img_index + 1} / {state.nav_img_total}"
 		state.nav_counter.refresh()
@@ -76,16 +104,173 @@ async def load_initial_image(path: Path):
 		state.meta_textarea_input.props(remove="readonly disable")
 
 		# Queue background caching
-		await update_cache_window(state.nav_img_index)		
+		await update_cache_window(state.nav_img_index)
+
+		# Read descriptions for the rest of the folder in the background
+		if state.metadata_index_task and not state.metadata_index_task.done():
+			state.metadata_index_task.cancel()
+		state.metadata_index_task = asyncio.create_task(index_folder_metadata(list(state.nav_img_list)))
+
+def watch_folder(folder):
+	"""Replace the folder watcher, so changes made outside the app are picked up."""
+	if state.folder_watcher:
+		state.folder_watcher.stop()
+		state.folder_watcher = None
+	if not config.FOLDER_WATCH:
+		return
+
+	async def on_change(names):
+		await refresh_folder(folder, names)
+
+	state.folder_watcher = FolderWatcher(folder, on_change, poll_seconds=config.FOLDER_POLL_SECONDS)
+	state.folder_watcher.start()
+
+async def reload_folder():
+	"""Check the whole open folder for changes made outside the app."""
+	if state.nav_folder is not None:
+		await refresh_folder(state.nav_folder)
+
+async def refresh_folder(folder, names=None):
+	"""
+	Bring the folder index, caches and the current image up to date with changes
+	made outside the app. Only previews and descriptions of files whose mtime or
+	size changed are dropped, and the current image keeps its place.
+
+	Args:
+		folder (Path): Folder the changes are for, ignored if it is no longer open.
+		names (set): Names of files that changed, or None to rescan the whole folder.
+	"""
+	# Let running saves finish, so the app's own writes are recognised by their new signature.
+	await state.save_queue.join()
+
+	async with state.nav_lock:
+		folder_index = state.nav_img_list
+		if folder != state.nav_folder or folder_index is None:
+			return
+
+		if names is None:
+			scanned = await asyncio.to_thread(FolderIndex.scan, folder, natural=folder_index.natural)
+			present = set(scanned.names)
+			known = set(folder_index.names)
+		else:
+			present = await asyncio.to_thread(lambda: {name for name in names if (folder / name).is_file()})
+			known = {name for name in names if name in folder_index.positions}
+		added = present - known
+		removed = known - present
+
+		kept = [folder / name for name in present & known]
+		# Files named by the watcher that are not indexed yet are assumed to have changed.
+		changed = await asyncio.to_thread(state.metadata_index.changed_paths, kept, names is not None)
+		if names is None:
+			# A rescan has no signature in the index for files not indexed yet, check their previews instead.
+			changed += await asyncio.to_thread(changed_previews, state.metadata_index.unindexed(kept))
+		stale = changed + [folder / name for name in removed]
+		if not added and not stale:
+			return
+
+		state.image_cache.evict(stale)
+		state.metadata_index.discard(stale)
+		await asyncio.to_thread(state.preview_store.discard, stale)
+		await asyncio.to_thread(state.catalog.discard, [folder / name for name in removed])
+		folder_index.update(added, removed)
+		state.nav_img_total = len(folder_index)
+
+		if state.nav_img_total == 0:
+			state.nav_img_index = 0
+			state.nav_txt = "0 / 0"
+			state.nav_counter.refresh()
+			notify("There are no images left in this folder.", type="warning")
+			return
+
+		# Stay on the current image, or on the one that took its place if it was removed.
+		current = state.current_image
+		current_index = folder_index.index_of(current) if current is not None else None
+		if current_index is None:
+			state.nav_img_index = min(state.nav_img_index, state.nav_img_total - 1)
+			await load_image(folder_index[state.nav_img_index])
+		else:
+			state.nav_img_index = current_index
+			state.nav_txt = f"{state.nav_img_index + 1} / {state.nav_img_total}"
+			state.nav_counter.refresh()
+			if Path(current) in stale:
+				await load_image(current)
+		await update_cache_window(state.nav_img_index)
+
+	await index_folder_metadata([folder / name for name in added] + changed)
+
+def changed_previews(image_paths) -> list:
+	"""
+	Return the paths whose preview in memory was made from an older version of the file,
+	going by the signature the preview store recorded for it. Previews without one are included.
+	"""
+	changed = []
+	for image_path in image_paths:
+		if not state.image_cache.has(image_path):
+			continue
+		try:
+			signature = file_signature(image_path)
+		except OSError:
+			signature = None
+		if signature is None or state.preview_store.signature(image_path, PREVIEW_PARAMS) != signature:
+			changed.append(image_path)
+	return changed
+
+async def index_folder_metadata(image_paths):
+	"""
+	Fill the metadata index for a folder, skipping files that are already indexed and unchanged.
+	Files are read natively when possible, the rest with batched ExifTool reads.
+	"""
+	# Leave one read worker free for the image the user is looking at.
+	exiftool_parallel = max(1, len(state.exiftool_process.read_workers) - 1)
+	exiftool_reads = asyncio.Semaphore(exiftool_parallel)
+
+	async def index_batch(batch):
+		signatures = await asyncio.to_thread(state.metadata_index.stale_signatures, batch)
+		if not signatures:
+			return
+		unread = list(signatures)
+		if config.NATIVE_METADATA_READER:
+			values, unread = await asyncio.to_thread(native_reader.read_many, unread)
+			indexed = state.metadata_index.add_native_records(values, signatures)
+			await asyncio.to_thread(state.catalog.put_many, indexed)
+		if not unread:
+			return
+		async with exiftool_reads:
+			records = await state.exiftool_process.get_tags_batch(
+				unread,
+				[XMP_DESCRIPTION_TAG, EXIF_DESCRIPTION_TAG])
+		indexed = state.metadata_index.add_exiftool_records(records, signatures)
+		await asyncio.to_thread(state.catalog.put_many, indexed)
+
+	batch_size = config.METADATA_BATCH_SIZE
+	if config.NATIVE_METADATA_READER:
+		# Most batches never reach ExifTool, those that do wait for exiftool_reads.
+		parallel = max(1, config.NATIVE_METADATA_THREADS)
+	else:
+		parallel = exiftool_parallel
+	batches = [image_paths[start:start + batch_size] for start in range(0, len(image_paths), batch_size)]
+	try:
+		for start in range(0, len(batches), parallel):
+			await asyncio.gather(*(index_batch(batch) for batch in batches[start:start + parallel]))
+	except asyncio.CancelledError:
+		raise
+	except Exception as e:
+		# Not fatal, images that were not indexed are read one by one in extract_metadata.
+		print(f"Error indexing metadata for {state.nav_folder}: {e}")
 
+@tracing.traced()
 async def load_image(image_path):
 	"""
 	Loads an image, using the buffer if available, and extracts metadata.
 	"""
 	try:
+		tracing.annotate(image=Path(image_path).name)
 		state.current_image = image_path
 		# Prepare indexing of images
-		state.nav_img_index = state.nav_img_list.index(Path(image_path))
+		index = state.nav_img_list.index_of(image_path)
+		if index is None:
+			raise ValueError(f"{Path(image_path).name} is not in {state.nav_folder}.")
+		state.nav_img_index = index
 		state.nav_txt = f"{state.nav_img_index + 1} / {state.nav_img_total}"
 		state.nav_counter.refresh()	
 
@@ -95,7 +280,9 @@ async def load_image(image_path):
 
 		# Check if image actually exists.
 		image_path = Path(image_path)
-		if not await asyncio.to_thread(image_path.exists):
+		with tracing.span("exists"):
+			exists = await asyncio.to_thread(image_path.exists)
+		if not exists:
 			state.error_dialog.show(
 				"File does not exist.", 
 				"Confirm the image file exists, and try again.")
@@ -105,19 +292,36 @@ async def load_image(image_path):
 		metadata_task = asyncio.create_task(extract_metadata(image_path))
 
 		# Get cached image
-		cached_image = state.image_cache.get(image_path)
-		if cached_image is None:
-			cache_task = asyncio.create_task(asyncio.to_thread(cache_image, image_path))
+		cache_tier = state.image_cache.lookup(image_path)
+		tracing.annotate(cache_tier=cache_tier)
+		state.prefetch_window.record_display(cache_tier is not None)
+		if cache_tier is None:
+			cache_task = start_cache_task(image_path)
+			from utils.image_decode import quick_preview # Loads cv2, warmed up in the background after startup.
+			# Paint the embedded thumbnail (or a fast 1/8 scale decode) while the full preview is made.
+			with tracing.span("quick_preview"):
+				first_paint = await asyncio.to_thread(quick_preview, image_path)
+			if first_paint and not cache_task.done():
+				await display_image(f"data:image/jpeg;base64,{base64.b64encode(first_paint).decode('utf-8')}")
+		elif cache_tier == LITE:
+			# Show the downgraded preview at once, and make the full one again.
+			await display_image(preview_url(image_path))
+			cache_task = start_cache_task(image_path)
 		else:
 			cache_task = None
 
 		tasks = [metadata_task]
 		if cache_task:
-			tasks.append(cache_task)
+			# Shielded, the prefetcher may be waiting on the same task.
+			tasks.append(asyncio.shield(cache_task))
 
-		await asyncio.gather(*tasks)
-		cached_image = state.image_cache.get(image_path)
+		with tracing.span("wait metadata and preview"):
+			await asyncio.gather(*tasks)
+		cached_image = preview_url(image_path)
 		await asyncio.gather(display_image(cached_image), display_metadata())
+		# Let the browser fetch the neighbours, so Previous/Next reuse its HTTP cache.
+		total = state.nav_img_total
+		prefetch_previews([state.nav_img_list[(state.nav_img_index + offset) % total] for offset in (1, -1, 2)])
 		state.nav_counter.refresh()
 		state.image_spinner.hide()
 		state.editor_spinner.hide()
@@ -132,111 +336,116 @@ async def load_image(image_path):
 		state.image_spinner.hide()
 		state.editor_spinner.hide()
 
-def cache_image(image_path):
+def start_cache_task(image_path):
 	"""
-	Quickly converts the image to a compressed in-memory JPG Base64 string for NiceGUI.
+	Return the running task making the preview for an image, or start one.
+	Sharing it keeps the prefetcher and load_image from making the same preview twice.
+	"""
+	task = state.latest_cache_tasks.get(image_path)
+	if task is None or task.done():
+		task = asyncio.create_task(cache_image(image_path))
+		state.latest_cache_tasks[image_path] = task
+
+		def forget(_):
+			if state.latest_cache_tasks.get(image_path) is task:
+				del state.latest_cache_tasks[image_path]
+		task.add_done_callback(forget)
+	return task
+
+@tracing.traced()
+async def cache_image(image_path):
+	"""
+	Quickly converts the image to a compressed in-memory JPG, served to NiceGUI from the preview route.
+	The preview is reused from the preview store if the file has not changed.
 	"""
-	def safe_imread(path):
-		try:
-			data = np.fromfile(str(path), dtype=np.uint8)
-			img = cv2.imdecode(data, cv2.IMREAD_COLOR)
-			return img
-		except Exception as e:
-			state.error_dialog.show(
-				f"safe_imread failed on {image_path.name}", 
-				"Please try again, and confirm the image works in a different program.", 
-				f"{e}")
-			return None
-
 	try:
 		if image_path is None:
 			raise ValueError("Attempted to read None Image.")
-		
-		img = safe_imread(image_path)
-		if img is None:
-			raise ValueError("Image could not be loaded by OpenCV.")
-		
-		height, width = img.shape[:2]
-
-		scale = min(1.0, 1920 / max(height, width))
-		if scale < 1.0:
-			img = cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
-
-		success, jpeg_buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 60])
-		if not success:
-			raise ValueError("Failed to encode image.")
-		
-		base64_image = f"data:image/jpeg;base64,{base64.b64encode(jpeg_buf).decode('utf-8')}"
-		state.image_cache.add(image_path, base64_image)
 
+		tracing.annotate(image=image_path.name)
+		# Reuse the preview from an earlier session if the file has not changed since.
+		with tracing.span("preview_store.get") as span:
+			signature = await asyncio.to_thread(file_signature, image_path)
+			jpeg_buf = await asyncio.to_thread(state.preview_store.get, image_path, PREVIEW_PARAMS, signature)
+			span.set(hit=jpeg_buf is not None)
+
+		if jpeg_buf is None:
+			with tracing.span("render"):
+				jpeg_buf = await state.preview_engine.render(image_path)
+			with tracing.span("preview_store.put"):
+				await asyncio.to_thread(state.preview_store.put, image_path, PREVIEW_PARAMS, jpeg_buf, signature)
+
+		# Adding can re-encode other entries to fit the cache budget, keep it off the event loop.
+		with tracing.span("image_cache.add", bytes=len(jpeg_buf)):
+			await asyncio.to_thread(state.image_cache.add, image_path, jpeg_buf)
+
+	except asyncio.CancelledError:
+		raise
 	except Exception as e:
 		state.error_dialog.show(
 			f"Could not process {image_path.name} for app.", 
 			"Please try again, and confirm the image works in a different program.", 
 			f"{e}")
 
-def calculate_cache_indices(current_index: int, total_images: int, window_size: int = 25) -> set:
-	"""
-	Calculate indices for caching, handling wrap-around logic clearly.
-
-	Args:
-		current_index (int): The current index in the navigation.
-		total_images (int): The total number of images in the current folder.
-		window_size (int): Number of images to cache before and after current.
-
-	Returns:
-		set: A set of calculated indices for caching.
-	"""
-	indices = set()
-	for offset in range(-window_size, window_size + 1):
-		wrapped_index = (current_index + offset) % total_images
-		indices.add(wrapped_index)
-	return indices
-
-async def update_cache_window(current_index: int, threshold: int = 10, window_size: int = 25):
+@tracing.traced()
+async def update_cache_window(current_index: int, threshold: int = 10, window_size: int = None):
 	"""
 	Updates image cache proactively around the current image index.
+	Missing previews are queued nearest first, and the queue is re-ranked on every move.
 
 	Args:
 		current_index (int): Current navigation index.
-		threshold (int): Distance from last cached center to trigger re-caching.
-		window_size (int): Images to cache on each side of the current index.
+		threshold (int): Distance from the last eviction center before previews outside the window are evicted.
+		window_size (int): Images to cache on each side of the current index. By default the
+			window adapts to how the user navigates, see AdaptiveWindow.
 	"""
 	total_images = state.nav_img_total
 	image_list = state.nav_img_list
 
-	# Check if caching is necessary
-	if state.cached_center_index:
-		distance_moved = abs(current_index - state.cached_center_index)
-		if distance_moved < threshold:
-			return
-	
-	state.cached_center_index = current_index
+	if window_size is None:
+		behind, ahead = state.prefetch_window.window(center=image_list[current_index])
+	else:
+		behind, ahead = window_size, window_size
 
-	# Calculate new indices
-	new_indices = calculate_cache_indices(current_index, total_images, window_size)
-	new_window_set = {image_list[i] for i in new_indices}
+	distances = {
+		image_list[i]: distance
+		for i, distance in calculate_cache_distances(current_index, total_images, behind, ahead).items()}
 
-	# Evict images no longer within the new window
-	images_to_evict = set(state.image_cache.cache.keys()) - new_window_set
-	state.image_cache.evict(images_to_evict)
+	tracing.annotate(behind=behind, ahead=ahead)
 
-	# Cancel previous cache tasks if rapidly navigating
-	if state.latest_cache_tasks is not None:
-		for task in state.latest_cache_tasks:
-			if not task.done():
-				task.cancel()
-	else:
-		state.latest_cache_tasks = []
-
-	# Add new images to cache asynchronously
-	for img_path in new_window_set:
-		if not state.image_cache.has(img_path):
-			await state.cache_queue.put(img_path)
+	# Tell the cache which previews are close to the cursor, far ones are downgraded or evicted first.
+	state.image_cache.set_focus(distances)
 
+	# Drop or re-rank queued work, and cancel previews being made that left the window
+	with tracing.span("reschedule") as span:
+		cancelled = 0
+		for img_path in state.cache_queue.reschedule(distances):
+			task = state.latest_cache_tasks.get(img_path)
+			if task and not task.done():
+				task.cancel()
+				cancelled += 1
+		span.set(cancelled=cancelled)
+
+	# Evict images no longer within the window, once the cursor has moved far enough
+	if state.cached_center_index is None or abs(current_index - state.cached_center_index) >= threshold:
+		state.cached_center_index = current_index
+		with tracing.span("evict"):
+			state.image_cache.evict(set(state.image_cache.cache.keys()) - distances.keys())
+
+	# Queue missing previews, nearest first
+	with tracing.span("queue") as span:
+		queued = 0
+		for img_path, distance in distances.items():
+			if state.image_cache.tier(img_path) != FULL:
+				await state.cache_queue.put(img_path, distance)
+				queued += 1
+		span.set(queued=queued)
+
+@tracing.traced()
 async def display_image(cached_image):
 	"""
 	Updates the UI with the processed image and hides the spinner.
+	Receives the URL of the image, from preview_url() or a data URI.
 	"""
 	if cached_image:
 		if state.image_display:
@@ -253,6 +462,7 @@ async def display_image(cached_image):
 			"The requested image is not cached yet. Please try again."
 		)
 
+@tracing.traced()
 async def extract_metadata(image_path):
 	"""
 	Extracts EXIF/XMP metadata and updates the UI in the background.
@@ -264,20 +474,43 @@ async def extract_metadata(image_path):
 		state.meta_value_input = None
 		state.original_metadata = None
 		
-		# Get file extension in lowercase
-		extension = image_path.suffix.lower()
-
-		# Define supported formats
-		supported_exif = {".jpg", ".jpeg", ".tiff", ".tif"}  # EXIF supported formats
-		supported_xmp = {".jpg", ".jpeg", ".tiff", ".tif", ".png"}  # XMP supported formats
-
-		if extension in supported_xmp:
-			state.meta_value_xmp = await get_xmp_description(image_path)
-		if extension in supported_exif:
-			state.meta_value_exif = await get_exif_description(image_path)
-
-		# Set input buffer
-		if state.meta_value_xmp:
+		# Use the folder index when the file has not changed since it was read
+		entry = await asyncio.to_thread(state.metadata_index.get, image_path)
+		tracing.annotate(indexed=entry is not None)
+		if entry is not None:
+			state.meta_value_xmp = entry["xmp"]
+			state.meta_value_exif = entry["exif"]
+		else:
+			# Get file extension in lowercase
+			extension = image_path.suffix.lower()
+			signature = await asyncio.to_thread(file_signature, image_path)
+
+			values = None
+			if config.NATIVE_METADATA_READER:
+				with tracing.span("native read"):
+					try:
+						values = await asyncio.to_thread(native_reader.read_descriptions, image_path)
+					except (native_reader.UnsupportedMetadata, OSError):
+						pass  # ExifTool reads it below.
+			if values is not None:
+				state.meta_value_xmp = values.get("xmp")
+				state.meta_value_exif = values.get("exif")
+			else:
+				# Both reads are pipelined through the same ExifTool process.
+				xmp_task = get_xmp_description(image_path) if extension in SUPPORTED_XMP else asyncio.sleep(0)
+				exif_task = get_exif_description(image_path) if extension in SUPPORTED_EXIF else asyncio.sleep(0)
+				with tracing.span("exiftool read"):
+					state.meta_value_xmp, state.meta_value_exif = await asyncio.gather(xmp_task, exif_task)
+
+			state.metadata_index.put(image_path, state.meta_value_xmp, state.meta_value_exif, signature)
+			with tracing.span("catalog.put"):
+				await asyncio.to_thread(state.catalog.put, image_path, signature, state.meta_value_xmp, state.meta_value_exif)
+
+		# Set input buffer, an edit still waiting to be written comes first
+		pending = state.pending_edits.get(Path(image_path))
+		if pending is not None:
+			state.meta_value_input = pending
+		elif state.meta_value_xmp:
 			state.meta_value_input = state.meta_value_xmp
 		elif state.meta_value_exif:
 			state.meta_value_input = state.meta_value_exif
@@ -290,7 +523,11 @@ async def extract_metadata(image_path):
 			"The app was not able to extract the EXIF or XMP data from this image.", 
 			f"{e}")
 		
-async def display_metadata():
+async def display_metadata(include_input: bool = True):
+	"""
+	Show the metadata buffers in the editor.
+	Pass include_input=False to keep what the user is typing and only update the XMP/EXIF views.
+	"""
 	# XMP Field
 	if state.meta_value_xmp:
 		state.meta_textarea_xmp.value = state.meta_value_xmp
@@ -308,5 +545,6 @@ async def display_metadata():
 		state.meta_textarea_exif.classes(add="text-italic")
 
 	# Input Field
-	state.meta_textarea_input.value = state.meta_value_input
-	state.original_metadata = state.meta_textarea_input.value
\ No newline at end of file
+	if include_input:
+		state.meta_textarea_input.value = state.meta_value_input
+		state.original_metadata = state.meta_textarea_input.value
\ No newline at end of file
@@ -0,0 +1,143 @@
+# utils/folder_index.py
+import bisect
+import os
+import re
+import sys
+from pathlib import Path
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".tiff", ".tif")
+
+_DIGITS = re.compile(r"(\d+)")
+
+def natural_key(name: str) -> tuple:
+	"""
+	Sort key that orders numbers in names by value, so "image-2" comes before "image-10".
+	Case is ignored, and the name itself breaks ties.
+	"""
+	parts = _DIGITS.split(name.casefold())
+	# Text at even positions and digit runs at odd positions, so a number is only ever compared with a number.
+	parts[1::2] = map(int, parts[1::2])
+	return parts, name
+
+def walk_images(root, extensions=IMAGE_EXTENSIONS, on_error=None):
+	"""
+	Yield the path of every image in a folder tree, one folder at a time,
+	without listing the whole tree first.
+
+	Args:
+		on_error (callable): Called with (folder, OSError) for a folder that cannot be read.
+			By default it is reported on stderr, standard output may be carrying an export.
+	"""
+	pending = [root]
+	while pending:
+		folder = pending.pop()
+		names = []
+		subfolders = []
+		try:
+			with os.scandir(folder) as entries:
+				for entry in entries:
+					try:
+						if entry.is_dir(follow_symlinks=False):
+							subfolders.append(entry.name)
+							continue
+					except OSError:
+						continue
+					name = entry.name
+					if name[name.rfind("."):].lower() in extensions:
+						names.append(name)
+		except OSError as e:
+			if on_error is not None:
+				on_error(folder, e)
+			else:
+				print(f"Could not read {folder}: {e}", file=sys.stderr)
+			continue
+		# Depth first, subfolders in natural order.
+		pending.extend(os.path.join(folder, name) for name in sorted(subfolders, key=natural_key, reverse=True))
+		names.sort(key=natural_key)
+		folder = Path(folder)
+		for name in names:
+			yield folder / name
+
+class FolderIndex:
+	"""
+	The images of one folder in navigation order.
+
+	Built in a single os.scandir pass. Only file names are stored, the full
+	path is made when an entry is read, and positions are kept in a dict so
+	finding an image's index doesn't scan the list. Behaves like the list of
+	Paths it replaces: supports len(), indexing and iteration.
+	"""
+
+	def __init__(self, folder, names, natural: bool = True):
+		self.folder = Path(folder)
+		self.names = list(names)
+		self.natural = natural
+		self.positions = {name: index for index, name in enumerate(self.names)}
+
+	@classmethod
+	def scan(cls, folder, extensions=IMAGE_EXTENSIONS, natural: bool = True):
+		"""
+		List the images in a folder.
+
+		Args:
+			folder (Path): Folder to list.
+			extensions (tuple): Lower case file extensions to include, matched case-insensitively.
+			natural (bool): Order numbers in names by value, otherwise sort by name.
+		"""
+		names = []
+		with os.scandir(folder) as entries:
+			for entry in entries:
+				name = entry.name
+				if name[name.rfind("."):].lower() not in extensions:
+					continue
+				try:
+					if not entry.is_file():
+						continue
+				except OSError:
+					continue
+				names.append(name)
+		names.sort(key=natural_key if natural else None)
+		return cls(folder, names, natural)
+
+	def __len__(self):
+		return len(self.names)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self.folder / name for name in self.names[index]]
+		return self.folder / self.names[index]
+
+	def __iter__(self):
+		folder = self.folder
+		return (folder / name for name in self.names)
+
+	def __contains__(self, path):
+		return self.index_of(path) is not None
+
+	def update(self, added=(), removed=()):
+		"""
+		Add and remove images by name, keeping the order.
+
+		Args:
+			added (iterable): Names of new images.
+			removed (iterable): Names of images that are gone.
+		"""
+		removed = set(removed)
+		if removed:
+			self.names = [name for name in self.names if name not in removed]
+		added = [name for name in set(added) if name not in removed and name not in self.positions]
+		key = natural_key if self.natural else None
+		if len(added) > 64:
+			self.names.extend(added)
+			self.names.sort(key=key)
+		else:
+			for name in added:
+				bisect.insort(self.names, name, key=key)
+		self.positions = {name: index for index, name in enumerate(self.names)}
+
+	def index_of(self, path):
+		"""Returns the index of an image, or None if it is not in this folder."""
+		path = Path(path)
+		if path.parent != self.folder:
+			return None
+		return self.positions.get(path.name)
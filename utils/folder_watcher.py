@@ -0,0 +1,108 @@
+# utils/folder_watcher.py
+import asyncio
+import os
+
+from utils.folder_index import IMAGE_EXTENSIONS
+
+try:
+	import watchfiles  # Installed with NiceGUI, uses inotify on Linux and ReadDirectoryChangesW on Windows.
+except ImportError:
+	watchfiles = None
+
+def snapshot(folder, extensions=IMAGE_EXTENSIONS) -> dict:
+	"""Return {name: (mtime_ns, size)} for the images in a folder."""
+	signatures = {}
+	with os.scandir(folder) as entries:
+		for entry in entries:
+			name = entry.name
+			if name[name.rfind("."):].lower() not in extensions:
+				continue
+			try:
+				if entry.is_file():
+					stat = entry.stat()
+					signatures[name] = (stat.st_mtime_ns, stat.st_size)
+			except OSError:
+				continue
+	return signatures
+
+class FolderWatcher:
+	"""
+	Reports images that were added, removed or edited in a folder.
+
+	Uses the operating system's change notifications through watchfiles when
+	available, and otherwise compares a snapshot of the folder every few
+	seconds. Changes are reported by file name only; the callback works out
+	what happened to each file.
+	"""
+
+	def __init__(self, folder, on_change, extensions=IMAGE_EXTENSIONS, poll_seconds: float = 2.0, native: bool = True):
+		"""
+		Args:
+			folder (Path): Folder to watch, subfolders are ignored.
+			on_change (callable): Coroutine function called with a set of changed file names.
+			extensions (tuple): Lower case file extensions to report.
+			poll_seconds (float): Interval between snapshots when polling.
+			native (bool): Use change notifications if watchfiles is installed.
+		"""
+		self.folder = folder
+		self.on_change = on_change
+		self.extensions = extensions
+		self.poll_seconds = poll_seconds
+		self.native = native and watchfiles is not None
+		self.task = None
+		self.stop_event = None
+
+	def start(self):
+		"""Start watching, on the running event loop."""
+		self.stop_event = asyncio.Event()
+		self.task = asyncio.create_task(self._run())
+
+	def stop(self):
+		if self.stop_event is not None:
+			self.stop_event.set()
+		if self.task is not None and not self.task.done():
+			self.task.cancel()
+		self.task = None
+
+	def _wanted(self, name) -> bool:
+		return name[name.rfind("."):].lower() in self.extensions
+
+	async def _run(self):
+		if self.native:
+			try:
+				await self._watch_native()
+				return
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				# E.g. network drives without change notifications.
+				print(f"Change notifications unavailable for {self.folder}, polling instead: {e}")
+		await self._watch_polling()
+
+	async def _report(self, names):
+		if not names:
+			return
+		try:
+			await self.on_change(names)
+		except asyncio.CancelledError:
+			raise
+		except Exception as e:
+			print(f"Error applying changes in {self.folder}: {e}")
+
+	async def _watch_native(self):
+		async for changes in watchfiles.awatch(self.folder, recursive=False, stop_event=self.stop_event):
+			names = {os.path.basename(path) for _, path in changes}
+			await self._report({name for name in names if self._wanted(name)})
+
+	async def _watch_polling(self):
+		previous = await asyncio.to_thread(snapshot, self.folder, self.extensions)
+		while not self.stop_event.is_set():
+			await asyncio.sleep(self.poll_seconds)
+			try:
+				current = await asyncio.to_thread(snapshot, self.folder, self.extensions)
+			except OSError as e:
+				print(f"Error polling {self.folder}: {e}")
+				continue
+			names = {name for name in previous.keys() | current.keys() if previous.get(name) != current.get(name)}
+			previous = current
+			await self._report(names)
@@ -0,0 +1,166 @@
+# utils/image_decode.py
+import mmap
+import struct
+import cv2
+import numpy as np
+
+from utils.image_structure import jpeg_segments, find_jpeg_app_segment, TiffReader, \
+	TAG_ORIENTATION, TAG_THUMBNAIL_OFFSET, TAG_THUMBNAIL_LENGTH
+
+# Start Of Frame markers, they carry the image size. (0xC4, 0xC8 and 0xCC are not SOF markers.)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# libjpeg can decode at 1/2, 1/4 or 1/8 scale while decoding the DCT blocks.
+REDUCED_DECODE_FLAGS = (
+	(8, cv2.IMREAD_REDUCED_COLOR_8),
+	(4, cv2.IMREAD_REDUCED_COLOR_4),
+	(2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# cv2 operations that turn an image stored with an EXIF orientation upright.
+ORIENTATION_TRANSFORMS = {
+	2: lambda img: cv2.flip(img, 1),
+	3: lambda img: cv2.rotate(img, cv2.ROTATE_180),
+	4: lambda img: cv2.flip(img, 0),
+	5: lambda img: cv2.transpose(img),
+	6: lambda img: cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE),
+	7: lambda img: cv2.rotate(cv2.transpose(img), cv2.ROTATE_180),
+	8: lambda img: cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE),
+}
+
+def is_jpeg(data) -> bool:
+	return len(data) > 3 and data[0] == 0xFF and data[1] == 0xD8
+
+def read_jpeg_size(data):
+	"""
+	Read the (width, height) of a JPEG from its Start Of Frame header,
+	without decoding it. Returns None if no header is found.
+
+	Args:
+		data: The file contents, as bytes or a uint8 numpy array.
+	"""
+	view = memoryview(data)
+	for marker, start, end in jpeg_segments(view):
+		if marker in JPEG_SOF_MARKERS:
+			if start + 5 > end:
+				return None
+			height, width = struct.unpack(">HH", view[start + 1:start + 5])
+			return width, height
+	return None
+
+def decode_for_preview(data, max_size: int):
+	"""
+	Decode image data to a BGR array, at the smallest libjpeg DCT scale that
+	still keeps the longest side at or above max_size. Formats that cannot be
+	scaled while decoding, and JPEGs without a readable header, are fully decoded.
+
+	Args:
+		data (np.ndarray): The file contents as a uint8 array.
+		max_size (int): Target length of the longest side.
+	"""
+	size = read_jpeg_size(data)
+	if size is not None:
+		longest = max(size)
+		for factor, flag in REDUCED_DECODE_FLAGS:
+			if longest // factor >= max_size:
+				img = cv2.imdecode(data, flag)
+				if img is not None:
+					return img
+				break
+	return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+def render_preview(image_path, max_size: int, quality: int) -> bytes:
+	"""
+	Decode, resize and encode an image to preview JPEG bytes.
+	Kept free of app state, so it can run in a worker process.
+	"""
+	data = np.fromfile(str(image_path), dtype=np.uint8)
+	# Large JPEGs are scaled down by libjpeg while decoding.
+	img = decode_for_preview(data, max_size)
+	if img is None:
+		raise ValueError("Image could not be loaded by OpenCV.")
+
+	height, width = img.shape[:2]
+
+	scale = min(1.0, max_size / max(height, width))
+	if scale < 1.0:
+		img = cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+	success, jpeg_buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+	if not success:
+		raise ValueError("Failed to encode image.")
+	return jpeg_buf.tobytes()
+
+def read_embedded_thumbnail(view):
+	"""
+	Find the JPEG thumbnail stored in IFD1 of a JPEG's EXIF block or of a TIFF file.
+
+	Returns:
+		tuple: (thumbnail memoryview, orientation) or (None, orientation)
+	"""
+	if is_jpeg(view):
+		segment = find_jpeg_app_segment(view, 0xE1, b"Exif\x00\x00")
+		if segment is None:
+			return None, 1
+		reader = TiffReader(view, segment[0], segment[1])
+	else:
+		reader = TiffReader(view)
+
+	ifds = reader.ifds(limit=2)
+	orientation = reader.integer(ifds[0][TAG_ORIENTATION]) if ifds and TAG_ORIENTATION in ifds[0] else 1
+	if len(ifds) < 2 or TAG_THUMBNAIL_OFFSET not in ifds[1] or TAG_THUMBNAIL_LENGTH not in ifds[1]:
+		return None, orientation
+	start = reader.base + reader.integer(ifds[1][TAG_THUMBNAIL_OFFSET])
+	end = start + reader.integer(ifds[1][TAG_THUMBNAIL_LENGTH])
+	if end > reader.end or not is_jpeg(view[start:end]):
+		return None, orientation
+	return view[start:end], orientation
+
+def quick_preview(image_path, quality: int = 40):
+	"""
+	Make a first, low quality preview in milliseconds: the embedded EXIF thumbnail
+	if there is one, otherwise a 1/8 scale JPEG decode. Returns JPEG bytes, or None
+	if the file has neither (e.g. PNG), in which case only the full preview is shown.
+	"""
+	try:
+		with open(image_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+			view = memoryview(mapped)
+			try:
+				try:
+					thumbnail, orientation = read_embedded_thumbnail(view)
+				except (ValueError, struct.error):
+					thumbnail, orientation = None, 1
+
+				if thumbnail is not None:
+					if orientation not in ORIENTATION_TRANSFORMS:
+						return bytes(thumbnail)
+					img = cv2.imdecode(np.frombuffer(thumbnail, dtype=np.uint8), cv2.IMREAD_COLOR)
+					if img is None:
+						return None
+					img = ORIENTATION_TRANSFORMS[orientation](img)
+				elif is_jpeg(view):
+					img = cv2.imdecode(np.frombuffer(view, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_8)
+					if img is None:
+						return None
+				else:
+					return None
+			finally:
+				thumbnail = None
+				view.release()
+		success, jpeg_buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+		return jpeg_buf.tobytes() if success else None
+	except (OSError, ValueError, cv2.error):
+		return None
+
+def downgrade_preview(jpeg_bytes: bytes, quality: int) -> bytes:
+	"""
+	Re-encode a preview at half size and lower quality, for the cheaper cache tier.
+	The half size comes straight from libjpeg's 1/2 scale decode.
+	"""
+	img = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+	if img is None:
+		raise ValueError("Could not decode cached preview.")
+	success, jpeg_buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+	if not success:
+		raise ValueError("Failed to encode image.")
+	return jpeg_buf.tobytes()
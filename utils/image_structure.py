@@ -0,0 +1,130 @@
+# utils/image_structure.py
+import struct
+
+# Byte size of each TIFF field type.
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+
+# TIFF tags used by the app.
+TAG_IMAGE_DESCRIPTION = 0x010E
+TAG_ORIENTATION = 0x0112
+TAG_XMP = 0x02BC
+TAG_THUMBNAIL_OFFSET = 0x0201
+TAG_THUMBNAIL_LENGTH = 0x0202
+
+def jpeg_segments(view, strict=False):
+	"""
+	Yield (marker, payload_start, payload_end) for each JPEG header segment,
+	stopping at the start of the image data.
+
+	Args:
+		view (memoryview): The file contents.
+		strict (bool): Raise ValueError if the header is broken or truncated, instead of
+			stopping early: a segment runs past the end of the file, or the header ends
+			before the start of the image data.
+	"""
+	if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+		if strict:
+			raise ValueError("Not a JPEG file.")
+		return
+	position = 2
+	while position + 4 <= len(view):
+		if view[position] != 0xFF:
+			if strict:
+				raise ValueError(f"No JPEG marker at byte {position}.")
+			return
+		marker = view[position + 1]
+		if marker == 0xFF:  # Fill byte
+			position += 1
+			continue
+		if marker == 0xD8 or 0xD0 <= marker <= 0xD7:  # Markers without a length
+			position += 2
+			continue
+		if marker in (0xD9, 0xDA):  # End of image / start of scan
+			return
+		length = struct.unpack(">H", view[position + 2:position + 4])[0]
+		if strict and (length < 2 or position + 2 + length > len(view)):
+			raise ValueError(f"JPEG segment at byte {position} runs past the end of the file.")
+		end = min(position + 2 + length, len(view))
+		yield marker, position + 4, end
+		position += 2 + length
+	if strict:
+		raise ValueError("The JPEG header ends before the image data.")
+
+def find_jpeg_app_segment(view, marker, prefix: bytes):
+	"""Return (start, end) of the payload after prefix in the first matching APPn segment, or None."""
+	for segment_marker, start, end in jpeg_segments(view):
+		if segment_marker == marker and bytes(view[start:start + len(prefix)]) == prefix:
+			return start + len(prefix), end
+	return None
+
+class TiffReader:
+	"""
+	Minimal reader for TIFF structures: TIFF files, and the EXIF block inside JPEG APP1.
+	Offsets in the structure are relative to `base`, the position of the byte order mark.
+	"""
+
+	def __init__(self, view, base=0, end=None):
+		self.view = view
+		self.base = base
+		self.end = len(view) if end is None else end
+		byte_order = bytes(view[base:base + 2])
+		if byte_order == b"II":
+			self.order = "<"
+		elif byte_order == b"MM":
+			self.order = ">"
+		else:
+			raise ValueError("Not a TIFF structure.")
+		magic, self.first_ifd = struct.unpack(self.order + "HI", view[base + 2:base + 8])
+		if magic != 42:
+			raise ValueError("Not a TIFF structure.")
+
+	def ifd(self, offset):
+		"""
+		Read the IFD at a structure offset.
+
+		Returns:
+			tuple: ({tag: (type, count, value_position)}, next_ifd_offset)
+		"""
+		position = self.base + offset
+		if offset <= 0 or position + 2 > self.end:
+			raise ValueError("IFD offset out of range.")
+		count = struct.unpack(self.order + "H", self.view[position:position + 2])[0]
+		entries = {}
+		for index in range(count):
+			entry = position + 2 + index * 12
+			if entry + 12 > self.end:
+				raise ValueError("IFD entry out of range.")
+			tag, field_type, value_count = struct.unpack(self.order + "HHI", self.view[entry:entry + 8])
+			size = TIFF_TYPE_SIZES.get(field_type, 1) * value_count
+			if size <= 4:
+				value_position = entry + 8
+			else:
+				value_position = self.base + struct.unpack(self.order + "I", self.view[entry + 8:entry + 12])[0]
+			entries[tag] = (field_type, value_count, value_position)
+		next_position = position + 2 + count * 12
+		next_offset = struct.unpack(self.order + "I", self.view[next_position:next_position + 4])[0] if next_position + 4 <= self.end else 0
+		return entries, next_offset
+
+	def ifds(self, limit=4):
+		"""Return the entries of the first IFDs in the chain (IFD0, IFD1, ...)."""
+		result = []
+		offset = self.first_ifd
+		while offset and len(result) < limit:
+			entries, offset = self.ifd(offset)
+			result.append(entries)
+		return result
+
+	def raw(self, entry):
+		"""Return the memoryview holding an entry's value."""
+		field_type, count, position = entry
+		size = TIFF_TYPE_SIZES.get(field_type, 1) * count
+		if position + size > self.end:
+			raise ValueError("Tag value out of range.")
+		return self.view[position:position + size]
+
+	def integer(self, entry) -> int:
+		"""Return the first value of a SHORT or LONG entry."""
+		field_type, count, position = entry
+		if field_type == 3:
+			return struct.unpack(self.order + "H", self.view[position:position + 2])[0]
+		return struct.unpack(self.order + "I", self.view[position:position + 4])[0]
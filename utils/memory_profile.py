@@ -0,0 +1,158 @@
+# utils/memory_profile.py
+"""
+Development memory profiling with tracemalloc.
+
+Snapshots are taken periodically and compared with the previous one, by
+module and by source line, so growth can be pinned on the code that
+allocated it. Every sample also records what the caller says the app is
+holding, like the image cache's entries and bytes, to tell the cache
+filling up to its budget from a leak. The session is written to a JSON
+report, with the growth since the first snapshot.
+
+tracemalloc slows everything down, only enable it to investigate.
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+# Allocations made by tracemalloc, the profiler's own samples and the import machinery are noise here.
+SNAPSHOT_FILTERS = (
+	tracemalloc.Filter(False, tracemalloc.__file__),
+	tracemalloc.Filter(False, __file__),
+	tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+	tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+	tracemalloc.Filter(False, "<unknown>"),
+)
+
+def module_name(filename: str) -> str:
+	"""The dotted module name of a source file, from the sys.path entry it is under."""
+	path = os.path.abspath(filename)
+	for root in sorted((os.path.abspath(entry or os.curdir) for entry in sys.path), key=len, reverse=True):
+		if path.startswith(root + os.sep):
+			relative = os.path.splitext(path[len(root) + 1:])[0]
+			parts = relative.split(os.sep)
+			if parts[-1] == "__init__":
+				parts.pop()
+			return ".".join(parts)
+	return filename
+
+def resident_bytes():
+	"""Resident memory of the process, None without psutil."""
+	try:
+		import psutil
+	except ImportError:
+		return None
+	return psutil.Process().memory_info().rss
+
+class MemoryProfiler:
+	"""
+	Takes tracemalloc snapshots and reports what grew between them.
+
+	Args:
+		frames (int): Stack frames kept per allocation.
+		top (int): Modules and lines kept per comparison.
+	"""
+
+	def __init__(self, frames: int = 1, top: int = 15):
+		self.frames = frames
+		self.top = top
+		self.session = datetime.now()
+		self.started = None
+		self.first = None
+		self.previous = None
+		self.samples = []
+
+	def start(self):
+		if not tracemalloc.is_tracing():
+			tracemalloc.start(self.frames)
+		self.started = time.perf_counter()
+		self.first = self.previous = self._snapshot()
+
+	def stop(self):
+		tracemalloc.stop()
+
+	@staticmethod
+	def _snapshot():
+		return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+	def _by_module(self, snapshot, baseline) -> list:
+		modules = {}
+		for stat in snapshot.compare_to(baseline, "filename"):
+			name = module_name(stat.traceback[0].filename)
+			size, count, total = modules.get(name, (0, 0, 0))
+			modules[name] = (size + stat.size_diff, count + stat.count_diff, total + stat.size)
+		ranked = sorted(modules.items(), key=lambda item: abs(item[1][0]), reverse=True)[:self.top]
+		return [{"module": name, "size_diff": size, "count_diff": count, "size": total} for name, (size, count, total) in ranked]
+
+	def _by_line(self, snapshot, baseline) -> list:
+		lines = []
+		for stat in snapshot.compare_to(baseline, "lineno")[:self.top]:
+			frame = stat.traceback[0]
+			lines.append({
+				"line": f"{module_name(frame.filename)}:{frame.lineno}",
+				"size_diff": stat.size_diff,
+				"count_diff": stat.count_diff,
+				"size": stat.size,
+			})
+		return lines
+
+	def sample(self, label: str = "", context: dict = None) -> dict:
+		"""
+		Take a snapshot and compare it with the previous one.
+
+		Args:
+			label (str): What the app was doing, e.g. "image 350".
+			context (dict): What the app is holding, e.g. cache entries and bytes.
+		"""
+		if self.previous is None:
+			self.start()
+		snapshot = self._snapshot()
+		current, peak = tracemalloc.get_traced_memory()
+		sample = {
+			"time": round(time.perf_counter() - self.started, 3),
+			"label": label,
+			"traced_bytes": current,
+			"traced_peak_bytes": peak,
+			"rss_bytes": resident_bytes(),
+			"context": context or {},
+			"growth_by_module": self._by_module(snapshot, self.previous),
+			"growth_by_line": self._by_line(snapshot, self.previous),
+		}
+		self.previous = snapshot
+		self.samples.append(sample)
+		return sample
+
+	def report(self) -> dict:
+		"""The samples so far, and what grew since the first snapshot."""
+		snapshot = self._snapshot()
+		return {
+			"frames": self.frames,
+			"samples": self.samples,
+			"since_start_by_module": self._by_module(snapshot, self.first),
+			"since_start_by_line": self._by_line(snapshot, self.first),
+		}
+
+	def save(self, folder) -> Path:
+		"""Write the report to a new JSON file in folder, named after the session start."""
+		folder = Path(folder)
+		folder.mkdir(parents=True, exist_ok=True)
+		path = folder / f"memory-{self.session:%Y%m%d-%H%M%S}.json"
+		with open(path, "w", encoding="utf-8") as report:
+			json.dump(self.report(), report, indent=1)
+		return path
+
+def format_sample(sample: dict, modules: int = 5) -> str:
+	"""A short summary of a sample, for the console."""
+	mb = 1024 * 1024
+	context = ", ".join(f"{key} {value}" for key, value in sample["context"].items())
+	growth = ", ".join(
+		f"{entry['module']} {entry['size_diff'] / mb:+.1f} MB"
+		for entry in sample["growth_by_module"][:modules] if entry["size_diff"])
+	rss = f", RSS {sample['rss_bytes'] / mb:.0f} MB" if sample["rss_bytes"] else ""
+	return (f"Memory [{sample['label']}]: traced {sample['traced_bytes'] / mb:.1f} MB (peak {sample['traced_peak_bytes'] / mb:.1f} MB){rss}"
+		+ (f" | {context}" if context else "")
+		+ (f" | grew: {growth}" if growth else ""))
@@ -0,0 +1,184 @@
+# utils/metadata_index.py
+import os
+import threading
+from pathlib import Path
+
+XMP_DESCRIPTION_TAG = "XMP-dc:Description"
+EXIF_DESCRIPTION_TAG = "EXIF:ImageDescription"
+
+# Formats we read and write descriptions for.
+SUPPORTED_EXIF = {".jpg", ".jpeg", ".tiff", ".tif"}
+SUPPORTED_XMP = {".jpg", ".jpeg", ".tiff", ".tif", ".png"}
+
+def description_value(metadata: dict, key: str):
+	"""
+	Convert a tag from ExifTool's JSON output to a description string.
+	Returns None if the tag is not present in the file.
+	"""
+	value = metadata.get(key)
+	if value is None:
+		return None
+	return str(value)
+
+def file_signature(path):
+	"""
+	Return (mtime_ns, size) for a file, used to detect changes since it was indexed.
+	"""
+	stat = os.stat(path)
+	return (stat.st_mtime_ns, stat.st_size)
+
+class MetadataIndex:
+	"""
+	In-memory index of XMP/EXIF descriptions for the open folder.
+
+	Entries are keyed by path and only trusted while the file's mtime and size
+	match the values recorded when the descriptions were read.
+	"""
+
+	def __init__(self):
+		self.entries = {} # Path -> {"signature": (mtime_ns, size), "xmp": str|None, "exif": str|None}
+		self.lock = threading.Lock() # Filled from worker threads, read from the event loop.
+
+	def __len__(self):
+		return len(self.entries)
+
+	def get(self, path):
+		"""
+		Return the indexed entry for a file, or None if it is missing or the file has changed.
+		"""
+		path = Path(path)
+		with self.lock:
+			entry = self.entries.get(path)
+		if entry is None:
+			return None
+		try:
+			if file_signature(path) != entry["signature"]:
+				return None
+		except OSError:
+			return None
+		return entry
+
+	def put(self, path, xmp, exif, signature=None):
+		"""
+		Store descriptions for a file. Pass the signature taken before the read,
+		so a file changed while ExifTool was reading it is picked up again.
+		"""
+		path = Path(path)
+		if signature is None:
+			signature = file_signature(path)
+		with self.lock:
+			self.entries[path] = {"signature": signature, "xmp": xmp, "exif": exif}
+
+	def discard(self, paths):
+		"""Remove entries for the given paths."""
+		with self.lock:
+			for path in paths:
+				self.entries.pop(Path(path), None)
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+
+	def stale_signatures(self, paths) -> dict:
+		"""
+		Return {path: signature} for the paths that need to be (re)read.
+		Files that can no longer be accessed are left out.
+		"""
+		signatures = {}
+		for path in paths:
+			path = Path(path)
+			try:
+				signature = file_signature(path)
+			except OSError:
+				continue
+			with self.lock:
+				entry = self.entries.get(path)
+			if entry is None or entry["signature"] != signature:
+				signatures[path] = signature
+		return signatures
+
+	def unindexed(self, paths) -> list:
+		"""Return the paths without an entry."""
+		with self.lock:
+			return [Path(path) for path in paths if Path(path) not in self.entries]
+
+	def changed_paths(self, paths, include_unindexed: bool = False) -> list:
+		"""
+		Return the paths whose file changed or disappeared since it was indexed.
+		Paths without an entry have nothing to compare with, and are only
+		included if include_unindexed is set.
+		"""
+		changed = []
+		for path in paths:
+			path = Path(path)
+			with self.lock:
+				entry = self.entries.get(path)
+			if entry is None:
+				if include_unindexed:
+					changed.append(path)
+				continue
+			try:
+				signature = file_signature(path)
+			except OSError:
+				signature = None
+			if signature != entry["signature"]:
+				changed.append(path)
+		return changed
+
+	def seed(self, entries: dict):
+		"""
+		Add entries read in an earlier session, e.g. from the catalog, for paths not indexed yet.
+		They are checked against the file's signature like any other entry.
+
+		Args:
+			entries (dict): Path -> (signature, xmp, exif).
+		"""
+		with self.lock:
+			for path, (signature, xmp, exif) in entries.items():
+				self.entries.setdefault(Path(path), {"signature": tuple(signature), "xmp": xmp, "exif": exif})
+
+	def add_exiftool_records(self, records, signatures: dict) -> list:
+		"""
+		Index the JSON records of a batched ExifTool read.
+
+		Args:
+			records (list): ExifTool "-j" output for the batch.
+			signatures (dict): Path -> signature, taken before the batch was read.
+
+		Returns:
+			list: (path, signature, xmp, exif) for each file indexed.
+		"""
+		indexed = []
+		for record in records:
+			path = Path(record.get("SourceFile", ""))
+			signature = signatures.get(path)
+			if signature is None:
+				continue
+			extension = path.suffix.lower()
+			xmp = description_value(record, "Description") if extension in SUPPORTED_XMP else None
+			exif = description_value(record, "ImageDescription") if extension in SUPPORTED_EXIF else None
+			self.put(path, xmp, exif, signature)
+			indexed.append((path, signature, xmp, exif))
+		return indexed
+
+	def add_native_records(self, values: dict, signatures: dict) -> list:
+		"""
+		Index descriptions read without ExifTool, see metadata.native_reader.
+
+		Args:
+			values (dict): Path -> {"xmp": str|None, "exif": str|None}.
+			signatures (dict): Path -> signature, taken before the files were read.
+
+		Returns:
+			list: (path, signature, xmp, exif) for each file indexed.
+		"""
+		indexed = []
+		for path, record in values.items():
+			path = Path(path)
+			signature = signatures.get(path)
+			if signature is None:
+				continue
+			xmp, exif = record.get("xmp"), record.get("exif")
+			self.put(path, xmp, exif, signature)
+			indexed.append((path, signature, xmp, exif))
+		return indexed
@@ -0,0 +1,124 @@
+# utils/metrics.py
+"""
+Latency histograms and the Prometheus text format, for the /metrics route.
+
+Gauges and counters are read from the app state when the route is scraped,
+see ui/metrics.py. Only latencies, which must be recorded as they happen,
+are kept here.
+"""
+import bisect
+import threading
+
+# Upper bounds in seconds, from a cached preview to a slow save on a network drive.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+	"""Counts of observed values per bucket, with their sum, like a Prometheus histogram."""
+
+	def __init__(self, buckets=LATENCY_BUCKETS):
+		self.buckets = tuple(buckets)
+		self.counts = [0] * (len(self.buckets) + 1) # The last one is +Inf.
+		self.sum = 0.0
+		self.count = 0
+		self.lock = threading.Lock() # ExifTool latencies are observed from reader threads.
+
+	def observe(self, value: float):
+		index = bisect.bisect_left(self.buckets, value)
+		with self.lock:
+			self.counts[index] += 1
+			self.sum += value
+			self.count += 1
+
+	def snapshot(self):
+		"""
+		Returns:
+			tuple: ([(upper bound, cumulative count)], sum, count), the last bound is "+Inf".
+		"""
+		with self.lock:
+			counts = list(self.counts)
+			total, count = self.sum, self.count
+		cumulative = []
+		running = 0
+		for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+			running += bucket_count
+			cumulative.append((bound, running))
+		return cumulative, total, count
+
+class HistogramFamily:
+	"""Histograms of one metric, one per label value."""
+
+	def __init__(self, name: str, help: str, label: str = None, buckets=LATENCY_BUCKETS):
+		self.name = name
+		self.help = help
+		self.label = label
+		self.buckets = buckets
+		self.children = {}
+		self.lock = threading.Lock()
+
+	def labels(self, value: str = "") -> Histogram:
+		histogram = self.children.get(value)
+		if histogram is None:
+			with self.lock:
+				histogram = self.children.setdefault(value, Histogram(self.buckets))
+		return histogram
+
+	def observe(self, value: float):
+		self.labels().observe(value)
+
+EXIFTOOL_SECONDS = HistogramFamily(
+	"exiftool_request_seconds", "Time from sending an ExifTool command to its response, per process lane.", label="lane")
+NAVIGATION_SECONDS = HistogramFamily(
+	"navigation_seconds", "Time from a Previous/Next press to the image and its metadata shown.")
+
+def _labels(labels: dict) -> str:
+	if not labels:
+		return ""
+	escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+	return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+def _number(value) -> str:
+	if isinstance(value, bool):
+		return "1" if value else "0"
+	if isinstance(value, float):
+		return repr(value) if value == value else "NaN"
+	return str(value)
+
+class MetricsWriter:
+	"""Builds a page in the Prometheus text exposition format."""
+
+	def __init__(self, prefix: str = "imagecataloger_"):
+		self.prefix = prefix
+		self.lines = []
+
+	def _header(self, name: str, help: str, kind: str) -> str:
+		name = self.prefix + name
+		self.lines.append(f"# HELP {name} {help}")
+		self.lines.append(f"# TYPE {name} {kind}")
+		return name
+
+	def gauge(self, name: str, help: str, samples):
+		"""samples: a number, or a list of (labels dict, number)."""
+		self._samples(self._header(name, help, "gauge"), samples)
+
+	def counter(self, name: str, help: str, samples):
+		"""Like gauge(), the name should end in _total."""
+		self._samples(self._header(name, help, "counter"), samples)
+
+	def _samples(self, name: str, samples):
+		if not isinstance(samples, list):
+			samples = [({}, samples)]
+		for labels, value in samples:
+			self.lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+	def histogram(self, family: HistogramFamily):
+		name = self._header(family.name, family.help, "histogram")
+		for label_value, histogram in sorted(family.children.items()):
+			labels = {family.label: label_value} if family.label else {}
+			buckets, total, count = histogram.snapshot()
+			for bound, cumulative in buckets:
+				self.lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+			self.lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+			self.lines.append(f"{name}_count{_labels(labels)} {count}")
+
+	def text(self) -> str:
+		return "\n".join(self.lines) + "\n"
@@ -0,0 +1,264 @@
+# utils/prefetch.py
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+def calculate_cache_indices(current_index: int, total_images: int, window_size: int = 25) -> set:
+	"""
+	Calculate indices for caching, handling wrap-around logic clearly.
+
+	Args:
+		current_index (int): The current index in the navigation.
+		total_images (int): The total number of images in the current folder.
+		window_size (int): Number of images to cache before and after current.
+
+	Returns:
+		set: A set of calculated indices for caching.
+	"""
+	return set(calculate_cache_distances(current_index, total_images, window_size, window_size))
+
+def calculate_cache_distances(current_index: int, total_images: int, behind: int = 25, ahead: int = 25) -> dict:
+	"""
+	Calculate the indices to cache and how far each is from the current index,
+	handling wrap-around. An index reachable both ways keeps the shorter distance.
+
+	Args:
+		behind (int): Number of images to cache before current.
+		ahead (int): Number of images to cache after current.
+
+	Returns:
+		dict: index -> distance in images.
+	"""
+	distances = {}
+	for offset in sorted(range(-behind, ahead + 1), key=abs):
+		distances.setdefault((current_index + offset) % total_images, abs(offset))
+	return distances
+
+class AdaptiveWindow:
+	"""
+	Sizes the prefetch window from how the user is navigating.
+
+	The window leans towards the direction of travel, grows when the user moves
+	quickly (e.g. holding the key down) and shrinks to its minimum while the user
+	stays on one image editing its description. Staying idle shrinks it too, but
+	only navigation and saves ask for a new window: a timer must check idle()
+	to notice it. Counters record the decisions and how often the displayed
+	image was already cached.
+	"""
+
+	def __init__(self, base: int = 25, minimum: int = 4, maximum: int = 60, idle_seconds: float = 30.0, clock=time.monotonic):
+		"""
+		Args:
+			base (int): Images on each side when there is no navigation history.
+			minimum (int): Total window while editing or idle.
+			maximum (int): Largest window on the leading side.
+			idle_seconds (float): Time on one image after which the window shrinks.
+		"""
+		self.base = base
+		self.minimum = minimum
+		self.maximum = maximum
+		self.idle_seconds = idle_seconds
+		self.clock = clock
+		self.moves = deque(maxlen=12) # (time, step) of recent moves
+		self.last_edit = None
+		self.edited = None # Image of the last edit
+
+		# Statistics
+		self.hits = 0 # Displayed images that were already cached.
+		self.misses = 0
+		self.fast_windows = 0 # Windows grown for fast navigation.
+		self.leaning_windows = 0 # Windows leaning in the direction of travel.
+		self.shrunk_windows = 0 # Windows shrunk while editing or idle.
+		self.last_window = (base, base)
+
+	def reset(self):
+		"""Forget the navigation history, e.g. when a new folder is opened."""
+		self.moves.clear()
+		self.last_edit = None
+		self.edited = None
+
+	def record_move(self, step: int):
+		"""Record a navigation step, +1 for next and -1 for previous."""
+		self.moves.append((self.clock(), step))
+
+	def record_edit(self, image=None):
+		"""Record that the user is editing an image, only counted while the window is centred on it."""
+		self.last_edit = self.clock()
+		self.edited = image
+
+	def idle(self) -> bool:
+		"""Whether the user has stayed on one image for longer than idle_seconds."""
+		return bool(self.moves) and self.clock() - self.moves[-1][0] > self.idle_seconds
+
+	def shrunk(self) -> tuple:
+		"""The window while editing or idle."""
+		half = max(1, self.minimum // 2)
+		return (half, half)
+
+	def record_display(self, hit: bool):
+		"""Record whether the image shown after a move was already cached."""
+		if hit:
+			self.hits += 1
+		else:
+			self.misses += 1
+
+	def window(self, center=None) -> tuple:
+		"""
+		Args:
+			center: The image the window is centred on. An edit of another image, e.g. one
+				saved after the user moved on, does not shrink the window.
+
+		Returns:
+			tuple: (behind, ahead) number of images to prefetch.
+		"""
+		now = self.clock()
+		last_move = self.moves[-1][0] if self.moves else None
+		editing = (self.last_edit is not None
+			and (center is None or self.edited is None or self.edited == center)
+			and (last_move is None or self.last_edit >= last_move))
+		if editing or self.idle():
+			self.shrunk_windows += 1
+			self.last_window = self.shrunk()
+			return self.last_window
+
+		recent = [(moved_at, step) for moved_at, step in self.moves if now - moved_at <= 5.0]
+		if len(recent) < 2:
+			self.last_window = (self.base, self.base)
+			return self.last_window
+
+		# Moves per second, and how consistently they go one way (-1 to 1).
+		rate = (len(recent) - 1) / max(recent[-1][0] - recent[0][0], 0.05)
+		direction = sum(step for _, step in recent) / len(recent)
+
+		total = 2 * self.base
+		if rate > 2.0:
+			total = min(2 * self.maximum, int(total * min(rate / 2.0, 2.4)))
+			self.fast_windows += 1
+
+		# Give up to 85% of the window to the direction of travel.
+		lead = 0.5 + 0.35 * abs(direction)
+		if abs(direction) >= 0.5:
+			self.leaning_windows += 1
+		leading = min(self.maximum, round(total * lead))
+		trailing = max(2, total - leading)
+		self.last_window = (trailing, leading) if direction >= 0 else (leading, trailing)
+		return self.last_window
+
+	def stats(self) -> dict:
+		displays = self.hits + self.misses
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"hit_rate": self.hits / displays if displays else 0.0,
+			"fast_windows": self.fast_windows,
+			"leaning_windows": self.leaning_windows,
+			"shrunk_windows": self.shrunk_windows,
+			"behind": self.last_window[0],
+			"ahead": self.last_window[1],
+		}
+
+class PrefetchScheduler:
+	"""
+	Queue of images to prefetch, served nearest to the cursor first.
+
+	When the cursor moves, reschedule() drops queued images that left the window
+	and re-ranks the rest by their new distance, so stale work is never started.
+	The queue is bounded: once full, a nearer image pushes out the farthest one
+	instead of blocking navigation. Keeps the put/get/task_done/qsize interface
+	of the asyncio.Queue it replaces.
+	"""
+
+	def __init__(self, maxsize: int = 64):
+		self.maxsize = maxsize
+		self.heap = [] # (distance, sequence, item), entries are lazily removed.
+		self.queued = {} # item -> current distance
+		self.in_flight = set() # Items handed out by get() and not finished yet.
+		self.sequence = itertools.count()
+		self.wakeup = asyncio.Event()
+		self.stopped = False
+
+		# Statistics
+		self.dropped = 0 # Queued items dropped because they left the window or were pushed out.
+		self.cancelled = 0 # In-flight items that left the window.
+
+	def qsize(self) -> int:
+		return len(self.queued)
+
+	def _push(self, item, distance):
+		self.queued[item] = distance
+		heapq.heappush(self.heap, (distance, next(self.sequence), item))
+		self.wakeup.set()
+
+	def _drop_farthest(self):
+		"""Drop the farthest queued item, returns its distance."""
+		item = max(self.queued, key=self.queued.get)
+		self.dropped += 1
+		return self.queued.pop(item)
+
+	async def put(self, item, distance: int = 0):
+		"""
+		Queue an item, or update its distance if already queued. Items being worked
+		on are not queued again. None stops the consumer.
+		"""
+		if item is None:
+			self.stopped = True
+			self.wakeup.set()
+			return
+		if item in self.in_flight:
+			return
+		if item in self.queued:
+			if self.queued[item] != distance:
+				self._push(item, distance)
+			return
+		if len(self.queued) >= self.maxsize:
+			if max(self.queued.values()) <= distance:
+				self.dropped += 1
+				return
+			self._drop_farthest()
+		self._push(item, distance)
+
+	async def get(self):
+		"""Return the queued item nearest to the cursor, waiting for one if needed."""
+		while True:
+			while self.heap:
+				distance, _, item = heapq.heappop(self.heap)
+				if self.queued.get(item) != distance:
+					continue  # Dropped or re-ranked since it was pushed.
+				del self.queued[item]
+				self.in_flight.add(item)
+				return item
+			if self.stopped:
+				return None
+			self.wakeup.clear()
+			await self.wakeup.wait()
+
+	def task_done(self, item=None):
+		"""Mark an item returned by get() as finished."""
+		self.in_flight.discard(item)
+
+	def reschedule(self, distances: dict) -> list:
+		"""
+		Re-rank the queue for a new cursor position.
+
+		Args:
+			distances (dict): item -> distance for every item in the new window.
+
+		Returns:
+			list: In-flight items that are outside the new window, for the caller to cancel.
+		"""
+		for item, distance in list(self.queued.items()):
+			new_distance = distances.get(item)
+			if new_distance is None:
+				del self.queued[item]
+				self.dropped += 1
+			elif new_distance != distance:
+				self._push(item, new_distance)
+		# Compact once most heap entries are stale.
+		if len(self.heap) > 4 * max(len(self.queued), 16):
+			self.heap = [(distance, next(self.sequence), item) for item, distance in self.queued.items()]
+			heapq.heapify(self.heap)
+		stale = [item for item in self.in_flight if item not in distances]
+		self.cancelled += len(stale)
+		return stale
@@ -0,0 +1,188 @@
+# utils/preview_engine.py
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from multiprocessing.context import SpawnContext, SpawnProcess
+
+class PreviewWorker(SpawnProcess):
+	"""
+	A preview worker process, named "PreviewWorker-N" after its class. Spawned processes
+	import the app's main module again, the name is set before, so main.py can skip the app's setup.
+	"""
+
+class PreviewWorkerContext(SpawnContext):
+	Process = PreviewWorker
+
+def is_preview_worker() -> bool:
+	"""Whether this process is a preview worker, rather than one of the app's own processes."""
+	return multiprocessing.current_process().name.startswith(PreviewWorker.__name__)
+
+def render_to_shared_memory(image_path, max_size: int, quality: int, slot_name: str, slot_size: int):
+	"""
+	Worker process entry point: render a preview and write it into a shared memory
+	slot owned by the parent process.
+
+	Returns:
+		int: The preview's length in the slot, or the bytes themselves if they do not fit.
+	"""
+	from utils.image_decode import render_preview
+	jpeg_bytes = render_preview(image_path, max_size, quality)
+	if len(jpeg_bytes) > slot_size:
+		return jpeg_bytes  # Rare, sent back pickled instead.
+
+	# Spawned workers share the parent's resource tracker, so attaching here doesn't change who unlinks the slot.
+	slot = shared_memory.SharedMemory(name=slot_name)
+	try:
+		slot.buf[:len(jpeg_bytes)] = jpeg_bytes
+	finally:
+		slot.close()
+	return len(jpeg_bytes)
+
+class PreviewEngine:
+	"""
+	Generates preview JPEG bytes (decode, resize, encode) off the event loop.
+
+	By default previews are made on the cache thread pool. With processes > 0
+	they are made on a pool of worker processes, so the work is not limited by
+	the GIL. Workers hand the encoded bytes back through shared memory slots
+	that the parent allocates once and reuses, instead of pickling them.
+	"""
+
+	def __init__(self, thread_executor, max_size: int, quality: int, processes: int = 0, slot_mb: int = 8):
+		self.thread_executor = thread_executor
+		self.max_size = max_size
+		self.quality = quality
+		self.processes = processes
+		self.slot_size = slot_mb * 1024 * 1024
+		self.process_executor = None
+		self.slots = [] # Shared memory blocks, two per worker process.
+		self.free_slots = None # asyncio.Queue of slot indexes, created on the event loop.
+
+		# Utilisation, for the /metrics route.
+		self.lock = threading.Lock()
+		self.active = 0 # Previews submitted and not done yet, running or waiting for a worker.
+		self.running = 0 # Previews being made on a cache thread.
+		self.busy_seconds = 0.0 # Worker time spent making previews.
+		self.jobs = 0 # Previews made, or attempted.
+		self.last_change = time.perf_counter()
+
+	@property
+	def workers(self) -> int:
+		"""Number of previews that can be made at the same time."""
+		if self.processes > 0:
+			return self.processes
+		return self.thread_executor._max_workers
+
+	def _start_processes(self):
+		# Spawn, rather than fork a process that is running threads and an event loop.
+		self.process_executor = ProcessPoolExecutor(
+			max_workers=self.processes,
+			mp_context=PreviewWorkerContext())
+		self.slots = [shared_memory.SharedMemory(create=True, size=self.slot_size) for _ in range(self.processes * 2)]
+		self.free_slots = asyncio.Queue()
+		for index in range(len(self.slots)):
+			self.free_slots.put_nowait(index)
+
+	async def render(self, image_path) -> bytes:
+		"""Make the preview JPEG bytes for an image."""
+		# Imported here, cv2 and numpy are the slowest imports of the app. They are warmed up after startup.
+		from utils.image_decode import render_preview
+		loop = asyncio.get_running_loop()
+		if self.processes <= 0:
+			self._job_started()
+			future = self.thread_executor.submit(self._run_counted, render_preview, image_path, self.max_size, self.quality)
+			# Also called if the job is cancelled before a thread picks it up.
+			future.add_done_callback(lambda _: self._job_done())
+			return await asyncio.wrap_future(future)
+
+		if self.process_executor is None:
+			self._start_processes()
+		index = await self.free_slots.get()
+		slot = self.slots[index]
+		self._job_started()
+		future = loop.run_in_executor(
+			self.process_executor, render_to_shared_memory,
+			str(image_path), self.max_size, self.quality, slot.name, self.slot_size)
+		future.add_done_callback(lambda _: self._job_done())
+		try:
+			result = await asyncio.shield(future)
+		except asyncio.CancelledError:
+			# The worker may still be writing into the slot, only reuse it once it is done.
+			future.add_done_callback(lambda _: self.free_slots.put_nowait(index))
+			raise
+		except Exception:
+			self.free_slots.put_nowait(index)
+			raise
+		try:
+			if isinstance(result, bytes):
+				return result
+			return bytes(slot.buf[:result])
+		finally:
+			self.free_slots.put_nowait(index)
+
+	def _account(self):
+		"""Add the worker time used since the last change. Caller holds the lock."""
+		now = time.perf_counter()
+		self.busy_seconds += (now - self.last_change) * self._busy()
+		self.last_change = now
+
+	def _busy(self) -> int:
+		"""Previews being made now. Caller holds the lock."""
+		if self.processes > 0:
+			return min(self.active, self.workers) # The worker processes only make previews.
+		return self.running
+
+	def _job_started(self):
+		"""Count a job when it is submitted, it waits until a worker is free."""
+		with self.lock:
+			self._account()
+			self.active += 1
+
+	def _job_done(self):
+		"""Count a job once it is finished, failed or cancelled."""
+		with self.lock:
+			self._account()
+			self.active -= 1
+			self.jobs += 1
+
+	def _run_counted(self, func, *args):
+		"""Run a job on a cache thread, counted as busy while it runs, even if its caller was cancelled."""
+		with self.lock:
+			self._account()
+			self.running += 1
+		try:
+			return func(*args)
+		finally:
+			with self.lock:
+				self._account()
+				self.running -= 1
+
+	def utilisation(self) -> dict:
+		"""Workers busy and waiting jobs now, and the totals since startup."""
+		with self.lock:
+			self._account()
+			busy = self._busy()
+			return {
+				"workers": self.workers,
+				"busy": busy,
+				"waiting": self.active - busy,
+				"busy_seconds": self.busy_seconds,
+				"jobs": self.jobs,
+			}
+
+	def shutdown(self):
+		"""Stop the worker processes and release the shared memory."""
+		if self.process_executor is not None:
+			self.process_executor.shutdown(wait=False, cancel_futures=True)
+			self.process_executor = None
+		for slot in self.slots:
+			try:
+				slot.close()
+				slot.unlink()
+			except (OSError, BufferError):
+				pass
+		self.slots = []
+		self.thread_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,239 @@
+# utils/preview_store.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+class PreviewStore:
+	"""
+	Disk-backed store of encoded previews that survives restarts.
+
+	Preview files are content-addressed (named by the SHA-256 of their bytes)
+	and indexed in a small SQLite database by absolute source path and preview
+	parameters. Each row records the source file's mtime and size, so a file
+	edited outside the app is detected as stale. The least recently used
+	previews are evicted when the store grows past its disk quota.
+	"""
+
+	def __init__(self, folder, quota_bytes):
+		self.folder = Path(folder)
+		self.quota_bytes = quota_bytes
+		self.lock = threading.Lock() # Used from the cache executor threads.
+		self.db = None
+		self.bytes = 0 # Total size of the stored previews, kept up to date instead of summed on every put.
+		self.deleted_digests = set() # Previews of rows deleted since the last commit, their files are removed on commit.
+		try:
+			self.folder.mkdir(parents=True, exist_ok=True)
+			self.db = self._connect()
+			self.bytes = self.db.execute("SELECT COALESCE(SUM(bytes), 0) FROM previews").fetchone()[0]
+		except (OSError, sqlite3.Error) as e:
+			# Not fatal, previews are just generated every time.
+			print(f"Preview store disabled, could not open {self.folder}: {e}")
+
+	def _connect(self):
+		db_path = self.folder / "previews.sqlite3"
+		try:
+			db = sqlite3.connect(db_path, check_same_thread=False)
+			self._create_schema(db)
+		except sqlite3.DatabaseError:
+			# Corrupt index, the preview files are rebuilt as they are needed.
+			db_path.unlink(missing_ok=True)
+			db = sqlite3.connect(db_path, check_same_thread=False)
+			self._create_schema(db)
+		return db
+
+	@staticmethod
+	def _create_schema(db):
+		db.execute("PRAGMA journal_mode=WAL")
+		db.execute("PRAGMA synchronous=NORMAL")
+		db.execute("""
+			CREATE TABLE IF NOT EXISTS previews (
+				path TEXT NOT NULL,
+				params TEXT NOT NULL,
+				mtime_ns INTEGER NOT NULL,
+				size INTEGER NOT NULL,
+				digest TEXT NOT NULL,
+				bytes INTEGER NOT NULL,
+				last_access REAL NOT NULL,
+				PRIMARY KEY (path, params)
+			)""")
+		db.execute("CREATE INDEX IF NOT EXISTS previews_last_access ON previews (last_access)")
+		db.execute("CREATE INDEX IF NOT EXISTS previews_digest ON previews (digest)")
+		db.commit()
+
+	@staticmethod
+	def _key(path) -> str:
+		return os.path.normcase(os.path.abspath(path))
+
+	def _file(self, digest) -> Path:
+		return self.folder / digest[:2] / f"{digest}.jpg"
+
+	def _delete_rows(self, where, args):
+		"""Delete matching rows, their preview files go on _commit() if no other row refers to them. Caller holds the lock."""
+		rows = self.db.execute(f"SELECT digest, bytes FROM previews WHERE {where}", args).fetchall()
+		self.db.execute(f"DELETE FROM previews WHERE {where}", args)
+		self.bytes -= sum(size for _, size in rows)
+		self.deleted_digests.update(digest for digest, _ in rows)
+
+	def _unlink_unreferenced(self, digests):
+		"""Remove the preview files no row refers to. Caller holds the lock."""
+		for digest in digests:
+			if self.db.execute("SELECT 1 FROM previews WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+				self._file(digest).unlink(missing_ok=True)
+
+	def _commit(self):
+		"""Commit, then remove the preview files of the deleted rows. Caller holds the lock."""
+		self.db.commit()
+		digests, self.deleted_digests = self.deleted_digests, set()
+		self._unlink_unreferenced(digests)
+
+	def _rollback(self, written=()):
+		"""
+		Undo uncommitted changes after an error, and count the stored bytes again.
+		Preview files in written (digests) are removed unless a row still refers to them.
+		"""
+		try:
+			with self.lock:
+				self.db.rollback()
+				self.deleted_digests.clear()
+				self.bytes = self.db.execute("SELECT COALESCE(SUM(bytes), 0) FROM previews").fetchone()[0]
+				self._unlink_unreferenced(written)
+		except (OSError, sqlite3.Error) as e:
+			print(f"Error rolling back the preview store: {e}")
+
+	def get(self, path, params: str, signature):
+		"""
+		Return the stored preview bytes for a file, or None if there is no
+		preview or the file's (mtime_ns, size) signature has changed.
+		"""
+		if self.db is None:
+			return None
+		key = self._key(path)
+		try:
+			with self.lock:
+				row = self.db.execute(
+					"SELECT mtime_ns, size, digest FROM previews WHERE path = ? AND params = ?",
+					(key, params)).fetchone()
+				if row is None:
+					return None
+				if (row[0], row[1]) != tuple(signature):
+					self._delete_rows("path = ? AND params = ?", (key, params))
+					self._commit()
+					return None
+				try:
+					data = self._file(row[2]).read_bytes()
+				except FileNotFoundError:
+					self._delete_rows("path = ? AND params = ?", (key, params))
+					self._commit()
+					return None
+				self.db.execute(
+					"UPDATE previews SET last_access = ? WHERE path = ? AND params = ?",
+					(time.time(), key, params))
+				self._commit()
+				return data
+		except (OSError, sqlite3.Error) as e:
+			print(f"Error reading preview of {path} from the preview store: {e}")
+			self._rollback()
+			return None
+
+	def signature(self, path, params: str):
+		"""Return the (mtime_ns, size) signature of the file a stored preview was made from, or None."""
+		if self.db is None:
+			return None
+		try:
+			with self.lock:
+				row = self.db.execute(
+					"SELECT mtime_ns, size FROM previews WHERE path = ? AND params = ?",
+					(self._key(path), params)).fetchone()
+		except sqlite3.Error as e:
+			print(f"Error reading preview of {path} from the preview store: {e}")
+			return None
+		return tuple(row) if row else None
+
+	def put(self, path, params: str, data: bytes, signature):
+		"""Store the preview bytes for a file, then evict down to the disk quota."""
+		if self.db is None:
+			return
+		key = self._key(path)
+		digest = hashlib.sha256(data).hexdigest()
+		preview_file = self._file(digest)
+		temp_file = preview_file.with_suffix(f".{threading.get_ident()}.tmp")
+		try:
+			# Written outside the lock, only published under it: _delete_rows() may be
+			# unlinking the same digest, the file must exist once its row is inserted.
+			if not preview_file.exists():
+				preview_file.parent.mkdir(exist_ok=True)
+				temp_file.write_bytes(data)
+			with self.lock:
+				if temp_file.exists():
+					if preview_file.exists():
+						temp_file.unlink()
+					else:
+						os.replace(temp_file, preview_file)
+				elif not preview_file.exists():
+					preview_file.parent.mkdir(exist_ok=True)
+					preview_file.write_bytes(data)
+				self._delete_rows("path = ? AND params = ? AND digest != ?", (key, params, digest))
+				row = self.db.execute("SELECT bytes FROM previews WHERE path = ? AND params = ?", (key, params)).fetchone()
+				self.db.execute(
+					"INSERT OR REPLACE INTO previews VALUES (?, ?, ?, ?, ?, ?, ?)",
+					(key, params, signature[0], signature[1], digest, len(data), time.time()))
+				self.bytes += len(data) - (row[0] if row else 0)
+				self._evict_to_quota()
+				self._commit()
+		except (OSError, sqlite3.Error) as e:
+			temp_file.unlink(missing_ok=True)
+			print(f"Error writing preview of {path} to the preview store: {e}")
+			self._rollback(written=[digest])
+
+	def rekey(self, path, old_signature, new_signature):
+		"""
+		Keep the previews of a file whose pixels did not change, e.g. after the
+		app rewrote its metadata. Only rows still matching old_signature move.
+		"""
+		if self.db is None:
+			return
+		try:
+			with self.lock:
+				self.db.execute(
+					"UPDATE previews SET mtime_ns = ?, size = ? WHERE path = ? AND mtime_ns = ? AND size = ?",
+					(new_signature[0], new_signature[1], self._key(path), old_signature[0], old_signature[1]))
+				self._commit()
+		except sqlite3.Error as e:
+			print(f"Error updating preview of {path} in the preview store: {e}")
+
+	def discard(self, paths):
+		"""Remove the previews of the given files."""
+		if self.db is None:
+			return
+		try:
+			with self.lock:
+				for path in paths:
+					self._delete_rows("path = ?", (self._key(path),))
+				self._commit()
+		except (OSError, sqlite3.Error) as e:
+			print(f"Error removing previews from the preview store: {e}")
+			self._rollback()
+
+	def total_bytes(self) -> int:
+		if self.db is None:
+			return 0
+		with self.lock:
+			return self.bytes
+
+	def _evict_to_quota(self):
+		"""Evict least recently used previews until the store fits in its quota. Caller holds the lock."""
+		if self.bytes <= self.quota_bytes:
+			return
+		for path, params in self.db.execute("SELECT path, params FROM previews ORDER BY last_access").fetchall():
+			self._delete_rows("path = ? AND params = ?", (path, params))
+			if self.bytes <= self.quota_bytes:
+				break
+
+	def close(self):
+		if self.db is not None:
+			with self.lock:
+				self.db.close()
+				self.db = None
@@ -0,0 +1,112 @@
+# utils/startup_timing.py
+"""
+Startup timing report.
+
+Times the imports made while the app starts and the named startup phases,
+then prints them, the slowest first, when the first page is shown. The
+report is compared with config.STARTUP_BUDGET_SECONDS, so a change that
+slows cold start down shows up the next time the app is run.
+
+Must be installed before anything else is imported, see main.py.
+"""
+import builtins
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+PROJECT_PACKAGES = {"utils", "ui", "metadata", "config", "main", "__mp_main__"}
+
+started = time.perf_counter()
+imports = {} # Module -> seconds spent importing it, not counting the modules it imports.
+phases = [] # (name, seconds) of the timed startup phases.
+marks = [] # (name, seconds since start) of startup milestones.
+reported = False
+
+_original_import = None
+_thread_id = None
+_stack = [] # Time spent in nested imports, per import in progress.
+
+def _module_key(name, globals, level) -> str:
+	"""Report project modules by their own name, others under their top-level package."""
+	if level:
+		package = (globals or {}).get("__package__") or ""
+		name = f"{package}.{name}" if name else package
+	parts = name.split(".")
+	if parts[0] in PROJECT_PACKAGES:
+		return ".".join(parts[:2])
+	return parts[0]
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+	if threading.get_ident() != _thread_id or (level == 0 and name in sys.modules):
+		return _original_import(name, globals, locals, fromlist, level)
+	key = _module_key(name, globals, level)
+	_stack.append(0.0)
+	start = time.perf_counter()
+	try:
+		return _original_import(name, globals, locals, fromlist, level)
+	finally:
+		elapsed = time.perf_counter() - start
+		nested = _stack.pop()
+		imports[key] = imports.get(key, 0.0) + elapsed - nested
+		if _stack:
+			_stack[-1] += elapsed
+
+def install():
+	"""Start timing the imports made on this thread."""
+	global _original_import, _thread_id
+	if _original_import is not None:
+		return
+	_original_import = builtins.__import__
+	_thread_id = threading.get_ident()
+	builtins.__import__ = _timed_import
+
+def uninstall():
+	global _original_import
+	if _original_import is not None:
+		builtins.__import__ = _original_import
+		_original_import = None
+
+def enabled() -> bool:
+	return _original_import is not None or reported
+
+@contextmanager
+def phase(name: str):
+	"""Time a block of startup work."""
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		phases.append((name, time.perf_counter() - start))
+
+def mark(name: str):
+	"""Record a startup milestone. Milestones after the report are printed on their own."""
+	if not enabled():
+		return
+	elapsed = time.perf_counter() - started
+	marks.append((name, elapsed))
+	if reported:
+		print(f"Startup: {name} after {elapsed:.2f} s")
+
+def report(budget_seconds: float, top: int = 15):
+	"""Print the startup report and stop timing imports."""
+	global reported
+	if reported or _original_import is None:
+		return
+	uninstall()
+	reported = True
+	total = time.perf_counter() - started
+
+	lines = [f"Startup: first paint after {total:.2f} s (budget {budget_seconds:.2f} s)"]
+	if total > budget_seconds:
+		lines[0] += f", OVER BUDGET by {total - budget_seconds:.2f} s"
+	for name, elapsed in marks:
+		lines.append(f"  {elapsed:7.3f} s  {name}")
+	if phases:
+		lines.append("  Phases:")
+		for name, elapsed in sorted(phases, key=lambda item: item[1], reverse=True):
+			lines.append(f"  {elapsed:7.3f} s  {name}")
+	lines.append(f"  Imports ({sum(imports.values()):.2f} s in total, slowest first):")
+	for name, elapsed in sorted(imports.items(), key=lambda item: item[1], reverse=True)[:top]:
+		lines.append(f"  {elapsed:7.3f} s  {name}")
+	print("\n".join(lines))
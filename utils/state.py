@@ -4,10 +4,18 @@ import asyncio
 from ui.dialogs import ErrorDialog
 from collections import OrderedDict
 import shlex
+import config
 from nicegui import ui, Client
 from utils.cache import ImageCache
+from utils.prefetch import PrefetchScheduler, AdaptiveWindow
 from concurrent.futures import ThreadPoolExecutor
-from utils.exiftool_wrapper import PatchedExifTool
+from utils.exiftool_wrapper import ExifToolPool
+from utils.metadata_index import MetadataIndex
+from utils.preview_store import PreviewStore
+from utils.catalog import Catalog
+from utils.edit_journal import EditJournal
+from utils.preview_engine import PreviewEngine
+from utils import startup_timing
 
 def get_exiftool_path():
 	path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "tools", "exiftool", "exiftool.exe"))
@@ -16,6 +24,11 @@ def get_exiftool_path():
 	else:
 		return shlex.quote(path)  # Only needed for Unix
 
+def downgrade_lite(data: bytes) -> bytes:
+	"""Make the half size preview kept for images far from the current one."""
+	from utils.image_decode import downgrade_preview # Loads cv2, kept off the startup path.
+	return downgrade_preview(data, config.PREVIEW_LITE_QUALITY)
+
 def notify(message: str, type: str = "info") -> None:
     """
 	Send a notification to all active clients safely.
@@ -62,34 +75,61 @@ class AppState:
 		self.current_image = None # Current image path.
 		self.original_metadata = None # Original metadata for current image, used by "undo".
 		self.unsaved_changes = False # Flag for unsaved metadata changes.
+		self.metadata_index = MetadataIndex() # Descriptions for the open folder, filled in batches.
+		self.catalog = Catalog(config.CATALOG_PATH) # Descriptions of every image read, kept between sessions for searching.
+		self.metadata_index_task = None # The background task filling the metadata index.
 				
 		# Queues (asyncio)
-		self.save_queue = asyncio.Queue() # Queue for saving metadata.
-		self.cache_queue = asyncio.Queue() # Queue for caching.
+		self.save_queue = asyncio.Queue() # Edits to write, as (journal id, path, value).
+		self.edit_journal = EditJournal(config.EDIT_JOURNAL_PATH) # Edits not written to their files yet, kept on disk.
+		self.pending_edits = {} # Path -> the latest description queued and not written yet.
+		self.save_failures = {} # Path -> failed attempts in a row at writing an edit, for the retry backoff.
+		self.cache_queue = PrefetchScheduler(maxsize=2 * config.PREFETCH_MAX_WINDOW + 1) # Queue for caching, nearest to the current image first.
 		self.nav_lock = asyncio.Lock() # Prevents overlapping the next/prev navigation.
-		self.cache_executor = ThreadPoolExecutor(max_workers=4) # Thread pool executor for heavy cache operations
+		self.cache_executor = ThreadPoolExecutor(max_workers=config.PREVIEW_THREADS) # Thread pool executor for heavy cache operations
+		self.preview_engine = PreviewEngine( # Makes previews on cache_executor, or on worker processes if configured.
+			self.cache_executor,
+			max_size=config.PREVIEW_MAX_SIZE,
+			quality=config.PREVIEW_QUALITY,
+			processes=config.PREVIEW_PROCESSES,
+			slot_mb=config.PREVIEW_SHM_SLOT_MB)
 		
 		# Image Cache
 		self.cached_center_index = None # Last cached index center
-		self.image_cache = ImageCache(50) # Cache for images.
+		self.prefetch_window = AdaptiveWindow( # Sizes the cache window from how the user navigates.
+			base=config.PREFETCH_WINDOW,
+			minimum=config.PREFETCH_MIN_WINDOW,
+			maximum=config.PREFETCH_MAX_WINDOW,
+			idle_seconds=config.PREFETCH_IDLE_SECONDS)
+		self.image_cache = ImageCache( # Cache for images, limited by size in bytes.
+			config.IMAGE_CACHE_MAX_MB * 1024 * 1024,
+			downgrade=downgrade_lite,
+			full_radius=config.IMAGE_CACHE_FULL_RADIUS)
+		self.preview_store = PreviewStore(config.PREVIEW_CACHE_DIR, config.PREVIEW_CACHE_QUOTA_MB * 1024 * 1024) # Previews kept on disk between sessions.
 		self.bg_cache_task = None # The background task for the caching.
 		self.latest_image_task = None # The latest process image task.
-		self.latest_cache_tasks = [] # The latest cache img tasks
+		self.latest_cache_tasks = {} # Running preview tasks, by image path
+		self.warm_up_task = None # Imports the modules left out of startup, once the window is shown.
+		self.memory_profiler = None # MemoryProfiler, when config.MEMORY_PROFILE is set.
 		
 		# Navigation
 		self.nav_folder = None # The current folder the program is operating in.
 		self.nav_img_index = 0 # The index of the current image in the list of images.
-		self.nav_img_list = None # A Path list of images in the folder.
+		self.nav_img_list = None # FolderIndex of the images in the folder, used like a list of Paths.
 		self.nav_img_total = 0 # Len of images in folder
 		self.nav_counter = None # The element itself.
+		self.folder_watcher = None # Reports files changed outside the app in the open folder.
 
 		# Tools
 		self.exiftool_path = get_exiftool_path() # Path to ExifTool executable.
-		self.exiftool_process = PatchedExifTool(executable=str(self.exiftool_path)) # Keep an exiftool process running
-		self.exiftool_process.start()
+		self.exiftool_process = ExifToolPool( # Keep exiftool processes running, with a separate lane for saves
+			executable=str(self.exiftool_path),
+			read_workers=config.EXIFTOOL_READ_WORKERS,
+			save_workers=config.EXIFTOOL_SAVE_WORKERS)
 
 		# Dialogs
 		self.error_dialog = ErrorDialog() # Error dialog for displaying errors.		
 
 # Create a single instance of AppState to be shared across the app
-state = AppState()
\ No newline at end of file
+with startup_timing.phase("AppState()"):
+	state = AppState()
\ No newline at end of file
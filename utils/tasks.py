@@ -1,83 +1,55 @@
 from utils.state import state, notify
-from utils.file_utils import cache_image, extract_metadata, display_metadata
-from metadata.exif_handler import set_exif_description
-from metadata.xmp_handler import set_xmp_description
-from nicegui import ui
+from utils.file_utils import start_cache_task, extract_metadata, display_metadata, update_cache_window
+from metadata.descriptions import set_description
+from metadata.inplace_writer import recover
+from nicegui import ui, Client
+from utils.metadata_index import file_signature
+from utils import startup_timing, tracing
+from utils.memory_profile import format_sample
+import config
 import asyncio
+import importlib
+
+# Modules left out of startup, imported once the window is shown: cv2 and numpy, and the EXIF transliteration tables.
+WARM_UP_MODULES = ["utils.image_decode", "unidecode"]
 
 
 async def save_metadata_queue():
 	"""
-	Background task to process metadata save requests.
+	Background task writing queued description edits to their files.
+
+	Each queued edit carries its own path and value, and is already in the
+	edit journal, so the editor never waits for a write. Edits queued while a
+	write is running are merged per file, only the last value is written.
 	"""
 	while True:
 		try:
-			undo = await state.save_queue.get()
-
-			# No image loaded.
-			if not state.current_image:
-				state.save_queue.task_done()
-				continue
-
-			# Disable input field during saving.
-			state.meta_textarea_input.props(add="disable readonly")
-			state.editor_spinner.show()
-			# Get file extension in lowercase
-			extension = state.current_image.suffix.lower()
-
-			# Define supported formats, so we don't try to add meta data to unsupported files.
-			supported_exif = [".jpg", ".jpeg", ".tiff", ".tif"]  # EXIF supported formats
-			supported_xmp = [".jpg", ".jpeg", ".tiff", ".tif", ".png"]  # XMP supported formats
-
-			save_xmp = False
-			save_exif = False
-			xmp_save_check = False
-			exif_save_check = False			
-
-			if extension in supported_xmp:
-				save_xmp = True
-			if extension in supported_exif:
-				save_exif = True
-
-			new_description = state.meta_textarea_input.value
-
-			if undo and new_description == state.original_metadata:
-				notify("Nothing to undo.")
-
-			elif undo:
-				state.meta_textarea_input.value = state.original_metadata
-			
+			batch = [await state.save_queue.get()]
+			while not state.save_queue.empty():
+				batch.append(state.save_queue.get_nowait())
+
+			# Merge repeated edits to the same file, the last one wins.
+			edits = {}
+			for edit_id, image_path, value in batch:
+				edit_ids = edits.pop(image_path, ([], None))[0]
+				edit_ids.append(edit_id)
+				edits[image_path] = (edit_ids, value)
+
+			# The user is editing the image on display, prefetch less until they move on.
+			# A save landing after a move to the next image is not counted against it.
+			if state.current_image in edits:
+				state.prefetch_window.record_edit(state.current_image)
+				await refresh_cache_window()
+
+			state.status_saving.show()
 			try:
-				if save_xmp:
-					xmp_save_check = await set_xmp_description(state.current_image, new_description)
-				
-				if save_exif:
-					exif_save_check = await set_exif_description(state.current_image, new_description)
-
-				warnings = []
-				if not xmp_save_check and save_xmp:
-					warnings.append("XMP metadata")
-				if not exif_save_check and save_exif:
-					warnings.append("EXIF metadata")
-
-				if warnings:
-					notify(f"{', '.join(warnings)} could not be saved.", "warning")
-				else:
-					notify("Metadata saved successfully!", "positive")				
-
-			except Exception as e:
-				state.error_dialog.show(
-					"Metadata could not be saved.", 
-					"An error occurred while saving the metadata, try again or reload the image.", 
-					f"{e}")
-
+				with tracing.span("save batch", edits=len(batch), files=len(edits)):
+					await asyncio.gather(*(write_edit(image_path, edit_ids, value) for image_path, (edit_ids, value) in edits.items()))
 			finally:
-					await extract_metadata(state.current_image)
-					await display_metadata()
-					state.meta_textarea_input.props(remove="disable readonly")
-					state.editor_spinner.hide()
+				for _ in batch:
 					state.save_queue.task_done()
-					
+				if state.save_queue.empty():
+					state.status_saving.hide()
 
 		except Exception as e:
 			state.error_dialog.show(
@@ -87,6 +59,140 @@ async def save_metadata_queue():
 			)
 			break  # Prevent infinite errors if something goes wrong
 
+@tracing.traced()
+async def write_edit(image_path, edit_ids, value):
+	"""Write one file's description, then record it in the index, the catalog and the journal."""
+	try:
+		tracing.annotate(image=image_path.name)
+		signature_before = await asyncio.to_thread(file_signature, image_path)
+		with tracing.span("set_description"):
+			written = await set_description(image_path, value)
+		signature_after = await asyncio.to_thread(file_signature, image_path)
+		xmp, exif = written.get("xmp"), written.get("exif")
+		state.metadata_index.put(image_path, xmp, exif, signature_after)
+		await asyncio.to_thread(state.catalog.put, image_path, signature_after, xmp, exif)
+		# Only the metadata changed, keep the stored preview.
+		await asyncio.to_thread(state.preview_store.rekey, image_path, signature_before, signature_after)
+		notify(f"Metadata saved for {image_path.name}.", "positive")
+		state.save_failures.pop(image_path, None)
+		await asyncio.to_thread(state.edit_journal.complete, edit_ids)
+
+		if state.pending_edits.get(image_path) == value:
+			del state.pending_edits[image_path]
+		if state.current_image == image_path:
+			# Show what was written, instead of reading it back. The editor keeps what the user is typing.
+			state.meta_value_xmp, state.meta_value_exif = xmp, exif
+			await display_metadata(include_input=False)
+
+	except Exception as e:
+		# The edit stays journaled and pending, and is tried again later, e.g. once a locked file is closed.
+		failures = state.save_failures.get(image_path, 0) + 1
+		state.save_failures[image_path] = failures
+		delay = min(2 ** failures, config.SAVE_RETRY_MAX_SECONDS)
+		if failures == 1:
+			state.error_dialog.show(
+				f"Metadata could not be saved to {image_path.name}.", 
+				f"An error occurred while saving the metadata. The edit is kept and saved again in {delay} seconds.", 
+				f"{e}")
+		else:
+			print(f"Error saving metadata to {image_path}, attempt {failures}, trying again in {delay} seconds: {e}")
+		asyncio.create_task(retry_edit(image_path, edit_ids, value, delay))
+		# The file may have been partly written, read it again. The editor keeps the user's text.
+		state.metadata_index.discard([image_path])
+		if state.current_image == image_path:
+			await extract_metadata(image_path)
+			await display_metadata(include_input=False)
+
+async def retry_edit(image_path, edit_ids, value, delay: float):
+	"""Queue an edit that failed again after a delay, unless a newer edit of the file replaced it."""
+	await asyncio.sleep(delay)
+	if state.pending_edits.get(image_path) != value:
+		# The newer edit is journaled and queued on its own.
+		await asyncio.to_thread(state.edit_journal.complete, edit_ids)
+		return
+	for edit_id in edit_ids:
+		await state.save_queue.put((edit_id, image_path, value))
+
+def replay_edit_journal():
+	"""Queue the edits a previous session journaled but did not write, e.g. after a crash."""
+	# Files an in-place write left half written get their old bytes back first, their edits are replayed below.
+	for image_path in recover(config.IN_PLACE_UNDO_DIR):
+		print(f"Restored {image_path} after an interrupted in-place write.")
+	state.edit_journal.compact()
+	edits = state.edit_journal.pending_edits()
+	for edit_id, image_path, value in edits:
+		state.pending_edits[image_path] = value
+		state.save_queue.put_nowait((edit_id, image_path, value))
+	if edits:
+		notify(f"Saving {len(edits)} description(s) left over from the last session.")
+
+async def refresh_cache_window():
+	"""
+	Re-evaluate the prefetch window around the current image, under the navigation lock.
+	Skipped while a navigation holds it, the navigation moves the window itself.
+	"""
+	if state.nav_lock.locked() or not state.nav_img_total:
+		return
+	async with state.nav_lock:
+		await update_cache_window(state.nav_img_index)
+
+async def prefetch_idle_worker():
+	"""Shrink the prefetch window once the user stays on one image, navigation alone never asks for it."""
+	while True:
+		await asyncio.sleep(max(1.0, config.PREFETCH_IDLE_SECONDS / 4))
+		try:
+			window = state.prefetch_window
+			if window.idle() and window.last_window != window.shrunk():
+				await refresh_cache_window()
+		except Exception as e:
+			# Not fatal, the window is re-evaluated on the next move.
+			print(f"Error shrinking the prefetch window: {e}")
+
+async def start_exiftool():
+	"""Start the ExifTool processes without holding up the window. Commands sent before they are ready start them too."""
+	try:
+		await asyncio.to_thread(state.exiftool_process.start)
+		startup_timing.mark("ExifTool ready")
+	except Exception as e:
+		# Not fatal here, the first read or save retries and reports the error to the user.
+		print(f"Error starting ExifTool: {e}")
+
+async def warm_up():
+	"""Import the modules kept out of startup in the background, so the first image opened does not wait for them."""
+	for module in WARM_UP_MODULES:
+		try:
+			await asyncio.to_thread(importlib.import_module, module)
+		except ImportError as e:
+			print(f"Error importing {module}: {e}")
+	startup_timing.mark("warm-up done")
+
+def memory_context() -> dict:
+	"""What the app holds, recorded with each memory sample to tell a full cache from a leak."""
+	cache = state.image_cache.stats()
+	return {
+		"cache_entries": cache["entries"],
+		"cache_lite_entries": cache["lite_entries"],
+		"cache_mb": round(cache["bytes"] / (1024 * 1024), 1),
+		"cache_queue": state.cache_queue.qsize(),
+		"preview_tasks": len(state.latest_cache_tasks),
+		"metadata_index": len(state.metadata_index),
+		"folder_images": state.nav_img_total,
+		"ui_elements": sum(len(client.elements) for client in list(Client.instances.values())),
+	}
+
+async def memory_profile_worker():
+	"""Sample memory every MEMORY_PROFILE_INTERVAL seconds while the app runs, see MemoryProfiler."""
+	profiler = state.memory_profiler
+	await asyncio.to_thread(profiler.start)
+	while True:
+		await asyncio.sleep(config.MEMORY_PROFILE_INTERVAL)
+		label = state.current_image.name if state.current_image else "no image"
+		try:
+			sample = await asyncio.to_thread(profiler.sample, label, memory_context())
+			print(format_sample(sample))
+		except Exception as e:
+			print(f"Error taking a memory snapshot: {e}")
+
 async def start_cache_worker():
 	"""Ensure the cache worker is running."""
 	if state.bg_cache_task is None or state.bg_cache_task.done():
@@ -94,14 +200,28 @@ async def start_cache_worker():
 		
 async def cache_worker():
 	"""
-	Background task that processes cache requests sequentially.
+	Background task that processes cache requests, as many at once as the preview engine has workers.
 	"""
+	slots = asyncio.Semaphore(state.preview_engine.workers)
+	running = set()
+
+	async def process(img_path):
+		try:
+			with tracing.span("prefetch", image=img_path.name):
+				await start_cache_task(img_path)
+		except asyncio.CancelledError:
+			pass  # The image left the cache window.
+		except Exception as e:
+			print(f"Error caching image {img_path}: {e}")
+		finally:
+			slots.release()
+			state.cache_queue.task_done(img_path)
+
 	while True:
+		await slots.acquire()
 		img_path = await state.cache_queue.get()
 		if img_path is None:
 			break  # Exit gracefully if we enqueue None as a stop signal
-		try:
-			await asyncio.get_running_loop().run_in_executor(state.cache_executor, cache_image, img_path)
-		except Exception as e:
-			print(f"Error caching image {img_path}: {e}")
-		state.cache_queue.task_done()
\ No newline at end of file
+		task = asyncio.create_task(process(img_path))
+		running.add(task)
+		task.add_done_callback(running.discard)
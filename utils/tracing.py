@@ -0,0 +1,223 @@
+# utils/tracing.py
+"""
+Lightweight tracing of the image pipeline, written as Chrome trace JSON.
+
+A span is a named, timed block of work. A span opened while another one is
+open, in the same task or in a task started from it, is its child. Every
+asyncio task (and thread) gets its own track, so spans of concurrent tasks
+never overlap, and children on another track are linked by a flow arrow.
+Open the file in https://ui.perfetto.dev or chrome://tracing.
+
+Tracing is off unless config.TRACE_ENABLED is set. Off, span() returns a
+shared no-op context manager and traced() returns the function unchanged.
+"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import weakref
+from collections import Counter, deque
+
+import config
+
+enabled = config.TRACE_ENABLED
+events = deque(maxlen=config.TRACE_MAX_EVENTS) # Finished spans, oldest dropped first.
+
+_current = contextvars.ContextVar("trace_span", default=None) # The innermost open Span.
+_span_ids = itertools.count(1)
+_track_ids = itertools.count(1)
+_task_tracks = weakref.WeakKeyDictionary() # asyncio.Task -> track id
+_thread_tracks = {} # Thread ident -> track id
+_track_names = {} # Track id -> task or thread name, kept while its task runs or events has spans of it
+_track_events = Counter() # Track id -> events of the track in events
+_ended_tracks = set() # Tracks of finished tasks, forgotten with their last event
+_lock = threading.Lock() # Spans end on the event loop and on worker threads.
+_pid = os.getpid()
+_origin = time.perf_counter()
+
+def _timestamp(seconds: float) -> float:
+	"""Microseconds since the trace started, Chrome's time unit."""
+	return round((seconds - _origin) * 1_000_000, 1)
+
+def _track() -> int:
+	"""The track of the running task, or of the thread outside of tasks."""
+	try:
+		task = asyncio.current_task()
+	except RuntimeError:
+		task = None
+	if task is not None:
+		track = _task_tracks.get(task)
+		if track is None:
+			track = _task_tracks[task] = next(_track_ids)
+			_track_names[track] = task.get_name()
+			weakref.finalize(task, _task_ended, track)
+		return track
+	ident = threading.get_ident()
+	track = _thread_tracks.get(ident)
+	if track is None:
+		track = _thread_tracks[ident] = next(_track_ids)
+		_track_names[track] = threading.current_thread().name
+	return track
+
+def _forget_track(track):
+	"""Caller holds _lock."""
+	_track_names.pop(track, None)
+	_track_events.pop(track, None)
+	_ended_tracks.discard(track)
+
+def _task_ended(track):
+	"""Called once a task is collected, its name is kept as long as events has spans of it."""
+	with _lock:
+		if _track_events[track] > 0:
+			_ended_tracks.add(track)
+		else:
+			_forget_track(track)
+
+def _record(event):
+	"""Append to events, forgetting finished tasks whose last event is pushed out."""
+	with _lock:
+		if len(events) == events.maxlen:
+			dropped = events[0]["tid"]
+			_track_events[dropped] -= 1
+			if _track_events[dropped] <= 0:
+				del _track_events[dropped]
+				if dropped in _ended_tracks:
+					_forget_track(dropped)
+		events.append(event)
+		_track_events[event["tid"]] += 1
+
+class _NoSpan:
+	"""Stands in for Span when tracing is off."""
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		return False
+
+	def set(self, **args):
+		pass
+
+NO_SPAN = _NoSpan()
+
+class Span:
+	__slots__ = ("name", "args", "span_id", "parent", "track", "start", "token")
+
+	def __init__(self, name: str, args: dict):
+		self.name = name
+		self.args = args
+
+	def set(self, **args):
+		"""Attach values learnt while the span runs, e.g. whether the preview was cached."""
+		self.args.update(args)
+
+	def __enter__(self):
+		self.parent = _current.get()
+		self.span_id = next(_span_ids)
+		self.track = _track()
+		self.token = _current.set(self)
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		end = time.perf_counter()
+		_current.reset(self.token)
+		args = {"span": self.span_id}
+		if self.parent is not None:
+			args["parent"] = self.parent.span_id
+		if exc_type is asyncio.CancelledError:
+			args["cancelled"] = True
+		elif exc_type is not None:
+			args["error"] = f"{exc_type.__name__}: {exc}"
+		for key, value in self.args.items():
+			args[key] = value if isinstance(value, (int, float, bool)) or value is None else str(value)
+
+		start = _timestamp(self.start)
+		_record({
+			"name": self.name, "cat": "app", "ph": "X", "pid": _pid, "tid": self.track,
+			"ts": start, "dur": round((end - self.start) * 1_000_000, 1), "args": args})
+		if self.parent is not None and self.parent.track != self.track:
+			# Started from a span in another task: draw an arrow from the parent.
+			_record({"name": "spawn", "cat": "flow", "ph": "s", "id": self.span_id, "pid": _pid, "tid": self.parent.track, "ts": start})
+			_record({"name": "spawn", "cat": "flow", "ph": "f", "bp": "e", "id": self.span_id, "pid": _pid, "tid": self.track, "ts": start})
+		return False
+
+def span(name: str, **args):
+	"""
+	Time a block of work:
+
+		with tracing.span("decode", image=path.name):
+			...
+	"""
+	if not enabled:
+		return NO_SPAN
+	return Span(name, args)
+
+def annotate(**args):
+	"""Attach values to the innermost open span."""
+	if not enabled:
+		return
+	current = _current.get()
+	if current is not None:
+		current.set(**args)
+
+def traced(name: str = None):
+	"""Decorator putting every call of a function, sync or async, in a span named after it."""
+	def decorate(func):
+		if not enabled:
+			return func
+		span_name = name or func.__qualname__
+		if asyncio.iscoroutinefunction(func):
+			@functools.wraps(func)
+			async def async_wrapper(*args, **kwargs):
+				with Span(span_name, {}):
+					return await func(*args, **kwargs)
+			return async_wrapper
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			with Span(span_name, {}):
+				return func(*args, **kwargs)
+		return wrapper
+	return decorate
+
+@contextlib.asynccontextmanager
+async def _timed_lock(lock, name: str):
+	with Span(f"wait {name}", {}):
+		await lock.acquire()
+	try:
+		yield lock
+	finally:
+		lock.release()
+
+def locked(lock, name: str):
+	"""async with tracing.locked(lock, "nav_lock"), like async with lock, with the wait in a span."""
+	if not enabled:
+		return lock
+	return _timed_lock(lock, name)
+
+def save(path=None):
+	"""Write the spans recorded so far as a Chrome trace JSON file."""
+	if not enabled:
+		return
+	path = path or config.TRACE_PATH
+	with _lock:
+		recorded = list(events)
+		names = {track: _track_names[track] for track in _track_events if track in _track_names}
+	metadata = [
+		{"name": "thread_name", "ph": "M", "pid": _pid, "tid": track, "args": {"name": name}}
+		for track, name in names.items()]
+	metadata.append({"name": "process_name", "ph": "M", "pid": _pid, "tid": 0, "args": {"name": "Image Cataloger"}})
+	try:
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		temp_path = f"{path}.tmp"
+		with open(temp_path, "w", encoding="utf-8") as trace:
+			json.dump({"traceEvents": metadata + recorded, "displayTimeUnit": "ms"}, trace)
+		os.replace(temp_path, path)
+		print(f"Trace with {len(recorded)} events written to {path}")
+	except OSError as e:
+		print(f"Error writing trace to {path}: {e}")